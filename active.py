@@ -0,0 +1,86 @@
+from itertools import combinations_with_replacement
+import numpy as np
+
+
+class LogisticClassifier:
+    """Polynomial logistic regression of the win probability.
+
+    The parameters are scaled to [0, 1] within their bounds and complemented
+    by their logarithms, so boundaries such as n = 3 log N are low-degree
+    polynomials of the features. The model is fitted by iteratively
+    reweighted least squares with a ridge penalty, which keeps it defined
+    when the data are separable, as the sweeps usually are.
+
+    Parameters
+    ----------
+    lower, upper : np.ndarray
+        bounds of the parameters, shaped (D,)
+    degree : int, default=2
+        degree of the polynomial features
+    ridge : float, default=1e-2
+        weight of the ridge penalty
+
+    """
+
+    def __init__(self, lower, upper, degree=2, ridge=1e-2):
+        self.lower = np.asarray(lower, dtype=float)
+        self.upper = np.asarray(upper, dtype=float)
+        self.degree = degree
+        self.ridge = ridge
+        self.weights = None
+
+    def features(self, x):
+        """polynomial features of the parameters x, shaped (M, D)"""
+        u = (np.asarray(x, dtype=float) - self.lower) / np.maximum(
+            self.upper - self.lower, 1e-12
+        )
+        z = np.concatenate([u, np.log1p(9 * u) / np.log(10)], axis=-1)
+        columns = [np.ones(len(z))]
+        for d in range(1, self.degree + 1):
+            for terms in combinations_with_replacement(range(z.shape[-1]), d):
+                columns.append(np.prod(z[:, terms], axis=-1))
+        return np.stack(columns, axis=-1)
+
+    def fit(self, x, y, iterations=100, tolerance=1e-8):
+        """fit the model to the outcomes y (0 or 1) of the parameters x"""
+        f = self.features(x)
+        y = np.asarray(y, dtype=float)
+        w = np.zeros(f.shape[-1]) if self.weights is None else self.weights
+        penalty = self.ridge * np.eye(len(w))
+        penalty[0, 0] = 0
+        for _ in range(iterations):
+            p = 1 / (1 + np.exp(-f @ w))
+            hessian = (f * (p * (1 - p))[:, None]).T @ f + penalty
+            step = np.linalg.solve(hessian, f.T @ (y - p) - penalty @ w)
+            w = w + step
+            if np.abs(step).max() < tolerance:
+                break
+        self.weights = w
+        return self
+
+    def predict_proba(self, x):
+        """predicted win probability of the parameters x"""
+        return 1 / (1 + np.exp(-self.features(x) @ self.weights))
+
+
+def most_uncertain(probability, available, num):
+    """indices of the num available candidates whose probability is closest to 1/2
+
+    Parameters
+    ----------
+    probability : np.ndarray
+        predicted win probability of every candidate
+    available : np.ndarray
+        boolean mask of the candidates that may be chosen
+    num : int
+        number of candidates to choose
+
+    Returns
+    -------
+    np.ndarray
+        the chosen candidates, most uncertain first
+
+    """
+    candidates = np.flatnonzero(available)
+    order = np.argsort(np.abs(probability[candidates] - 0.5), kind="stable")
+    return candidates[order[:num]]
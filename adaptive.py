@@ -0,0 +1,88 @@
+import numpy as np
+from scipy.stats import norm
+
+
+def wilson_interval(wins, n, confidence=0.95):
+    """Wilson score interval of win rates
+
+    Unlike the normal approximation, the interval stays inside [0, 1] and
+    has a nonzero width when every replicate won or every replicate failed,
+    which is the common case of a sweep.
+
+    Parameters
+    ----------
+    wins : np.ndarray
+        number of wins of every cell
+    n : np.ndarray
+        number of replicates of every cell; cells without any have the
+        interval [0, 1]
+    confidence : float, default=0.95
+        confidence level
+
+    Returns
+    -------
+    lower, upper : np.ndarray
+        the bounds of the intervals
+
+    """
+    wins = np.asarray(wins, dtype=float)
+    n = np.asarray(n, dtype=float)
+    z = norm.ppf(0.5 + confidence / 2)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        p = wins / n
+        denominator = 1 + z**2 / n
+        center = (p + z**2 / (2 * n)) / denominator
+        half_width = z * np.sqrt(p * (1 - p) / n + z**2 / (4 * n**2)) / denominator
+    lower = np.where(n > 0, center - half_width, 0.0)
+    upper = np.where(n > 0, center + half_width, 1.0)
+    return lower, upper
+
+
+def allocate_replicates(
+    wins,
+    n,
+    min_replicates=4,
+    round_size=4,
+    max_replicates=24,
+    confidence=0.95,
+    ci_width=0.5,
+    budget=None,
+):
+    """replicates to add to every cell in the next round of an adaptive sweep
+
+    A cell is decided once it has min_replicates replicates and the Wilson
+    interval of its win rate is at most ci_width wide, or once it has
+    max_replicates. Every undecided cell gets round_size more replicates (up
+    to min_replicates in the first round). With a budget, the widest
+    intervals, i.e. the cells on the boundary between winning and failing,
+    are served first.
+
+    Parameters
+    ----------
+    wins : np.ndarray
+        number of wins of every cell
+    n : np.ndarray
+        number of replicates of every cell
+
+    Keyword Arguments
+    -----------------
+    budget : int, optional
+        maximum number of replicates of the round
+
+    Returns
+    -------
+    np.ndarray
+        number of replicates to add to every cell
+
+    """
+    n = np.asarray(n)
+    lower, upper = wilson_interval(wins, n, confidence)
+    width = upper - lower
+    undecided = (n < min_replicates) | ((width > ci_width) & (n < max_replicates))
+    new = np.where(n < min_replicates, min_replicates - n, round_size)
+    new = np.where(undecided, np.minimum(new, max_replicates - n), 0)
+    if budget is not None and new.sum() > budget:
+        order = np.argsort(-width, kind="stable")
+        kept = np.cumsum(new[order]) <= budget
+        new[order[~kept]] = 0
+    return new
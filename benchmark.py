@@ -0,0 +1,700 @@
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import argparse
+import logging
+import os
+import platform
+import sys
+import time
+import tracemalloc
+import jpype
+import numpy as np
+import pandas as pd
+
+from simulation import (
+    ModelParameters,
+    Simulation,
+    pairwise_difference,
+    local_center_of_mass,
+    local_center_of_mass_indexed,
+    repulsion_indexed,
+    inverse_power_sum,
+)
+from instrumentation import peak_memory, reset_peak_memory
+from largeherd import LargeHerd
+from spatial import NeighborCache, SpatialIndex
+from vaughan import sheep_force_exact, sheep_force_grid
+from utils import dict_product_set
+
+
+def time_call(fn, repeats=5):
+    """best wall time of repeats calls of fn"""
+    best = np.inf
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def scaling_exponent(sizes, times):
+    """slope of the log-log fit of times against sizes"""
+    return np.polyfit(np.log(sizes), np.log(times), 1)[0]
+
+
+def benchmark_spatial_index(
+    sizes=(100, 300, 1000, 3000, 10000, 30000), num_neighbors=10, repeats=5, seed=0
+):
+    """time the per-tick neighbor queries of a herd with and without the index
+
+    The herd is spread over a square with a constant density of sheep, as a
+    herd of growing size is. Each tick issues the k-nearest query of the local
+    center of mass, the radius query of the sheep repulsion and the shepherd
+    proximity query. The all-pairs version is skipped above 3000 sheep.
+
+    Parameters
+    ----------
+    sizes : tuple of int
+        the herd sizes
+    num_neighbors : int
+        number of neighbors of the local center of mass
+    repeats : int
+        number of repetitions, the best of which is reported
+
+    Returns
+    -------
+    pd.DataFrame
+        seconds per tick of each method, indexed by herd size
+
+    """
+    p = ModelParameters()
+    rng = np.random.default_rng(seed)
+    rows = []
+    for n in sizes:
+        half_width = 2 * p.radius_sheep * np.sqrt(n)
+        pos = rng.uniform(-half_width, half_width, (n, 2))
+        shepherds = rng.uniform(-2 * half_width, 2 * half_width, (12, 2))
+
+        def indexed():
+            index = SpatialIndex(pos)
+            local_center_of_mass_indexed(index, num_neighbors)
+            repulsion_indexed(index, p.radius_sheep, 1)
+            index.any_within(shepherds, 3 * p.radius_sheep)
+
+        def all_pairs():
+            diff, distance = pairwise_difference(pos, pos)
+            local_center_of_mass(pos, distance, num_neighbors)
+            inverse_power_sum(diff, distance, 1, distance <= p.radius_sheep)
+            _, distance = pairwise_difference(shepherds, pos)
+            np.any(distance < 3 * p.radius_sheep, axis=-1)
+
+        rows.append(
+            {
+                "num_sheep": n,
+                "SpatialIndex": time_call(indexed, repeats),
+                "all pairs": time_call(all_pairs, repeats) if n <= 3000 else np.nan,
+            }
+        )
+    return pd.DataFrame(rows).set_index("num_sheep")
+
+
+def benchmark_simulation_tick(
+    sizes=(100, 300, 1000, 3000), num_neighbors=10, ticks=20, seed=0
+):
+    """time Simulation.go with and without the spatial index
+
+    Returns
+    -------
+    pd.DataFrame
+        seconds per tick of each method, indexed by herd size
+
+    """
+    rows = []
+    for n in sizes:
+        row = {"num_sheep": n}
+        for spatial_index, name in ((True, "SpatialIndex"), (False, "all pairs")):
+            if not spatial_index and n > 1000:
+                row[name] = np.nan
+                continue
+            simulation = Simulation(
+                ModelParameters(num_sheep=n, num_neighbors=num_neighbors),
+                seed=seed,
+                spatial_index=spatial_index,
+            )
+            row[name] = time_call(lambda: simulation.go_for(ticks), 1) / ticks
+        rows.append(row)
+    return pd.DataFrame(rows).set_index("num_sheep")
+
+
+def benchmark_neighbor_cache(
+    num_sheep=1000, num_neighbors=(10, 53, 200, 1000), ticks=100, seed=0
+):
+    """time the k-nearest queries of the local center of mass with and without reuse
+
+    The sheep positions of a Strombom run are recorded for ticks ticks and
+    indexed, then the neighbor sets of every tick are found by querying the
+    index anew and with a NeighborCache, which must find the same ones.
+
+    Parameters
+    ----------
+    num_sheep : int
+        the herd size
+    num_neighbors : tuple of int
+        the numbers of neighbors, capped at num_sheep
+    ticks : int
+        number of ticks
+
+    Returns
+    -------
+    pd.DataFrame
+        seconds per tick of each method, the speedup and the rebuild rate of
+        the cache, indexed by number of neighbors
+
+    """
+    rows = []
+    for k in sorted({min(k, num_sheep) for k in num_neighbors}):
+        simulation = Simulation(
+            ModelParameters(num_sheep=num_sheep, num_neighbors=k),
+            seed=seed,
+            spatial_index=True,
+            neighbor_cache=False,
+        )
+        indices = []
+        for _ in range(ticks):
+            simulation.go()
+            indices.append(SpatialIndex(simulation.state.sheep_pos))
+
+        start = time.perf_counter()
+        full = [index.k_nearest(k)[1] for index in indices]
+        full_time = (time.perf_counter() - start) / ticks
+        cache = NeighborCache(k)
+        start = time.perf_counter()
+        cached = [cache.k_nearest(index) for index in indices]
+        cached_time = (time.perf_counter() - start) / ticks
+        if any(
+            not np.array_equal(np.sort(a, axis=-1), np.sort(b, axis=-1))
+            for a, b in zip(full, cached)
+        ):
+            raise AssertionError(f"the cached neighbors of k={k} differ")
+        rows.append(
+            {
+                "num_neighbors": k,
+                "full query": full_time,
+                "NeighborCache": cached_time,
+                "speedup": full_time / cached_time,
+                "rebuild rate": cache.rebuild_rate,
+            }
+        )
+    return pd.DataFrame(rows).set_index("num_neighbors")
+
+
+def benchmark_large_herd(num_sheep=100000, workers=None, ticks=5, seed=0):
+    """time a tick of a LargeHerd with 1 to all the cores
+
+    The bytes per sheep are the peak resident memory the coordinator gained
+    from creating the herd to the last tick, setup included, measured as in
+    `Recorder`; the workers, which do not hold the herd but the tiles they
+    update, are not counted unless there is only 1, when the coordinator
+    updates the tiles itself.
+
+    Parameters
+    ----------
+    num_sheep : int
+        the herd size
+    workers : tuple of int, optional
+        the numbers of worker processes, by default the powers of 2 up to the
+        number of cores, and the number of cores; 1 worker, the reference of
+        the speedup, is always timed
+    ticks : int
+        number of ticks timed, after a first untimed one
+
+    Returns
+    -------
+    pd.DataFrame
+        seconds per tick, speedup and parallel efficiency against 1 worker,
+        and the measured bytes per sheep, indexed by number of workers
+
+    """
+    if workers is None:
+        cores = os.cpu_count()
+        workers = {2**i for i in range(cores.bit_length())} | {cores}
+    workers = sorted(set(workers) | {1})
+    parameters = ModelParameters(num_sheep=num_sheep)
+    rows = []
+    for num_workers in workers:
+        reset_peak_memory()
+        start_memory = peak_memory()
+        with LargeHerd(parameters, seed=seed, num_workers=num_workers) as herd:
+            herd.go()
+            seconds = time_call(lambda: herd.go_for(ticks), 1) / ticks
+            memory = peak_memory() - start_memory
+        rows.append(
+            {
+                "workers": num_workers,
+                "seconds per tick": seconds,
+                "bytes per sheep": memory * 2**20 / num_sheep,
+            }
+        )
+    results = pd.DataFrame(rows).set_index("workers")
+    serial = results.loc[1, "seconds per tick"]
+    results["speedup"] = serial / results["seconds per tick"]
+    results["efficiency"] = results["speedup"] / results.index
+    return results
+
+
+def benchmark_vaughan_far_field(
+    sizes=(1000, 3000, 10000), thetas=(1.0, 0.5, 0.25), repeats=3, seed=0
+):
+    """error and speed of the approximate Vaughan sheep forces against the exact sum
+
+    The herd is a Gaussian blob whose density at the center is that of a
+    herd of Vaughan sheep at rest. The error of a sheep is the norm of the
+    difference between its approximate and exact forces, relative to the
+    root mean square of the exact forces, since the force on a sheep near
+    the center of the herd nearly cancels out.
+
+    Parameters
+    ----------
+    sizes : tuple of int
+        the herd sizes
+    thetas : tuple of float
+        the accuracy parameters of `sheep_force_grid`
+    repeats : int
+        number of repetitions of the approximation, the best of which is
+        reported; the exact sum runs once
+
+    Returns
+    -------
+    pd.DataFrame
+        seconds per evaluation of the exact sum and the approximation, the
+        speedup and the median and maximum relative error, indexed by herd
+        size and theta
+
+    """
+    p = ModelParameters(sheep_model="vaughan")
+    weights = p.weight_com, p.weight_r_sheep, p.radius_sheep
+    rng = np.random.default_rng(seed)
+    rows = []
+    for n in sizes:
+        pos = rng.normal(0, p.radius_sheep * np.sqrt(n), (n, 2))
+        start = time.perf_counter()
+        exact = sheep_force_exact(pos, *weights)
+        exact_time = time.perf_counter() - start
+        scale = np.sqrt(np.mean(np.sum(exact**2, axis=-1)))
+        for theta in thetas:
+            approximate = sheep_force_grid(pos, *weights, theta)
+            error = np.linalg.norm(approximate - exact, axis=-1) / scale
+            seconds = time_call(lambda: sheep_force_grid(pos, *weights, theta), repeats)
+            rows.append(
+                {
+                    "num_sheep": n,
+                    "theta": theta,
+                    "exact": exact_time,
+                    "approximate": seconds,
+                    "speedup": exact_time / seconds,
+                    "median error": np.median(error),
+                    "max error": error.max(),
+                }
+            )
+    return pd.DataFrame(rows).set_index(["num_sheep", "theta"])
+
+
+def report_scaling(name, df):
+    """print a benchmark table and the fitted scaling exponents"""
+    print(f"{name} (seconds per tick)")
+    print(df.to_string(float_format=lambda x: f"{x:.2e}"))
+    for column in df.columns:
+        valid = df[column].dropna()
+        exponent = scaling_exponent(valid.index.values, valid.values)
+        print(f"  {column}: cost ~ N^{exponent:.2f}")
+    print()
+
+
+# columns identifying a scenario of the suite, and the measured ones
+SCENARIO_COLUMNS = [
+    "engine",
+    "sheep_model",
+    "shepherd_model",
+    "num_sheep",
+    "num_neighbors",
+    "num_shepherds",
+]
+MEASUREMENTS = ["Setup time", "Ticks per second", "Memory (MB)"]
+# measurements that are better when larger; the others are better when smaller
+HIGHER_IS_BETTER = {"Ticks per second"}
+# the time behind a rate, also reported by `run_scenario`
+RATE_TIMES = {"Ticks per second": "Go time"}
+# changes below which a measurement, or the time behind it, is deemed noise
+# whatever the relative change: sub-millisecond timings vary by far more
+# than any tolerance from run to run
+NOISE_FLOORS = {"Setup time": 1e-3, "Go time": 1e-3, "Memory (MB)": 1.0}
+# smallest number of rounds from which the spread of a measurement tells noise
+MIN_ROUNDS = 3
+
+
+def benchmark_scenarios(
+    engines=("numpy", "netlogo"),
+    sheep_models=("strombom", "vaughan"),
+    shepherd_models=("strombom", "pierson"),
+    sizes=(10, 100, 1000, 10000),
+    num_neighbors=(10,),
+    num_shepherds=(2, 12),
+):
+    """the scenarios of the benchmark suite, every combination of the arguments
+
+    Returns
+    -------
+    pd.DataFrame
+        the scenarios, one per row, with SCENARIO_COLUMNS
+    """
+    scenarios = dict_product_set(
+        engine=engines,
+        sheep_model=sheep_models,
+        shepherd_model=shepherd_models,
+        num_sheep=sizes,
+        num_neighbors=num_neighbors,
+        num_shepherds=num_shepherds,
+    )
+    scenarios = pd.DataFrame(list(scenarios), columns=SCENARIO_COLUMNS)
+    # more neighbors than sheep is the same scenario as all the sheep
+    scenarios["num_neighbors"] = np.minimum(
+        scenarios["num_neighbors"], scenarios["num_sheep"]
+    )
+    return scenarios.drop_duplicates(ignore_index=True)
+
+
+def run_scenario(scenario: dict, ticks, seed, modelfile, repeats=3):
+    """setup time, tick rate and memory of one scenario, in a fresh process
+
+    The times are the best of repeats runs from the same seed. The memory is
+    the peak of the allocations traced by Python with the NumPy engine, and
+    the median of the heap in use by the JVM after every run with NetLogo.
+
+    Returns
+    -------
+    dict
+        the MEASUREMENTS, the "Go time" of the best run and the "Status" of
+        the scenario: "ok", or why it could not run
+    """
+    experiment = {
+        "num_sheep": scenario["num_sheep"],
+        "num_neighbors": scenario["num_neighbors"],
+        "num_shepherds": scenario["num_shepherds"],
+        "random_seed": seed,
+    }
+    models = {
+        "sheep_model": f'"{scenario["sheep_model"]}"',
+        "shepherd_model": f'"{scenario["shepherd_model"]}"',
+    }
+    setup_time = go_time = np.inf
+    try:
+        if scenario["engine"] == "numpy":
+            for _ in range(repeats):
+                start = time.perf_counter()
+                simulation = Simulation.from_experiment(experiment, **models)
+                setup_time = min(setup_time, time.perf_counter() - start)
+                start = time.perf_counter()
+                simulation.go_for(ticks)
+                go_time = min(go_time, time.perf_counter() - start)
+            final_tick = simulation.ticks
+            # tracing slows the allocations down, so it gets a run of its own
+            del simulation
+            tracemalloc.start()
+            Simulation.from_experiment(experiment, **models).go_for(ticks)
+            memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        else:
+            import run
+
+            run.initializer(modelfile, run.Engine.NETLOGO)
+            # the first setup compiles and warms up the model
+            run.setup_simulation(experiment, **models)
+            memories = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                run.setup_simulation(experiment, **models)
+                setup_time = min(setup_time, time.perf_counter() - start)
+                start = time.perf_counter()
+                run.netlogo.command(f"go-for {ticks}")
+                go_time = min(go_time, time.perf_counter() - start)
+                runtime = jpype.java.lang.Runtime.getRuntime()
+                memories.append(runtime.totalMemory() - runtime.freeMemory())
+            final_tick = run.netlogo.report("ticks")
+            memory = np.median(memories)
+    except (NotImplementedError, ValueError) as e:
+        return {
+            **dict.fromkeys(MEASUREMENTS, np.nan),
+            "Go time": np.nan,
+            "Status": f"{e}",
+        }
+    return {
+        "Setup time": setup_time,
+        "Ticks per second": final_tick / go_time,
+        "Memory (MB)": memory / 2**20,
+        "Go time": go_time,
+        "Status": "ok",
+    }
+
+
+def run_benchmark_suite(
+    scenarios=None,
+    ticks=100,
+    seed=42,
+    repeats=3,
+    rounds=MIN_ROUNDS,
+    modelfile=Path(__file__).parent / "models" / "Shepherds.nlogo",
+):
+    """run the benchmark suite
+
+    Every scenario runs for ticks ticks from the same seed in a fresh worker
+    process, so the scenarios do not share caches or a JVM. Without a JVM,
+    the NetLogo scenarios are skipped.
+
+    The suite is run rounds times over, so that a slow spell of the machine
+    hits one round of many scenarios rather than every run of one. Every
+    measurement is the median of the rounds, and its spread, the range of
+    the rounds relative to the median, tells `compare_to_baseline` how much
+    it varies from run to run.
+
+    Parameters
+    ----------
+    scenarios : pd.DataFrame, optional
+        the scenarios, by default those of `benchmark_scenarios`
+    ticks : int, default=100
+        number of ticks of every scenario, fewer if the herd wins
+    seed : int, default=42
+        random seed of every scenario
+    repeats : int, default=3
+        number of runs of every scenario in a round, the best of which is the
+        measurement of the round
+    rounds : int, default=MIN_ROUNDS
+        number of rounds, at least MIN_ROUNDS
+    modelfile : str, Path
+        path to the netlogo model
+
+    Returns
+    -------
+    pd.DataFrame
+        the MEASUREMENTS, their "<measurement> spread", the Go time and the
+        Status of every scenario, indexed by SCENARIO_COLUMNS
+    """
+    if rounds < MIN_ROUNDS:
+        raise ValueError(f"the suite needs at least {MIN_ROUNDS} rounds")
+    log = logging.getLogger(__name__)
+    scenarios = benchmark_scenarios() if scenarios is None else scenarios
+    if "netlogo" in set(scenarios["engine"]):
+        try:
+            jpype.getDefaultJVMPath()
+        except Exception as e:
+            log.warning(f"Skipping the NetLogo scenarios: {e}")
+            scenarios = scenarios[scenarios["engine"] != "netlogo"]
+    rows = []
+    for _ in range(rounds):
+        for scenario in scenarios.to_dict("records"):
+            with ProcessPoolExecutor(1, max_tasks_per_child=1) as executor:
+                row = executor.submit(
+                    run_scenario, scenario, ticks, seed, modelfile, repeats
+                )
+                rows.append({**scenario, **row.result()})
+            log.info(f"{rows[-1]}")
+    grouped = pd.DataFrame(rows).groupby(SCENARIO_COLUMNS, sort=False)
+    results = grouped[MEASUREMENTS + ["Go time"]].median()
+    for measurement in MEASUREMENTS:
+        spread = grouped[measurement].max() - grouped[measurement].min()
+        results[f"{measurement} spread"] = spread / results[measurement]
+    results["Status"] = grouped["Status"].first()
+    return results
+
+
+def save_baseline(results: pd.DataFrame, path):
+    """write benchmark results as the baseline of later runs, with the platform"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    results = results.assign(
+        platform=platform.platform(),
+        python=platform.python_version(),
+        numpy=np.__version__,
+    )
+    results.to_csv(path)
+
+
+def load_baseline(path):
+    return pd.read_csv(path, index_col=list(range(len(SCENARIO_COLUMNS))))
+
+
+def compare_to_baseline(
+    results: pd.DataFrame, baseline: pd.DataFrame, tolerance=0.1, floors=None
+):
+    """compare benchmark results to a baseline
+
+    A measurement changes when it changes relatively by more than tolerance
+    plus the larger of its spreads in the baseline and the results, and
+    absolutely, itself or the time behind it for a rate (see RATE_TIMES), by
+    more than its noise floor. The run to run noise of the machine and of
+    short timings is so not reported as a change.
+
+    Parameters
+    ----------
+    results, baseline : pd.DataFrame
+        results of `run_benchmark_suite`
+    tolerance : float, default=0.1
+        relative change of a measurement below which it is deemed noise
+    floors : dict, optional
+        absolute change of a measurement, or of the time behind a rate, below
+        which it is deemed noise, by default NOISE_FLOORS; none applies to
+        the rates of a baseline without their times
+
+    Returns
+    -------
+    pd.DataFrame
+        for every scenario of both and every measurement, the baseline and
+        current values, their ratio, and whether it is a "regression", an
+        "improvement" or "ok"
+    """
+    floors = NOISE_FLOORS if floors is None else floors
+    common = results.index.intersection(baseline.index)
+    rows = []
+    for measurement in MEASUREMENTS:
+        before = baseline.loc[common, measurement]
+        after = results.loc[common, measurement]
+        ratio = after / before
+        gain = ratio if measurement in HIGHER_IS_BETTER else 1 / ratio
+        margin = tolerance
+        spread = f"{measurement} spread"
+        if spread in baseline and spread in results:
+            spreads = [baseline.loc[common, spread], results.loc[common, spread]]
+            margin = tolerance + np.fmax(*spreads).fillna(0).to_numpy()
+        column = RATE_TIMES.get(measurement, measurement)
+        noise = np.zeros(len(common), dtype=bool)
+        if column in floors and column in baseline and column in results:
+            change = results.loc[common, column] - baseline.loc[common, column]
+            noise = (change.abs() < floors[column]).to_numpy()
+        verdict = np.select(
+            [noise, gain < 1 - margin, gain > 1 + margin],
+            ["ok", "regression", "improvement"],
+            "ok",
+        )
+        rows.append(
+            pd.DataFrame(
+                {
+                    "measurement": measurement,
+                    "baseline": before,
+                    "current": after,
+                    "ratio": ratio,
+                    "verdict": np.where(ratio.isna(), "n/a", verdict),
+                },
+                index=common,
+            )
+        )
+    return pd.concat(rows).set_index("measurement", append=True)
+
+
+def regression_report(comparison: pd.DataFrame):
+    """a readable summary of `compare_to_baseline`, regressions first"""
+    counts = comparison["verdict"].value_counts()
+    lines = [
+        "Benchmark against baseline: "
+        + ", ".join(
+            f"{counts.get(v, 0)} {v}" for v in ("regression", "improvement", "ok")
+        )
+    ]
+    for verdict in ("regression", "improvement"):
+        changed = comparison[comparison["verdict"] == verdict]
+        if len(changed):
+            lines.append(f"\n{verdict.capitalize()}s:")
+            lines.append(
+                changed.drop(columns="verdict").to_string(
+                    float_format=lambda x: f"{x:.3g}"
+                )
+            )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="benchmark the shepherding engines")
+    parser.add_argument(
+        "--suite",
+        action="store_true",
+        help="run the scenario suite instead of the scaling benchmarks",
+    )
+    parser.add_argument(
+        "--neighbor-cache",
+        action="store_true",
+        help="benchmark the reuse of the neighbor sets across ticks",
+    )
+    parser.add_argument(
+        "--large-herd",
+        action="store_true",
+        help="run the scaling benchmark of a large herd from 1 to all the cores",
+    )
+    parser.add_argument(
+        "--far-field",
+        action="store_true",
+        help="run the error-vs-speed benchmark of the Vaughan far field",
+    )
+    parser.add_argument("--engines", nargs="+", default=["numpy", "netlogo"])
+    parser.add_argument("--sizes", nargs="+", type=int, default=[10, 100, 1000, 10000])
+    parser.add_argument("--ticks", type=int, default=100)
+    parser.add_argument("--baseline", default="benchmarks/baseline.csv")
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="save the results as the new baseline",
+    )
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    parser.add_argument(
+        "--repeats",
+        type=int,
+        default=3,
+        help="runs of every scenario in a round, the best of which is reported",
+    )
+    parser.add_argument(
+        "--rounds",
+        type=int,
+        default=MIN_ROUNDS,
+        help="rounds of the suite, whose median is reported",
+    )
+    args = parser.parse_args()
+
+    if args.neighbor_cache:
+        print("Neighbor sets of the local center of mass (seconds per tick)")
+        print(benchmark_neighbor_cache().to_string(float_format=lambda x: f"{x:.3g}"))
+        sys.exit()
+    if args.large_herd:
+        print(f"LargeHerd of {args.sizes[-1]} sheep")
+        print(
+            benchmark_large_herd(args.sizes[-1]).to_string(
+                float_format=lambda x: f"{x:.3g}"
+            )
+        )
+        sys.exit()
+    if args.far_field:
+        print("Vaughan far field against the exact sum (seconds per evaluation)")
+        print(
+            benchmark_vaughan_far_field().to_string(float_format=lambda x: f"{x:.3g}")
+        )
+        sys.exit()
+    if not args.suite:
+        report_scaling("Neighbor queries", benchmark_spatial_index())
+        report_scaling("Simulation.go", benchmark_simulation_tick())
+        sys.exit()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    results = run_benchmark_suite(
+        benchmark_scenarios(engines=args.engines, sizes=args.sizes),
+        ticks=args.ticks,
+        repeats=args.repeats,
+        rounds=args.rounds,
+    )
+    print(results.to_string(float_format=lambda x: f"{x:.3g}"))
+    if args.save_baseline:
+        save_baseline(results, args.baseline)
+        print(f"Saved the baseline to {args.baseline}")
+    elif Path(args.baseline).exists():
+        comparison = compare_to_baseline(
+            results, load_baseline(args.baseline), args.tolerance
+        )
+        print(regression_report(comparison))
+        sys.exit(int((comparison["verdict"] == "regression").any()))
+    else:
+        print(f"No baseline at {args.baseline}, run with --save-baseline to create it")
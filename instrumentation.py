@@ -0,0 +1,215 @@
+from contextlib import contextmanager
+from dataclasses import dataclass
+import sys
+import time
+import pandas as pd
+
+try:
+    import resource
+except ImportError:
+    # the resource module is Unix only
+    resource = None
+
+
+PHASES = ("setup", "go", "report")
+
+
+@dataclass(frozen=True)
+class Instrumentation:
+    """What to measure of every experiment of a sweep.
+
+    Every experiment gets the columns
+
+    - "Setup time", "Go time" and "Report time": wall seconds spent setting
+      the model up, stepping it and fetching its reporters;
+    - "Round trips": number of calls to the JVM (0 with the NumPy engine);
+    - "Ticks per second": final tick over the time stepping the model;
+    - "Peak memory (MB)": peak resident memory of the worker while the
+      experiment ran; where the OS cannot reset the peak of a process (all
+      but Linux), the peak of the worker so far;
+    - "Memory growth (MB)": how much that peak exceeds the resident memory
+      of the worker when the experiment started;
+    - "Neighbor rebuild rate": fraction of the neighbor sets of the local
+      center of mass queried anew rather than reused from the previous tick
+      (NaN but with the NeighborCache of the NumPy engine);
+
+    and, with NetLogo, the inclusive milliseconds of every profiled
+    procedure measured by the `profiler` extension while the model steps,
+    in "Profile <procedure> (ms)" columns. The experiments of an ensemble
+    share the times and the memory growth of their batch equally, and report
+    its peak memory as their own.
+
+    Attributes
+    ----------
+    profile_procedures : tuple of str
+        NetLogo procedures to profile, e.g. ("go-sheep-strombom",
+        "com-force-strombom", "shepherd-velocity-strombom")
+
+    """
+
+    profile_procedures: tuple = ()
+
+    def recorder(self, link=None):
+        """a Recorder of a new experiment, counting the calls to link"""
+        return Recorder(self, link)
+
+    def profile_columns(self):
+        return [f"Profile {p} (ms)" for p in self.profile_procedures]
+
+    def profile_reporters(self):
+        """NetLogo reporters of the profiled times, in profile_columns order"""
+        return [f'profiler:inclusive-time "{p}"' for p in self.profile_procedures]
+
+
+class CountingLink:
+    """A NetLogoLink counting its round trips to the JVM.
+
+    Parameters
+    ----------
+    link : pynetlogo.NetLogoLink
+        the link to wrap
+
+    """
+
+    def __init__(self, link):
+        self.link = link
+        self.round_trips = 0
+
+    def command(self, netlogo_command):
+        self.round_trips += 1
+        return self.link.command(netlogo_command)
+
+    def report(self, netlogo_reporter):
+        self.round_trips += 1
+        return self.link.report(netlogo_reporter)
+
+    def __getattr__(self, name):
+        return getattr(self.link, name)
+
+
+def peak_memory():
+    """peak resident memory of this process, in MB, NaN if unknown"""
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    # in kB; unlike ru_maxrss, reset by reset_peak_memory
+                    return int(line.split()[1]) / 2**10
+    except OSError:
+        pass
+    if resource is None:
+        return float("nan")
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes elsewhere
+    return rss / 2**20 if sys.platform == "darwin" else rss / 2**10
+
+
+def reset_peak_memory():
+    """reset the peak resident memory of this process to the current one
+
+    Returns
+    -------
+    bool
+        whether the OS allowed it, which only Linux does
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+    except OSError:
+        return False
+    return True
+
+
+class Recorder:
+    """Measurements of one experiment, or of one ensemble.
+
+    Parameters
+    ----------
+    instrumentation : Instrumentation
+        what to measure
+    link : CountingLink, optional
+        the link whose round trips are counted
+
+    """
+
+    def __init__(self, instrumentation: Instrumentation, link=None):
+        self.instrumentation = instrumentation
+        self.link = link
+        self.round_trips = 0 if link is None else link.round_trips
+        self.times = dict.fromkeys(PHASES, 0.0)
+        self.profile = [float("nan")] * len(instrumentation.profile_procedures)
+        self.neighbor_rebuild_rate = float("nan")
+        reset_peak_memory()
+        self.start_memory = peak_memory()
+
+    @contextmanager
+    def phase(self, name):
+        """time the block as part of a phase"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.times[name] += time.perf_counter() - start
+
+    def columns(self, final_tick, size=1):
+        """the measurements, as result columns
+
+        Parameters
+        ----------
+        final_tick : int or np.ndarray
+            final tick of the experiment, or of every member of an ensemble
+        size : int, default=1
+            number of experiments sharing the measurements
+
+        Returns
+        -------
+        dict
+            the columns, see `Instrumentation`
+        """
+        round_trips = 0 if self.link is None else self.link.round_trips
+        go = self.times["go"] / size
+        peak = peak_memory()
+        columns = {
+            "Setup time": self.times["setup"] / size,
+            "Go time": go,
+            "Report time": self.times["report"] / size,
+            "Round trips": (round_trips - self.round_trips) // size,
+            "Ticks per second": final_tick / go if go > 0 else float("nan"),
+            "Peak memory (MB)": peak,
+            "Memory growth (MB)": (peak - self.start_memory) / size,
+            "Neighbor rebuild rate": self.neighbor_rebuild_rate,
+        }
+        for column, ms in zip(self.instrumentation.profile_columns(), self.profile):
+            columns[column] = ms / size
+        return columns
+
+
+def instrumentation_report(results: pd.DataFrame, by="num_sheep"):
+    """the measurements of a sweep, aggregated over a parameter
+
+    Parameters
+    ----------
+    results : pd.DataFrame
+        results with the columns of an Instrumentation, indexed or with a
+        column by
+    by : str or list of str, default="num_sheep"
+        the parameters to aggregate over
+
+    Returns
+    -------
+    pd.DataFrame
+        the mean of every measurement, the total time and the number of
+        experiments, for every value of by
+    """
+    results = results.reset_index()
+    columns = ["Setup time", "Go time", "Report time", "Round trips"]
+    columns += ["Ticks per second", "Peak memory (MB)", "Memory growth (MB)"]
+    columns += ["Neighbor rebuild rate"]
+    columns += [c for c in results.columns if c.startswith("Profile ")]
+    grouped = results.groupby(by)
+    report = grouped[columns].mean()
+    report["Total time"] = (
+        grouped[["Setup time", "Go time", "Report time"]].sum().sum(axis=1)
+    )
+    report["Experiments"] = grouped.size()
+    return report
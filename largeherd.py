@@ -0,0 +1,473 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.sharedctypes import RawArray
+import math
+import os
+import numpy as np
+from scipy.spatial import cKDTree
+
+from seeding import Stream, generator
+from simulation import (
+    GOAL_TOLERANCE,
+    MAX_PCOR,
+    MIN_PCOR,
+    PATCH_SIZE,
+    ModelParameters,
+    effective_num_neighbors,
+    heading_to_vec2,
+    move_agents,
+    normalize,
+    random_vec2,
+    setup_parameters,
+)
+
+# float32 fields of a sheep, the rows of a buffer of the shared state
+FIELDS = ("x", "y", "heading_x", "heading_y")
+# bytes per sheep of the two buffers of the shared state
+SHARED_BYTES_PER_SHEEP = 2 * len(FIELDS) * 4
+# bytes per sheep the coordinator keeps besides: tile (int32), spread
+# (float32) and two float32 scratch fields
+COORDINATOR_BYTES_PER_SHEEP = 4 + 4 + 2 * 4
+# bytes per sheep the coordinator allocates while it sorts the herd by tile:
+# the sort order (int64) and the merge buffer of the stable argsort (int64,
+# for half the herd)
+SORT_BYTES_PER_SHEEP = 8 + 4
+
+# state of a worker process, set by `attach`
+_worker = {}
+
+
+class SharedHerd:
+    """Sheep state in shared memory, as float32 structure of arrays.
+
+    Two buffers, shaped (len(FIELDS), N) each, hold the state before and
+    after a tick, so workers read one and write the other without locks.
+    The memory is inherited by the worker processes when they start.
+
+    Parameters
+    ----------
+    num_sheep : int
+        number of sheep
+    raw : multiprocessing.RawArray, optional
+        the shared memory of an existing SharedHerd, by default new memory
+
+    """
+
+    def __init__(self, num_sheep, raw=None):
+        if raw is None:
+            raw = RawArray("f", 2 * len(FIELDS) * num_sheep)
+        self.raw = raw
+        self.buffers = np.frombuffer(raw, dtype=np.float32).reshape(
+            2, len(FIELDS), num_sheep
+        )
+
+
+class TileGrid:
+    """Square tiles covering the world, numbered row by row along x.
+
+    Parameters
+    ----------
+    tile_size : float
+        width of a tile, in patches
+
+    """
+
+    def __init__(self, tile_size):
+        self.tile_size = tile_size
+        self.origin = MIN_PCOR - PATCH_SIZE / 2
+        self.side = math.ceil((MAX_PCOR - MIN_PCOR + PATCH_SIZE) / tile_size)
+
+    def __len__(self):
+        return self.side**2
+
+    def tile_of(self, x, y):
+        """tile of every position"""
+        tx = np.clip(
+            ((x - self.origin) // self.tile_size).astype(np.int32), 0, self.side - 1
+        )
+        ty = np.clip(
+            ((y - self.origin) // self.tile_size).astype(np.int32), 0, self.side - 1
+        )
+        return tx * self.side + ty
+
+    def around(self, tile, rings):
+        """the tiles at most rings tiles from tile, tile first, and their extent
+
+        Returns
+        -------
+        tiles : np.ndarray
+            the tile numbers
+        lower, upper : np.ndarray
+            corners of the square they cover, shaped (2,); infinite on the
+            sides where they reach the edge of the world
+        """
+        tx, ty = divmod(tile, self.side)
+        xs = np.arange(max(tx - rings, 0), min(tx + rings, self.side - 1) + 1)
+        ys = np.arange(max(ty - rings, 0), min(ty + rings, self.side - 1) + 1)
+        tiles = (xs[:, None] * self.side + ys).ravel()
+        tiles = np.concatenate([[tile], tiles[tiles != tile]])
+        first = np.array([xs[0], ys[0]])
+        last = np.array([xs[-1], ys[-1]])
+        lower = np.where(first > 0, self.origin + first * self.tile_size, -np.inf)
+        upper = np.where(
+            last < self.side - 1, self.origin + (last + 1) * self.tile_size, np.inf
+        )
+        return tiles, lower, upper
+
+
+def attach(raw, parameters, seed, tile_size):
+    """worker initializer: attach to the shared state of a LargeHerd"""
+    configure(SharedHerd(parameters.num_sheep, raw), parameters, seed, tile_size)
+
+
+def configure(herd: SharedHerd, parameters, seed, tile_size):
+    """set the state `update_tiles` works on"""
+    _worker.update(
+        herd=herd,
+        parameters=parameters,
+        seed=seed,
+        grid=TileGrid(tile_size),
+        num_neighbors=max(effective_num_neighbors(parameters), 1),
+    )
+
+
+def gather(state, bounds, tiles):
+    """positions of the sheep of tiles, shaped (n, 2), in float64"""
+    index = np.concatenate([np.arange(bounds[t], bounds[t + 1]) for t in tiles])
+    return np.stack([state[0, index], state[1, index]], axis=-1).astype(float)
+
+
+def update_tiles(tick, current, tiles, bounds, rings, shepherd_pos):
+    """advance the sheep of tiles by one tick, see `sheep_heading_strombom`
+
+    The sheep are read from buffer current of the shared state and written
+    to the other one. A tile sees the sheep of the tiles around it, the halo,
+    deep enough for the sheep repulsion; the k nearest neighbors of a sheep
+    are taken from a halo widened ring by ring until no sheep outside it can
+    be closer than the k-th one, starting from rings[tile] rings, or the
+    depth of the repulsion if 0.
+
+    Returns
+    -------
+    widened : int
+        number of sheep whose halo had to be widened for their neighbors
+    depth : np.ndarray
+        the depth every tile of tiles needed, where the next tick starts
+    """
+    p = _worker["parameters"]
+    grid = _worker["grid"]
+    k = _worker["num_neighbors"]
+    buffers = _worker["herd"].buffers
+    state, out = buffers[current], buffers[1 - current]
+    widened = 0
+    base_rings = max(1, math.ceil(p.radius_sheep / grid.tile_size))
+    depth = np.maximum(rings[tiles], base_rings)
+    for i, tile in enumerate(tiles):
+        start, stop = bounds[tile], bounds[tile + 1]
+        n = stop - start
+        if n == 0:
+            continue
+        pos = np.stack([state[0, start:stop], state[1, start:stop]], axis=-1)
+        pos = pos.astype(float)
+        heading = np.stack([state[2, start:stop], state[3, start:stop]], axis=-1)
+        heading = heading.astype(float)
+
+        # local center of mass from the nearest sheep of the halo
+        lcm = np.empty_like(pos)
+        pending = np.arange(n)
+        first_rings = rings = depth[i]
+        while len(pending):
+            around, lower, upper = grid.around(tile, rings)
+            local = gather(state, bounds, around)
+            tree = cKDTree(local)
+            if rings == first_rings:
+                halo_tree = tree
+                halo = local
+            distance, nearest = tree.query(pos[pending], k=[*range(1, k + 1)])
+            reach = np.minimum(pos[pending] - lower, upper - pos[pending]).min(axis=-1)
+            exact = distance[:, -1] <= reach
+            if np.all(np.isinf(lower)) and np.all(np.isinf(upper)):
+                exact[:] = True
+            lcm[pending[exact]] = local[np.sort(nearest[exact], axis=-1)].mean(axis=-2)
+            if rings > first_rings:
+                widened += np.count_nonzero(exact)
+            pending = pending[~exact]
+            rings += 1
+        depth[i] = rings - 1
+        # like `lcm` in models/Shepherds.nlogo, both coordinates are the mean x
+        lcm = lcm[:, [0, 0]]
+
+        # repulsion by the other sheep within radius-sheep
+        pairs = cKDTree(pos).sparse_distance_matrix(
+            halo_tree, p.radius_sheep, output_type="ndarray"
+        )
+        pairs = pairs[(pairs["i"] != pairs["j"]) & (pairs["v"] > 0)]
+        away = (pos[pairs["i"]] - halo[pairs["j"]]) / pairs["v"][:, None]
+        r_sheep = np.zeros_like(pos)
+        for axis in range(2):
+            r_sheep[:, axis] = np.bincount(
+                pairs["i"], weights=away[:, axis], minlength=n
+            )
+
+        # repulsion by the shepherds within radius-shepherd
+        away = pos[:, None, :] - shepherd_pos[None, :, :]
+        shepherd_distance = np.linalg.norm(away, axis=-1)
+        nearby = shepherd_distance < p.radius_shepherd
+        any_nearby = np.any(nearby, axis=-1)
+        safe = np.where(nearby & (shepherd_distance > 0), shepherd_distance, np.inf)
+        r_shepherd = normalize(np.sum(away / safe[..., None] ** 2, axis=-2))
+
+        rng = np.random.default_rng([_worker["seed"], tick, tile])
+        noise = random_vec2(rng, (n,))
+        graze = rng.random(n)
+        move = any_nearby | (graze < p.probability_move_while_grazing)
+        direction = p.weight_inertia * heading
+        direction += any_nearby[:, None] * (
+            p.weight_com * normalize(lcm - pos) + p.weight_r_shepherd * r_shepherd
+        )
+        direction += p.weight_r_sheep * normalize(r_sheep)
+        direction += p.weight_epsilon * noise
+        new_pos, new_heading = move_agents(
+            pos, heading, normalize(direction), p.sheep_speed
+        )
+        new_pos = np.where(move[:, None], new_pos, pos)
+        new_heading = np.where(move[:, None], new_heading, heading)
+        out[0:2, start:stop] = new_pos.T
+        out[2:4, start:stop] = new_heading.T
+    return widened, depth
+
+
+class LargeHerd:
+    """Strombom model for herds of 10^5 to 10^6 sheep on several cores.
+
+    The world is split into square tiles. The sheep are kept sorted by tile
+    in a `SharedHerd`, float32 structure of arrays in shared memory, and the
+    tiles are updated in parallel by worker processes attached to it. A tile
+    reads the sheep of the tiles around it, its halo, for the sheep
+    repulsion and the local center of mass, and writes its own sheep to the
+    second buffer. The coordinator then sorts the sheep by tile again,
+    reduces the herd for the shepherds and the win condition, and moves the
+    shepherds. Like `Simulation`, every sheep observes the herd as it was at
+    the start of the tick. Every tile draws its random numbers from its own
+    stream, keyed by seed, tick and tile, so a run does not depend on the
+    number of workers. The halo depth every tile needed is kept by the
+    coordinator for the next tick, so `widened` does not depend on it either.
+
+    Memory per sheep is bounded: SHARED_BYTES_PER_SHEEP (32) bytes of shared
+    state and COORDINATOR_BYTES_PER_SHEEP (16) bytes in the coordinator,
+    which sorts the herd in place field by field, plus SORT_BYTES_PER_SHEEP
+    (12) bytes while it sorts, a peak of 60 MB per million sheep each tick
+    (measured: about 64 MB). Setup, which draws the herd in float64 before it
+    is stored, peaks higher, at about 80 MB per million sheep. Besides, a
+    worker holds float64 copies of the tile it updates and of its halo, and
+    num_neighbors indices for every sheep of the tile, which depend on the
+    tile size and the herd density, not on the herd size.
+
+    Parameters
+    ----------
+    parameters : ModelParameters
+        model parameters, of the "strombom" sheep and shepherd models
+    seed : int, optional
+        the random seed
+    num_workers : int, optional
+        number of worker processes, by default the number of cores; with 1,
+        the tiles are updated in this process
+    tile_size : float, default=20.0
+        width of a tile, in patches
+
+    """
+
+    def __init__(
+        self, parameters: ModelParameters, seed=None, num_workers=None, tile_size=20.0
+    ):
+        p = setup_parameters(parameters)
+        if p.sheep_model != "strombom" or p.shepherd_model != "strombom":
+            raise NotImplementedError("LargeHerd runs Strombom sheep and shepherds")
+        self.parameters = p
+        self.seed = np.random.SeedSequence(seed).entropy if seed is None else seed
+        self.num_workers = os.cpu_count() if num_workers is None else num_workers
+        self.grid = TileGrid(tile_size)
+        self.herd = SharedHerd(p.num_sheep)
+        self.tile = np.empty(p.num_sheep, dtype=np.int32)
+        self.spread = np.empty(p.num_sheep, dtype=np.float32)
+        self.scratch = np.empty((2, p.num_sheep), dtype=np.float32)
+        # halo depth that found the neighbors of every tile last tick, 0 if none
+        self.rings = np.zeros(len(self.grid), dtype=int)
+        if self.num_workers > 1:
+            self.executor = ProcessPoolExecutor(
+                self.num_workers,
+                initializer=attach,
+                initargs=(self.herd.raw, p, self.seed, tile_size),
+            )
+        else:
+            self.executor = None
+            configure(self.herd, p, self.seed, tile_size)
+        self.widened = 0
+        self.setup()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """stop the workers"""
+        if self.executor is not None:
+            self.executor.shutdown()
+        else:
+            _worker.clear()
+
+    @property
+    def state(self):
+        """current sheep state, shaped (len(FIELDS), N)"""
+        return self.herd.buffers[self.current]
+
+    @property
+    def sheep_pos(self):
+        return self.state[:2].T
+
+    def setup(self):
+        """place the agents and reset the tick counter (`setup`)"""
+        p = self.parameters
+        rng = generator(self.seed, Stream.SHEPHERDS)
+        sheep_rng = generator(self.seed, Stream.SHEEP)
+        self.f_n = p.radius_sheep * p.num_sheep ** (2 / 3)
+        self.dest = np.array([p.dest_x, p.dest_y], dtype=float)
+        self.shepherd_heading = heading_to_vec2(rng.integers(0, 360, p.num_shepherds))
+        self.shepherd_pos = rng.uniform(MIN_PCOR, MAX_PCOR, (p.num_shepherds, 2))
+        self.current = 0
+        state = self.state
+        state[2:4] = heading_to_vec2(sheep_rng.integers(0, 360, p.num_sheep)).T
+        state[0:2] = sheep_rng.uniform(MIN_PCOR / 2, MAX_PCOR / 2, (p.num_sheep, 2)).T
+        self.sort_by_tile()
+        self.ticks = 0
+        self.observe()
+        self.check_win()
+
+    def sort_by_tile(self):
+        """sort the current sheep state by tile and find the tile bounds
+
+        The tiles are computed into and the fields permuted through the
+        buffers of the coordinator, so only the sort order is allocated.
+        """
+        state, tile, scratch = self.state, self.tile, self.scratch[0]
+        grid = self.grid
+        tile[:] = 0
+        for axis, scale in ((0, grid.side), (1, 1)):
+            np.subtract(state[axis], grid.origin, out=scratch)
+            np.floor_divide(scratch, grid.tile_size, out=scratch)
+            np.clip(scratch, 0, grid.side - 1, out=scratch)
+            scratch *= scale
+            np.add(tile, scratch, out=tile, casting="unsafe")
+        order = np.argsort(tile, kind="stable")
+        for field in state:
+            np.take(field, order, out=scratch)
+            field[:] = scratch
+        del order
+        counts = np.bincount(tile, minlength=len(grid))
+        self.bounds = np.concatenate([[0], np.cumsum(counts)])
+
+    def tasks(self):
+        """the occupied tiles, split into runs of about equally many sheep"""
+        counts = np.diff(self.bounds)
+        tiles = np.flatnonzero(counts)
+        if self.executor is None:
+            return [tiles]
+        parts = min(4 * self.num_workers, len(tiles))
+        cumulative = np.cumsum(counts[tiles])
+        cuts = np.searchsorted(
+            cumulative, np.arange(1, parts) * cumulative[-1] / parts, side="right"
+        )
+        return [t for t in np.split(tiles, cuts) if len(t)]
+
+    def observe(self):
+        """global center of mass and spread of the herd"""
+        pos = self.state[:2]
+        self.gcm = pos.mean(axis=-1, dtype=float)
+        dx, dy = self.scratch
+        np.subtract(pos[0], self.gcm[0], out=dx)
+        np.subtract(pos[1], self.gcm[1], out=dy)
+        np.hypot(dx, dy, out=self.spread)
+
+    def go(self):
+        """advance the herd by one tick (`go`)"""
+        args = (self.ticks, self.current)
+        tasks = self.tasks()
+        calls = [(*args, t, self.bounds, self.rings, self.shepherd_pos) for t in tasks]
+        if self.executor is None:
+            results = [update_tiles(*call) for call in calls]
+        else:
+            results = list(self.executor.map(update_tiles, *zip(*calls)))
+        for tiles, (widened, depth) in zip(tasks, results):
+            self.widened += widened
+            self.rings[tiles] = depth
+        self.current = 1 - self.current
+        self.sort_by_tile()
+        self.observe()
+        self.move_shepherds(
+            np.random.default_rng([self.seed, self.ticks, len(self.grid)])
+        )
+        self.ticks += 1
+        self.check_win()
+
+    def move_shepherds(self, rng):
+        """move the shepherds (`shepherd-strombom`)"""
+        p = self.parameters
+        x, y = self.state[0], self.state[1]
+        dx, dy = self.scratch
+        too_close = np.zeros(p.num_shepherds, dtype=bool)
+        for i, (sx, sy) in enumerate(self.shepherd_pos):
+            np.subtract(x, sx, out=dx)
+            np.subtract(y, sy, out=dy)
+            too_close[i] = np.hypot(dx, dy, out=dx).min() < 3 * p.radius_sheep
+        if self.spread.max() > self.f_n:
+            furthest = np.argmax(self.spread)
+            furthest_pos = np.array([x[furthest], y[furthest]], dtype=float)
+            target = furthest_pos + p.radius_sheep * normalize(furthest_pos - self.gcm)
+        else:
+            target = self.gcm - p.radius_sheep * np.sqrt(p.num_sheep) * normalize(
+                self.dest - self.gcm
+            )
+        v = normalize(target - self.shepherd_pos)
+        v = np.where(too_close[:, None], 0.0, v)
+        noise = p.weight_epsilon * random_vec2(rng, (p.num_shepherds,))
+        vhat = np.where(
+            np.any(v != 0, axis=-1, keepdims=True),
+            normalize(noise + v),
+            normalize(noise),
+        )
+        self.shepherd_pos, self.shepherd_heading = move_agents(
+            self.shepherd_pos, self.shepherd_heading, vhat, p.shepherd_speed
+        )
+
+    def go_for(self, iters, max_ticks=None):
+        """run `go` iters times or until the herd reaches the goal (`go-for`)"""
+        for _ in range(iters):
+            self.go()
+            if self.win or (max_ticks is not None and self.ticks >= max_ticks):
+                break
+
+    def check_win(self):
+        """update the win condition (`check-win`)"""
+        self.cohesive = not self.spread.max() > self.f_n
+        self.at_goal = self.gcm_distance_from_goal() < GOAL_TOLERANCE
+        self.win = self.cohesive and self.at_goal
+
+    def max_spread_global(self):
+        """`max-spread-global`"""
+        return float(self.spread.max())
+
+    def average_spread_global(self):
+        """`average-spread-global`"""
+        return float(self.spread.mean(dtype=float))
+
+    def gcm_distance_from_goal(self):
+        """`gcm-distance-from-goal`"""
+        return float(np.linalg.norm(self.gcm - self.dest))
+
+    def average_distance_from_goal(self):
+        """`average-distance-from-goal`"""
+        dx, dy = self.scratch
+        np.subtract(self.state[0], self.dest[0], out=dx)
+        np.subtract(self.state[1], self.dest[1], out=dy)
+        return float(np.hypot(dx, dy, out=dx).mean(dtype=float))
@@ -0,0 +1,179 @@
+from functools import lru_cache
+import numpy as np
+
+
+def formation_function(delta, num_shepherds):
+    """the product of `fn-delta` without the speed term
+
+    2 ^ (m - 1) * prod_{k=1}^{m-1} sin(k * 180 / m + delta / (2 - 2m)), with
+    angles in degrees, which equals sin(m x) / sin(x) for x = delta / (2 - 2m).
+
+    Parameters
+    ----------
+    delta : np.ndarray
+        formation angles in degrees
+    num_shepherds : int
+        number of shepherds m, at least 2
+
+    Returns
+    -------
+    np.ndarray
+        the function values
+
+    """
+    m = num_shepherds
+    delta = np.asarray(delta, dtype=float)
+    k = np.arange(1, m)
+    angles = np.deg2rad(k * 180 / m + delta[..., None] / (2 - 2 * m))
+    return 2.0 ** (m - 1) * np.prod(np.sin(angles), axis=-1)
+
+
+def formation_slope(delta, num_shepherds):
+    """derivative of `formation_function` with respect to delta"""
+    m = num_shepherds
+    delta = np.asarray(delta, dtype=float)
+    k = np.arange(1, m)
+    angles = np.deg2rad(k * 180 / m + delta[..., None] / (2 - 2 * m))
+    # d/d(delta) prod_k sin(a_k) = sum_k cos(a_k) prod_{j != k} sin(a_j) da/d(delta)
+    sines = np.sin(angles)
+    ones = np.ones_like(sines[..., :1])
+    before = np.cumprod(np.concatenate([ones, sines[..., :-1]], axis=-1), axis=-1)
+    after = np.cumprod(np.concatenate([ones, sines[..., :0:-1]], axis=-1), axis=-1)[
+        ..., ::-1
+    ]
+    slope = np.sum(np.cos(angles) * before * after, axis=-1)
+    return 2.0 ** (m - 1) * slope * np.deg2rad(1 / (2 - 2 * m))
+
+
+class PiersonSolver:
+    """Formation angle of the Pierson shepherds as a function of the speed term.
+
+    `compute-delta-pierson` finds the root in [0, 360] of
+    f(delta) = formation_function(delta, m) - v with a Brent search every tick.
+    The function decreases monotonically from m at delta = 0 to 0 at
+    delta = 360 (m - 1) / m and stays negative beyond, so the root is unique
+    for 0 <= v < m. The solver tabulates the root on a uniform grid of v once
+    per number of shepherds; a query is a linear interpolation in the table
+    polished by Newton steps kept inside the bracketing table cell.
+
+    Parameters
+    ----------
+    num_shepherds : int
+        number of shepherds m, at least 2
+    max_speed : float
+        largest speed term the table covers; larger values are solved
+        without the table
+    tolerance : float, default=1e-7
+        largest error of the plain linear interpolation, in degrees; the
+        table is refined until it is met
+
+    """
+
+    def __init__(self, num_shepherds, max_speed, tolerance=1e-7):
+        if num_shepherds < 2:
+            raise ValueError("the Pierson formation needs at least 2 shepherds")
+        if not 0 <= max_speed < num_shepherds:
+            raise ValueError(f"max_speed must lie in [0, {num_shepherds})")
+        self.num_shepherds = num_shepherds
+        self.max_delta = 360 * (num_shepherds - 1) / num_shepherds
+        self.max_speed = max_speed
+        self.tolerance = tolerance
+
+        num = 64
+        while True:
+            speeds = np.linspace(0, max_speed, num + 1)
+            deltas = self.bisect(speeds)
+            midpoints = self.bisect((speeds[:-1] + speeds[1:]) / 2)
+            error = np.abs((deltas[:-1] + deltas[1:]) / 2 - midpoints).max()
+            if error <= tolerance or num >= 2**20:
+                break
+            num *= 2
+        self.step = max_speed / num
+        self.speeds = speeds
+        self.deltas = deltas
+
+    def bisect(self, v, lower=None, upper=None, iterations=60):
+        """vectorized bisection of the formation angles of speeds v"""
+        v = np.asarray(v, dtype=float)
+        lower = np.zeros_like(v) if lower is None else lower
+        upper = np.full_like(v, self.max_delta) if upper is None else upper
+        for _ in range(iterations):
+            mid = (lower + upper) / 2
+            above = formation_function(mid, self.num_shepherds) > v
+            lower = np.where(above, mid, lower)
+            upper = np.where(above, upper, mid)
+        return (lower + upper) / 2
+
+    def __call__(self, v, newton_steps=2):
+        """formation angles, in degrees, of the speed terms v
+
+        Parameters
+        ----------
+        v : float or np.ndarray
+            the speed terms, in [0, m)
+        newton_steps : int, default=2
+            number of Newton polishing steps after the interpolation
+
+        Returns
+        -------
+        float or np.ndarray
+            the formation angles
+
+        """
+        scalar = np.ndim(v) == 0
+        v = np.atleast_1d(np.asarray(v, dtype=float))
+        if np.any((v < 0) | (v >= self.num_shepherds)):
+            raise ValueError(f"speed terms must lie in [0, {self.num_shepherds})")
+
+        cell = np.clip(np.floor(v / self.step).astype(int), 0, len(self.speeds) - 2)
+        in_table = v <= self.max_speed
+        lower = np.where(in_table, self.deltas[cell + 1], 0.0)
+        upper = np.where(in_table, self.deltas[cell], self.max_delta)
+        fraction = v / self.step - cell
+        delta = (
+            self.deltas[cell] + (self.deltas[cell + 1] - self.deltas[cell]) * fraction
+        )
+        if not np.all(in_table):
+            delta[~in_table] = self.bisect(v[~in_table])
+        for _ in range(newton_steps):
+            slope = formation_slope(delta, self.num_shepherds)
+            residual = formation_function(delta, self.num_shepherds) - v
+            step = np.divide(residual, slope, out=np.zeros_like(v), where=slope != 0)
+            delta = np.clip(delta - step, lower, upper)
+        return delta[0] if scalar else delta
+
+
+@lru_cache(maxsize=None)
+def formation_solver(num_shepherds, max_speed):
+    """the cached PiersonSolver of num_shepherds shepherds"""
+    return PiersonSolver(num_shepherds, max_speed)
+
+
+def netlogo_formation_table(num_shepherds, max_speed):
+    """NetLogo command installing the formation table in models/Shepherds.nlogo
+
+    `compute-delta-pierson` interpolates linearly in `delta-table` instead
+    of running the Brent search while `delta-table-m` equals `num-shepherds`
+    and the speed term lies within the table. The table survives `setup`, so
+    it only needs to be sent when the number of shepherds changes.
+
+    Parameters
+    ----------
+    num_shepherds : int
+        number of shepherds
+    max_speed : float
+        shepherd-speed, the largest value of the speed term
+
+    Returns
+    -------
+    str
+        the NetLogo command
+
+    """
+    solver = formation_solver(num_shepherds, max_speed)
+    table = " ".join(f"{delta!r}" for delta in solver.deltas.tolist())
+    return (
+        f"set delta-table [{table}] "
+        f"set delta-table-step {solver.step!r} "
+        f"set delta-table-m {num_shepherds}"
+    )
@@ -1,4 +1,3 @@
-from pathlib import Path
 from os import PathLike
 import pandas as pd
 import matplotlib.pyplot as plt
@@ -6,6 +5,8 @@ import matplotlib as mpl
 from mpl_toolkits.axes_grid1 import make_axes_locatable
 import numpy as np
 
+from storage import load_results
+
 
 def colorbar(mappable):
     ax = mappable.axes
@@ -16,11 +17,16 @@ def colorbar(mappable):
 
 
 def plot_parameter_sweep(results_file: PathLike):
-    """plot the results of the parameter sweep"""
-    from pickle import loads
+    """plot the results of the parameter sweep
 
-    _, _, results = loads(Path(results_file).read_bytes())
-    # (parameters, _), results, _ = loads(Path(results_file).read_bytes())
+    results_file is a ResultsStore directory, a legacy results.pkl or a
+    results frame, e.g. the predictions of `active_parameter_sweep_time_trial`
+    """
+    columns = ["num_sheep", "num_neighbors", "Win?"]
+    if isinstance(results_file, pd.DataFrame):
+        results = results_file.reset_index()[columns]
+    else:
+        results = load_results(results_file, columns)
 
     plt.rcParams.update({"text.usetex": True, "font.family": "Computer Modern Roman"})
 
@@ -0,0 +1,198 @@
+from pathlib import Path
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+
+from instrumentation import Instrumentation
+from stopping import Status, StopRule
+
+# the result columns of a time trial and their types; "Status" and
+# "Stop rule" hold codes into STATUSES and STOP_RULES
+RESULT_FIELDS = [
+    ("Final tick", np.int32),
+    ("Win?", np.bool_),
+    ("Status", np.int8),
+    ("Stop rule", np.int8),
+    ("Final Average Spread", np.float64),
+    ("Final Max Spread", np.float64),
+    ("Final GCM Distance from Goal", np.float64),
+    ("Final Average Distance from Goal", np.float64),
+]
+# the measurement columns of an Instrumentation, besides the profiled times
+MEASUREMENT_FIELDS = [
+    ("Setup time", np.float64),
+    ("Go time", np.float64),
+    ("Report time", np.float64),
+    ("Round trips", np.int64),
+    ("Ticks per second", np.float64),
+    ("Peak memory (MB)", np.float64),
+    ("Memory growth (MB)", np.float64),
+    ("Neighbor rebuild rate", np.float64),
+]
+STATUSES = list(Status)
+STOP_RULES = [None, *StopRule]
+
+# the buffer a worker last attached to, as (path, array)
+_attached = None
+
+
+def shared_directory():
+    """directory of the shared memory files, in memory where the OS has one"""
+    return "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+
+
+def result_dtype(instrumentation: Instrumentation = None):
+    """structured dtype of a row of results
+
+    Parameters
+    ----------
+    instrumentation : Instrumentation, optional
+        also hold its measurements, see `Instrumentation`
+
+    Returns
+    -------
+    np.dtype
+        the row type, with a field per result column
+    """
+    fields = list(RESULT_FIELDS)
+    if instrumentation is not None:
+        fields += MEASUREMENT_FIELDS
+        fields += [(c, np.float64) for c in instrumentation.profile_columns()]
+    return np.dtype(fields)
+
+
+class ResultBuffer:
+    """Results of the experiments of a sweep, written in place by the workers.
+
+    The rows live in a structured array memory-mapped from a file in shared
+    memory, one per experiment. Pickled to a worker, the buffer only carries
+    the file name; the worker maps the file once and writes the results of
+    every experiment it runs into its row, so only a status code travels
+    back. The results are read as a DataFrame whose columns are views of
+    the fields, with the codes of "Status" and "Stop rule" decoded.
+
+    The file is removed when the buffer is closed, which keeps the mapping,
+    and so the views, of the parent valid until they are garbage collected.
+
+    Parameters
+    ----------
+    size : int
+        number of rows
+    instrumentation : Instrumentation, optional
+        also hold the measurements of every experiment
+
+    Examples
+    --------
+    >>> with ResultBuffer(len(experiments)) as buffer:
+    ...     # the workers call buffer.write(row, ...)
+    ...     results = buffer.frame(experiments.index)
+    """
+
+    def __init__(self, size, instrumentation: Instrumentation = None):
+        self.dtype = result_dtype(instrumentation)
+        fd, path = tempfile.mkstemp(prefix="results-", dir=shared_directory())
+        os.close(fd)
+        self.path = Path(path)
+        self.array = np.memmap(self.path, dtype=self.dtype, mode="w+", shape=size)
+
+    def __len__(self):
+        return len(self.array)
+
+    def __getstate__(self):
+        return {"path": self.path, "dtype": self.dtype, "size": len(self)}
+
+    def __setstate__(self, state):
+        global _attached
+        self.path = state["path"]
+        self.dtype = state["dtype"]
+        if _attached is None or _attached[0] != self.path:
+            # drop the mapping of the previous sweep, whose file is gone
+            _attached = self.path, np.memmap(
+                self.path, dtype=self.dtype, mode="r+", shape=state["size"]
+            )
+        self.array = _attached[1]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """remove the file; the mappings stay valid"""
+        try:
+            self.path.unlink(missing_ok=True)
+        except PermissionError:
+            # Windows removes no file still mapped
+            pass
+
+    def write(
+        self,
+        row,
+        final_tick,
+        status: Status,
+        stop_rule: StopRule,
+        metrics,
+        measurements=None,
+    ):
+        """write the results of an experiment into its row
+
+        Parameters
+        ----------
+        row : int
+            the row of the experiment
+        final_tick : int
+            its final tick
+        status : Status
+            how it ended
+        stop_rule : StopRule or None
+            the rule that stopped it, if any
+        metrics : tuple of float
+            the final average spread, max spread, GCM distance from the goal
+            and average distance from the goal
+        measurements : dict, optional
+            its measurements, from `Recorder.columns`
+
+        Returns
+        -------
+        int
+            the status code
+        """
+        record = self.array[row]
+        record["Final tick"] = final_tick
+        record["Win?"] = status is Status.WON
+        for (name, _), value in zip(RESULT_FIELDS[4:], metrics):
+            record[name] = value
+        for name, value in (measurements or {}).items():
+            record[name] = value
+        record["Stop rule"] = STOP_RULES.index(stop_rule)
+        code = STATUSES.index(status)
+        record["Status"] = code
+        return code
+
+    def frame(self, index, rows=slice(None)):
+        """the results of rows as a DataFrame sharing the buffer
+
+        Parameters
+        ----------
+        index : pd.Index or list
+            index of the rows
+        rows : slice or np.ndarray, default=slice(None)
+            the rows; a slice keeps the columns views of the buffer, an array
+            of rows copies them
+
+        Returns
+        -------
+        pd.DataFrame
+            the results, with the columns of `run_time_trial`
+        """
+        array = np.asarray(self.array[rows])
+        columns = {name: array[name] for name in self.dtype.names}
+        columns["Status"] = np.array([s.value for s in STATUSES], dtype=object)[
+            array["Status"]
+        ]
+        columns["Stop rule"] = np.array(
+            ["" if r is None else r.value for r in STOP_RULES], dtype=object
+        )[array["Stop rule"]]
+        return pd.DataFrame(columns, index=index, copy=False)
@@ -1,20 +1,48 @@
 from pathlib import Path
-from multiprocessing import Pool
 import pandas as pd
 import numpy as np
 import pynetlogo
-from enum import Enum
-from itertools import repeat
+from enum import Enum, auto
+from dataclasses import asdict, dataclass, replace
 import logging
 import time
 import os
+import sys
+import hashlib
+import json
+import pickle
+import tempfile
+import zlib
 from typing import Optional
 import jpype
-from jpype._core import JVMNotRunning
 
 from utils import *
-from sample import sample, Parameter, SampledParameter, Sampler, Compare
+from sample import (
+    sample,
+    sample_chunks,
+    SampledParameter,
+    Sampler,
+    Compare,
+)
 from plotting import plot_parameter_sweep
+from simulation import ModelParameters, Simulation, Ensemble
+from pierson import netlogo_formation_table
+from storage import ResultsStore, TimeSeriesStore, TIME_SERIES_COLUMNS
+from scheduler import CostModel, Scheduler
+from resultbuffer import ResultBuffer
+from seeding import Stream, netlogo_seed, stream_key, sweep_seeds
+from instrumentation import (
+    CountingLink,
+    Instrumentation,
+    Recorder,
+    instrumentation_report,
+)
+from workqueue import QueueScheduler
+from stopping import Status, StopPolicy, run_status, stop_statistics
+from adaptive import allocate_replicates
+from active import LogisticClassifier, most_uncertain
+from search import MonotoneSearch
+from sensitivity import sobol_problem, saltelli_design, sobol_indices
 
 
 netlogo: pynetlogo.NetLogoLink
@@ -26,14 +54,45 @@ class ShepherdModel(Enum):
     STROMBOM = '"strombom"'
     PIERSON = '"pierson"'
 
+    @property
+    def min_shepherds(self):
+        """smallest number of shepherds the model can run with"""
+        return 2 if self is ShepherdModel.PIERSON else 1
 
-def initializer(modelfile):
+
+class Engine(Enum):
+    """Simulation engine choices"""
+
+    NETLOGO = auto()
+    NUMPY = auto()
+
+
+engine: Engine = Engine.NETLOGO
+# (num_shepherds, shepherd_speed) of the Pierson formation table in the workspace
+formation_table = None
+# NetLogo literals of the globals set by the experiments of a worker, as loaded
+defaults = {}
+# name of the JVM library on every platform, libjvm.so on the others
+JVM_LIBRARIES = {"win32": "jvm.dll", "darwin": "libjvm.dylib"}
+# reporters fetched at the end of a time trial, in a single call
+FINAL_REPORTERS = [
+    "ticks",
+    "average-spread-global",
+    "max-spread-global",
+    "gcm-distance-from-goal",
+    "average-distance-from-goal",
+]
+
+
+def initializer(modelfile, simulation_engine=Engine.NETLOGO):
     """initialize a subprocess
 
     Parameters
     ----------
     modelfile: str, Path
         path to the netlogo model
+    simulation_engine: Engine, default=Engine.NETLOGO
+        the engine that runs the simulations; the NumPy engine does not start a JVM
     """
     # we need to set the instantiated netlogolink as a global so run_simulation can use it
     # create console handler and set level to debug
@@ -55,15 +114,18 @@ def initializer(modelfile):
     # add ch to logger
     log.addHandler(ch)
 
+    global engine
+    engine = simulation_engine
+
+    global start_time
+    start_time = time.time()
+
+    if engine is Engine.NUMPY:
+        log.info(f"Started NumPy worker with PID {os.getpid()}")
+        return
+
     global netlogo
-    jvm_path = (
-        Path(pynetlogo.core.get_netlogo_home())
-        / "runtime"
-        / "bin"
-        / "client"
-        / "jvm.dll"
-    )
-    netlogo = pynetlogo.NetLogoLink(gui=False, jvm_path=f"{jvm_path}")
+    netlogo = CountingLink(pynetlogo.NetLogoLink(gui=False, jvm_path=f"{find_jvm()}"))
 
     netlogo.load_model(f"{modelfile}")
     netlogo.command("setup")
@@ -71,8 +133,155 @@ def initializer(modelfile):
 
     log.info(f"Started worker with PID {os.getpid()}")
 
-    global start_time
-    start_time = time.time()
+
+def find_jvm(netlogo_home=None):
+    """path of the JVM library to run NetLogo with
+
+    The JVM_PATH environment variable takes precedence. Otherwise the JVM
+    bundled with NetLogo is preferred, the server VM over the client VM, and
+    the default JVM of jpype (JAVA_HOME or the system Java) is the fallback.
+
+    Arguments
+    ---------
+    netlogo_home: str, Path, optional
+        the NetLogo installation, found by pynetlogo by default
+
+    Returns
+    -------
+    jvm_path: Path
+        path of jvm.dll, libjvm.dylib or libjvm.so, depending on the platform
+    """
+    if "JVM_PATH" in os.environ:
+        return Path(os.environ["JVM_PATH"])
+    library = JVM_LIBRARIES.get(sys.platform, "libjvm.so")
+    if netlogo_home is None:
+        netlogo_home = pynetlogo.core.get_netlogo_home()
+    if netlogo_home is not None:
+        candidates = sorted(
+            Path(netlogo_home).rglob(library),
+            key=lambda path: ("server" not in path.parts, len(path.parts)),
+        )
+        if candidates:
+            return candidates[0]
+    return Path(jpype.getDefaultJVMPath())
+
+
+def health_check():
+    """round trip to the model of a worker, see `Scheduler.check_health`"""
+    if engine is Engine.NETLOGO:
+        netlogo.report("ticks")
+    return os.getpid()
+
+
+def worker_pool(
+    modelfile, engine=Engine.NETLOGO, num_processes=4, retries=2, timeout=None
+):
+    """a pool of warm workers the sweeps can share
+
+    Booting a worker starts a JVM and loads the model, so a pool entered once
+    around several sweeps, each passed it as their scheduler, pays for it
+    once. The model parameters are reset between experiments (see
+    `setup_simulation`), and wedged workers are restarted.
+
+    Arguments
+    ---------
+    modelfile: str, Path
+        path to the netlogo model
+
+    Keyword Arguments
+    -----------------
+    engine: Engine, default=Engine.NETLOGO
+        the engine that runs the simulations
+    num_processes: int, default=4
+        number of workers
+    retries: int, default=2
+        number of times an experiment whose worker failed is run again
+    timeout: float, optional
+        seconds after which a task is deemed wedged and its workers restarted
+
+    Returns
+    -------
+    scheduler: Scheduler
+        the pool, started when entered
+
+    Examples
+    --------
+    >>> with worker_pool(modelfile, num_processes=18) as pool:
+    ...     strombom = parameter_sweep_time_trial(
+    ...         modelfile, ShepherdModel.STROMBOM, parameters, scheduler=pool
+    ...     )
+    ...     pierson = parameter_sweep_time_trial(
+    ...         modelfile, ShepherdModel.PIERSON, parameters, scheduler=pool
+    ...     )
+    """
+    return Scheduler(
+        num_processes,
+        initializer,
+        (modelfile, engine),
+        retries=retries,
+        health_check=health_check,
+        timeout=timeout,
+    )
+
+
+def queue_pool(
+    directory,
+    modelfile,
+    engine=Engine.NETLOGO,
+    num_local_workers=0,
+    retries=2,
+    lease=60.0,
+):
+    """a work queue the workers of several nodes can share
+
+    Pass it to the sweeps as their scheduler, like `worker_pool`, and start
+    `python workqueue.py <directory>` on every node mounting the directory;
+    the sweeps then run on all of them. Since the workers import the task
+    functions by name, the sweeps must be run from a module importing run,
+    not from `python run.py`.
+
+    Arguments
+    ---------
+    directory: str, Path
+        queue directory, on a filesystem shared by the nodes
+    modelfile: str, Path
+        path to the netlogo model, as seen from the workers
+
+    Keyword Arguments
+    -----------------
+    engine: Engine, default=Engine.NETLOGO
+        the engine that runs the simulations
+    num_local_workers: int, default=0
+        number of workers started on this node
+    retries: int, default=2
+        number of times an experiment whose worker failed or was lost is run
+        again
+    lease: float, default=60.0
+        seconds without a heartbeat of a worker after which its experiments
+        are run again
+
+    Returns
+    -------
+    scheduler: QueueScheduler
+        the queue, opened when entered
+    """
+    return QueueScheduler(
+        directory,
+        initializer,
+        (modelfile, engine),
+        retries=retries,
+        lease=lease,
+        num_local_workers=num_local_workers,
+    )
+
+
+def netlogo_literal(value):
+    """NetLogo literal of a value reported by NetLogo"""
+    if isinstance(value, str):
+        return json.dumps(value)
+    if isinstance(value, (bool, np.bool_)):
+        return "true" if value else "false"
+    return f"{value}"
 
 
 def setup_simulation(experiment: dict, **model_parameters):
@@ -90,22 +299,337 @@ def setup_simulation(experiment: dict, **model_parameters):
     model_parameters: dict
         additional keyword parameters to the model
     """
-    # Set the input parameters
+    # Restore the globals earlier experiments set and this one does not, so a
+    # worker runs every experiment from the state the model was loaded in
+    names = [py2nl(k) for k in {**experiment, **model_parameters} if k != "random_seed"]
+    for name in names:
+        if name not in defaults:
+            defaults[name] = netlogo_literal(netlogo.report(name))
+    commands = [
+        f"set {name} {value}" for name, value in defaults.items() if name not in names
+    ]
+    # Without a seed, the sheep are placed from the main generator
+    if "random_seed" not in experiment:
+        commands.append("set layout-seed 0")
+    # Set the input parameters, sending the whole block as one compound command
     for key, value in experiment.items():
         if key == "random_seed":
-            # The NetLogo random seed requires a different syntax
-            netlogo.command(f"random-seed {value}")
+            # The random seed is a stream key: the sheep are placed from the
+            # layout seed, so it gives the same herd whatever the shepherds
+            commands.append(f"random-seed {netlogo_seed(value, Stream.TICKS)}")
+            commands.append(f"set layout-seed {netlogo_seed(value, Stream.SHEEP)}")
         else:
             # Otherwise, assume the input parameters are global variables
-            netlogo.command(f"set {py2nl(key)} {value}")
+            commands.append(f"set {py2nl(key)} {value}")
     # Set the static model parameters
     for key, value in model_parameters.items():
-        netlogo.command(f"set {py2nl(key)} {value}")
-    netlogo.command("setup")
+        commands.append(f"set {py2nl(key)} {value}")
+    if model_parameters.get("shepherd_model") == ShepherdModel.PIERSON.value:
+        commands.append(formation_table_command(experiment, **model_parameters))
+    commands.append("setup")
+    netlogo.command(" ".join(c for c in commands if c))
+
+
+def formation_table_command(experiment: dict, **model_parameters):
+    """replace the per-tick root finding of the Pierson model by a table lookup
+
+    The table survives `setup`, so it is only sent when the number of
+    shepherds or the shepherd speed changes.
+
+    Arguments
+    ---------
+    experiments: dict
+        dictionary of experiment parameters
+
+    Keyword Arguments
+    -----------------
+    model_parameters: dict
+        additional keyword parameters to the model
+
+    Returns
+    -------
+    command: str
+        the NetLogo command installing the table, or an empty string
+    """
+    global formation_table
+    parameters = {**experiment, **model_parameters}
+    if "num_shepherds" in parameters:
+        num_shepherds = int(parameters["num_shepherds"])
+    elif "num-shepherds" in defaults:
+        num_shepherds = int(float(defaults["num-shepherds"]))
+    else:
+        num_shepherds = int(netlogo.report("num-shepherds"))
+    if "shepherd_speed" in parameters:
+        shepherd_speed = float(parameters["shepherd_speed"])
+    elif "shepherd-speed" in defaults:
+        shepherd_speed = float(defaults["shepherd-speed"])
+    else:
+        shepherd_speed = float(netlogo.report("shepherd-speed"))
+    if formation_table == (num_shepherds, shepherd_speed):
+        return ""
+    if num_shepherds < 2 or shepherd_speed >= num_shepherds:
+        return ""
+    formation_table = (num_shepherds, shepherd_speed)
+    return netlogo_formation_table(num_shepherds, shepherd_speed)
+
+
+@dataclass(frozen=True)
+class Checkpoint:
+    """A run saved at a tick, to fork continuations from.
+
+    A sweep given a checkpoint restores it instead of setting the model up,
+    and its experiments only set the parameters they change, so they share
+    the run up to the checkpoint instead of simulating it again. Pickle a
+    checkpoint to keep it, as `save` does.
+
+    Attributes
+    ----------
+    experiment : dict
+        parameters of the run, with its model parameters
+    ticks : int
+        tick of the checkpoint
+    world : Snapshot or bytes
+        the Snapshot of the NumPy engine, or the NetLogo world written by
+        `export-world`, compressed
+
+    """
+
+    experiment: dict
+    ticks: int
+    world: object
+
+    @property
+    def key(self):
+        """hash identifying the checkpoint"""
+        blob = pickle.dumps((self.experiment, self.ticks, self.world))
+        return hashlib.sha1(blob).hexdigest()[:16]
+
+    def save(self, path):
+        Path(path).write_bytes(pickle.dumps(self))
+
+    @classmethod
+    def load(cls, path):
+        return pickle.loads(Path(path).read_bytes())
+
+
+def save_checkpoint(experiment: dict, ticks: int, **model_parameters):
+    """run an experiment for ticks ticks on this worker and save it
+
+    Arguments
+    ---------
+    experiment: dict
+        dictionary of experiment parameters
+    ticks: int
+        tick of the checkpoint; a run won earlier is saved when it wins
+
+    Keyword Arguments
+    -----------------
+    model_parameters: dict
+        additional keyword parameters to the model
+
+    Returns
+    -------
+    checkpoint: Checkpoint
+        the run at the checkpoint
+    """
+    parameters = {**experiment, **model_parameters}
+    if engine is Engine.NUMPY:
+        simulation = Simulation.from_experiment(experiment, **model_parameters)
+        simulation.go_for(ticks)
+        return Checkpoint(parameters, simulation.ticks, simulation.snapshot())
+    setup_simulation(experiment, **model_parameters)
+    netlogo.command(f"go-for-max {ticks} {ticks}")
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "world.csv"
+        netlogo.command(f'export-world "{path.as_posix()}"')
+        world = zlib.compress(path.read_bytes())
+    return Checkpoint(parameters, int(netlogo.report("ticks")), world)
+
+
+def fork_simulation(checkpoint: Checkpoint, experiment: dict, **model_parameters):
+    """the NumPy simulation of a checkpoint, with the parameters of experiment
+
+    Arguments
+    ---------
+    checkpoint: Checkpoint
+        the checkpoint to fork, saved by the NumPy engine
+    experiment: dict
+        the parameters to change; with a random seed, the continuation runs
+        on its streams instead of those of the checkpoint
+
+    Keyword Arguments
+    -----------------
+    model_parameters: dict
+        additional keyword parameters to change
+
+    Returns
+    -------
+    simulation: Simulation
+        the simulation, at the tick of the checkpoint
+    """
+    parameters, _ = ModelParameters.from_experiment(
+        {**checkpoint.experiment, **experiment}, **model_parameters
+    )
+    return Simulation.from_snapshot(
+        checkpoint.world, experiment.get("random_seed"), **asdict(parameters)
+    )
+
+
+def fork_setup_simulation(checkpoint: Checkpoint, experiment: dict, **model_parameters):
+    """restore a checkpoint in the netlogo model, with the parameters of experiment
+
+    The world is imported and the globals of experiment and model_parameters
+    set, then `fork-setup` adds or removes shepherds as `setup` would.
+
+    Arguments
+    ---------
+    checkpoint: Checkpoint
+        the checkpoint to fork, saved by NetLogo
+    experiment: dict
+        the parameters to change; a random seed reseeds the continuation
+
+    Keyword Arguments
+    -----------------
+    model_parameters: dict
+        additional keyword parameters to change
+    """
+    global formation_table
+    # the world sets the globals of the checkpoint, which later experiments
+    # restore like those they set themselves
+    for key in checkpoint.experiment:
+        name = py2nl(key)
+        if key != "random_seed" and name not in defaults:
+            defaults[name] = netlogo_literal(netlogo.report(name))
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "world.csv"
+        path.write_bytes(zlib.decompress(checkpoint.world))
+        netlogo.command(f'import-world "{path.as_posix()}"')
+    # the world brought the formation table of the checkpoint
+    formation_table = None
+    commands = []
+    for key, value in {**experiment, **model_parameters}.items():
+        if key == "random_seed":
+            commands.append(f"random-seed {netlogo_seed(value, Stream.TICKS)}")
+        else:
+            commands.append(f"set {py2nl(key)} {value}")
+    parameters = {**checkpoint.experiment, **experiment}
+    if {**parameters, **model_parameters}.get(
+        "shepherd_model"
+    ) == ShepherdModel.PIERSON.value:
+        commands.append(formation_table_command(parameters, **model_parameters))
+    commands.append("fork-setup")
+    netlogo.command(" ".join(c for c in commands if c))
+
+
+def time_series_buffer(max_ticks, stride, *batch):
+    """preallocated samples of a run of at most max_ticks ticks
+
+    A run is sampled every stride ticks and at its last tick, so it holds at
+    most max_ticks // stride + 1 samples of TIME_SERIES_COLUMNS.
+    """
+    return np.empty((*batch, max_ticks // stride + 1, len(TIME_SERIES_COLUMNS)))
+
+
+def time_series_sample(model):
+    """the TIME_SERIES_COLUMNS of a Simulation, or of every member of an Ensemble"""
+    return np.stack(
+        [
+            model.ticks,
+            model.average_spread_global(),
+            model.max_spread_global(),
+            model.gcm_distance_from_goal(),
+            model.average_distance_from_goal(),
+        ],
+        axis=-1,
+    )
+
+
+def run_numpy_simulation(
+    experiment: dict,
+    max_ticks=6000,
+    time_series_stride=None,
+    stop_policy: Optional[StopPolicy] = None,
+    recorder: Optional[Recorder] = None,
+    checkpoint: Optional[Checkpoint] = None,
+    **model_parameters,
+):
+    """run the NumPy engine until it finishes or max_ticks ticks
+
+    Arguments
+    ---------
+    experiments: dict
+        dictionary of experiment parameters
+
+    Keyword Arguments
+    -----------------
+    max_ticks: int, default=6000
+        maximum timesteps before halting the experiment
+    time_series_stride: int, optional
+        sample the time series every time_series_stride ticks
+    stop_policy: StopPolicy, optional
+        stop the run early once it stalls
+    recorder: Recorder, optional
+        recorder timing the setup and go phases
+    checkpoint: Checkpoint, optional
+        fork the checkpoint instead of setting the model up
+    model_parameters: dict
+        additional keyword parameters to the model
+
+    Returns
+    -------
+    simulation: Simulation
+        the finished simulation
+    data: np.ndarray or None
+        the time series samples, if time_series_stride is given
+    stop_rule: StopRule or None
+        the rule of stop_policy that stopped the run, if any
+    """
+    recorder = Instrumentation().recorder() if recorder is None else recorder
+    with recorder.phase("setup"):
+        if checkpoint is None:
+            simulation = Simulation.from_experiment(experiment, **model_parameters)
+        else:
+            simulation = fork_simulation(checkpoint, experiment, **model_parameters)
+    data = None
+    if time_series_stride is not None:
+        data = time_series_buffer(max_ticks, time_series_stride)
+    monitor = None if stop_policy is None else stop_policy.monitor()
+    stop_rule = None
+    i = 0
+    stop = False
+    with recorder.phase("go"):
+        while not stop:
+            simulation.go()
+            stop = simulation.win or simulation.ticks >= max_ticks
+            if not stop and monitor and simulation.ticks % stop_policy.interval == 0:
+                stop_rule = monitor.update(
+                    simulation.ticks,
+                    simulation.gcm_distance_from_goal(),
+                    simulation.max_spread_global(),
+                )
+                stop = stop_rule is not None
+            if data is not None and (
+                stop or simulation.ticks % time_series_stride == 0
+            ):
+                data[i] = time_series_sample(simulation)
+                i += 1
+    recorder.neighbor_rebuild_rate = simulation.neighbor_rebuild_rate
+    return simulation, None if data is None else data[:i], stop_rule
 
 
 def run_time_trial(
-    experiment, max_ticks=6000, iteration=0, num_experiments=1, **model_parameters
+    experiment,
+    max_ticks=6000,
+    iteration=0,
+    num_experiments=1,
+    chunk_size=None,
+    time_series_stride=None,
+    time_series_store: Optional[TimeSeriesStore] = None,
+    stop_policy: Optional[StopPolicy] = None,
+    instrumentation: Optional[Instrumentation] = None,
+    results_buffer: Optional[ResultBuffer] = None,
+    checkpoint: Optional[Checkpoint] = None,
+    **model_parameters,
 ):
     """run a netlogo model until it finishes or max_ticks ticks
 
@@ -118,52 +642,154 @@ def run_time_trial(
     -----------------
     max_ticks: int, default=8000
         maximum timesteps before halting the experiment
+    chunk_size: int, optional
+        number of ticks NetLogo runs per call (`go-for-max`); by default the
+        whole run is a single call. The result is the same for any chunk size.
+    time_series_stride: int, optional
+        also sample the final reporters every time_series_stride ticks and at
+        the last tick; NetLogo returns the samples of a chunk in one call
+    time_series_store: TimeSeriesStore, optional
+        store the time series is written to as soon as the run finishes, keyed
+        by its configuration (see `run_configuration`)
+    stop_policy: StopPolicy, optional
+        stop the run early, as stalled, once it stops making progress; with
+        NetLogo the policy is checked between chunks of at most
+        stop_policy.interval ticks
+    instrumentation: Instrumentation, optional
+        also return the measurements of the run, see `Instrumentation`
+    results_buffer: ResultBuffer, optional
+        write the results into row iteration - 1 of the buffer instead of
+        returning them; the time series then goes to time_series_store
+    checkpoint: Checkpoint, optional
+        fork the checkpoint with the parameters of experiment instead of
+        setting the model up; max_ticks counts from the start of the run
     model_parameters: dict, optional
         additional keyword parameters to set up the model
 
     Returns
     -------
     results: pd.Series
-        results of the experiment
+        results of the experiment, or its status code with results_buffer
+    time_series_results: pd.DataFrame
+        the time series, only returned if time_series_stride is given
+        without a time_series_store
     """
-    # Set the input parameters
-    setup_simulation(experiment, **model_parameters)
-    # Run until the model finishes or max_ticks ticks
-    stop = False
-    final_tick = 0
-    # data = np.empty((max_ticks, 5))
-    total_time = 0
-    i = 0
-    while not stop:
-        start = time.process_time()
-        netlogo.command("go")
-        stop = netlogo.report(f"win? or ticks >= {max_ticks}")
-        # data[i, 0] = netlogo.report("ticks")
-        # data[i, 1] = netlogo.report("average-spread-global")
-        # data[i, 2] = netlogo.report("max-spread-global")
-        # data[i, 3] = netlogo.report("gcm-distance-from-goal")
-        # data[i, 4] = netlogo.report("average-distance-from-goal")
-        total_time += time.process_time() - start
-        i += 1
-
-    final_tick = np.int32(netlogo.report("ticks"))
-
-    avg_spread = netlogo.report("average-spread-global")
-    max_spread = netlogo.report("max-spread-global")
-    gcm_dist = netlogo.report("gcm-distance-from-goal")
-    avg_dist = netlogo.report("average-distance-from-goal")
-
-    # logging.getLogger(__name__).debug(
-    #     f"[N={experiment['num_sheep']:d}, n={experiment['num_neighbors']:d}, m={experiment['num_shepherds']:d}] final tick: {final_tick}, avg. tick/s: {final_tick/total_time:.2f}, time: {total_time:.2f}s"
-    # )
+    instrumented = instrumentation is not None
+    instrumentation = Instrumentation() if instrumentation is None else instrumentation
+    profiled = bool(instrumentation.profile_procedures)
+    if engine is Engine.NUMPY:
+        recorder = instrumentation.recorder()
+        simulation, data, stop_rule = run_numpy_simulation(
+            experiment,
+            max_ticks,
+            time_series_stride,
+            stop_policy,
+            recorder,
+            checkpoint,
+            **model_parameters,
+        )
+        final_tick = np.int32(simulation.ticks)
+
+        with recorder.phase("report"):
+            avg_spread = simulation.average_spread_global()
+            max_spread = simulation.max_spread_global()
+            gcm_dist = simulation.gcm_distance_from_goal()
+            avg_dist = simulation.average_distance_from_goal()
+    else:
+        recorder = instrumentation.recorder(netlogo)
+        # Set the input parameters
+        with recorder.phase("setup"):
+            if checkpoint is None:
+                setup_simulation(experiment, **model_parameters)
+            else:
+                fork_setup_simulation(checkpoint, experiment, **model_parameters)
+            if profiled:
+                netlogo.command("profiler:reset profiler:start")
+        # Run until the model finishes or max_ticks ticks, chunk_size ticks per call
+        chunk_size = max_ticks if chunk_size is None else chunk_size
+        # the samples recorded by NetLogo serve both the time series and the
+        # stop policy, so they are taken at the finer of the two strides
+        stride = time_series_stride
+        monitor = None
+        if stop_policy is not None:
+            monitor = stop_policy.monitor()
+            chunk_size = min(chunk_size, stop_policy.interval)
+            stride = stop_policy.interval if stride is None else stride
+            stride = int(np.gcd(stride, stop_policy.interval))
+        data = None
+        if stride is not None:
+            data = time_series_buffer(max_ticks, stride)
+        stop_rule = None
+        stop = False
+        ticks = 0 if checkpoint is None else checkpoint.ticks
+        i = 0
+        while not stop:
+            if data is None:
+                with recorder.phase("go"):
+                    netlogo.command(f"go-for-max {chunk_size} {max_ticks}")
+            else:
+                with recorder.phase("go"):
+                    netlogo.command(f"go-record {chunk_size} {max_ticks} {stride}")
+                with recorder.phase("report"):
+                    window = netlogo.report("time-series-data")
+                window = np.asarray(window, dtype=float)
+                window = window.reshape(-1, len(TIME_SERIES_COLUMNS))
+                data[i : i + len(window)] = window
+                i += len(window)
+            # unless the herd won, the chunk ran to completion
+            ticks += chunk_size
+            with recorder.phase("report"):
+                stop = ticks >= max_ticks or netlogo.report("win?")
+            if not stop and monitor is not None:
+                for sample in window[window[:, 0] % stop_policy.interval == 0]:
+                    stop_rule = monitor.update(sample[0], sample[3], sample[2])
+                    if stop_rule is not None:
+                        break
+                stop = stop_rule is not None
+
+        # reporters that draw from the random number generator (`of`) only
+        # run after the last tick, as before
+        with recorder.phase("report"):
+            if profiled:
+                netlogo.command("profiler:stop")
+            reporters = FINAL_REPORTERS + instrumentation.profile_reporters()
+            final = netlogo.report(f"(list {' '.join(reporters)})")
+        final_tick, avg_spread, max_spread, gcm_dist, avg_dist = final[:5]
+        recorder.profile = list(final[5:])
+        final_tick = np.int32(final_tick)
+        if time_series_stride is None:
+            data = None
+        elif data is not None:
+            # keep the samples of the time series stride and the last one
+            data = data[:i]
+            keep = data[:, 0] % time_series_stride == 0
+            keep[-1:] = True
+            data = data[keep]
+
+    measurements = recorder.columns(final_tick)
     logging.getLogger(__name__).debug(
-        f"Finished experiment {iteration}/{num_experiments} ({iteration/num_experiments:.2%}) in {time.time() - start_time:.2f}s"
+        f"Finished experiment {iteration}/{num_experiments} ({iteration/num_experiments:.2%}) in {time.time() - start_time:.2f}s, "
+        f"final tick: {final_tick}, avg. tick/s: {measurements['Ticks per second']:.2f}"
     )
 
+    status = run_status(final_tick < max_ticks and stop_rule is None, stop_rule)
+    if results_buffer is not None:
+        if data is not None:
+            time_series_store.write(experiment, data)
+        return results_buffer.write(
+            iteration - 1,
+            final_tick,
+            status,
+            stop_rule,
+            (avg_spread, max_spread, gcm_dist, avg_dist),
+            measurements if instrumented else None,
+        )
     final_results = pd.Series(
         [
             final_tick,
-            final_tick < max_ticks,
+            status is Status.WON,
+            status.value,
+            "" if stop_rule is None else stop_rule.value,
             avg_spread,
             max_spread,
             gcm_dist,
@@ -172,24 +798,416 @@ def run_time_trial(
         index=[
             "Final tick",
             "Win?",
+            "Status",
+            "Stop rule",
             "Final Average Spread",
             "Final Max Spread",
             "Final GCM Distance from Goal",
             "Final Average Distance from Goal",
         ],
     )
-    # time_series_results = pd.DataFrame(
-    #     data[:i, :],
-    #     columns=[
-    #         "Tick",
-    #         "Average Spread",
-    #         "Max Spread",
-    #         "GCM Distance from Goal",
-    #         "Average Distance from Goal",
-    #     ],
-    # )
-    return final_results
-    # return experiment, final_results, time_series_results
+    if instrumented:
+        final_results = pd.concat([final_results, pd.Series(measurements)])
+    if data is None:
+        return final_results
+    if time_series_store is not None:
+        time_series_store.write(experiment, data)
+        return final_results
+    time_series_results = pd.DataFrame(data, columns=TIME_SERIES_COLUMNS)
+    return final_results, time_series_results
+
+
+def run_ensemble_time_trial(
+    experiments: pd.DataFrame,
+    max_ticks=6000,
+    iteration=0,
+    num_experiments=1,
+    time_series_stride=None,
+    time_series_store: Optional[TimeSeriesStore] = None,
+    stop_policy: Optional[StopPolicy] = None,
+    instrumentation: Optional[Instrumentation] = None,
+    **model_parameters,
+):
+    """run a batch of experiments together on the NumPy engine
+
+    Arguments
+    ---------
+    experiments: pd.DataFrame
+        experiments sharing everything but num_neighbors and random_seed
+
+    Keyword Arguments
+    -----------------
+    max_ticks: int, default=6000
+        maximum timesteps before halting each experiment
+    time_series_stride: int, optional
+        sample the time series of every member every time_series_stride ticks
+        and at its last tick
+    time_series_store: TimeSeriesStore, optional
+        store the time series are written to, keyed by its configuration (see
+        `run_configuration`); required with time_series_stride
+    stop_policy: StopPolicy, optional
+        stop members early, as stalled, once they stop making progress
+    instrumentation: Instrumentation, optional
+        also return the measurements of the batch, shared by its members
+    model_parameters: dict, optional
+        additional keyword parameters to set up the model
+
+    Returns
+    -------
+    results: pd.DataFrame
+        results of the experiments, indexed like experiments
+    """
+    records = experiments.to_dict("records")
+    instrumented = instrumentation is not None
+    recorder = (instrumentation or Instrumentation()).recorder()
+    with recorder.phase("setup"):
+        ensemble = Ensemble.from_experiments(records, **model_parameters)
+    stop_rules = [None] * len(ensemble)
+    with recorder.phase("go"):
+        if time_series_stride is None and stop_policy is None:
+            ensemble.run(max_ticks)
+        else:
+            if time_series_stride is not None:
+                data = time_series_buffer(max_ticks, time_series_stride, len(ensemble))
+                count = np.zeros(len(ensemble), dtype=int)
+            if stop_policy is not None:
+                monitors = [stop_policy.monitor() for _ in range(len(ensemble))]
+            ensemble.active &= ensemble.ticks < max_ticks
+            while np.any(ensemble.active):
+                members = np.flatnonzero(ensemble.active)
+                ensemble.go(max_ticks)
+                ticks = ensemble.ticks[members]
+                if stop_policy is not None:
+                    check = members[ensemble.active[members]]
+                    check = check[ensemble.ticks[check] % stop_policy.interval == 0]
+                    if len(check):
+                        gcm_distance = ensemble.gcm_distance_from_goal()
+                        max_spread = ensemble.max_spread_global()
+                    for b in check:
+                        stop_rules[b] = monitors[b].update(
+                            ensemble.ticks[b], gcm_distance[b], max_spread[b]
+                        )
+                        ensemble.active[b] = stop_rules[b] is None
+                if time_series_stride is None:
+                    continue
+                done = ~ensemble.active[members]
+                members = members[done | (ticks % time_series_stride == 0)]
+                if len(members) == 0:
+                    continue
+                samples = time_series_sample(ensemble)
+                data[members, count[members]] = samples[members]
+                count[members] += 1
+            if time_series_stride is not None:
+                for b, experiment in enumerate(records):
+                    time_series_store.write(experiment, data[b, : count[b]])
+
+    logging.getLogger(__name__).debug(
+        f"Finished batch {iteration}/{num_experiments} of {len(ensemble)} experiments ({iteration/num_experiments:.2%}) in {time.time() - start_time:.2f}s"
+    )
+
+    final_tick = ensemble.ticks.astype(np.int32)
+    status = [
+        run_status(t < max_ticks and rule is None, rule)
+        for t, rule in zip(final_tick, stop_rules)
+    ]
+    with recorder.phase("report"):
+        results = pd.DataFrame(
+            {
+                "Final tick": final_tick,
+                "Win?": [s is Status.WON for s in status],
+                "Status": [s.value for s in status],
+                "Stop rule": [
+                    "" if rule is None else rule.value for rule in stop_rules
+                ],
+                "Final Average Spread": ensemble.average_spread_global(),
+                "Final Max Spread": ensemble.max_spread_global(),
+                "Final GCM Distance from Goal": ensemble.gcm_distance_from_goal(),
+                "Final Average Distance from Goal": ensemble.average_distance_from_goal(),
+            },
+            index=experiments.index,
+        )
+    if instrumented:
+        results = results.assign(**recorder.columns(final_tick, len(ensemble)))
+    return results
+
+
+def ensemble_batches(experiments: pd.DataFrame, batch_size: int):
+    """split experiments into batches that can share an ensemble
+
+    Experiments are grouped by every parameter except num_neighbors and
+    random_seed, and every group is split into batches of at most batch_size.
+
+    Arguments
+    ---------
+    experiments: pd.DataFrame
+        experiments of the parameter sweep
+    batch_size: int
+        maximum number of experiments per batch
+
+    Returns
+    -------
+    batches: list of pd.DataFrame
+        the batches
+    """
+    shape = [
+        c for c in experiments.columns if c not in ("num_neighbors", "random_seed")
+    ]
+    groups = experiments.groupby(shape, sort=False) if shape else [(None, experiments)]
+    batches = []
+    for _, group in groups:
+        num_batches = -(-len(group) // batch_size)
+        batches.extend(np.array_split(group, num_batches))
+    return batches
+
+
+def run_configuration(
+    scheduler,
+    shepherd_model: ShepherdModel,
+    max_ticks,
+    stop_policy: Optional[StopPolicy] = None,
+    checkpoint: Optional[Checkpoint] = None,
+    time_series_stride=None,
+):
+    """the fixed parameters the results of a run depend on besides its experiments
+
+    A ResultsStore and a TimeSeriesStore hash them with every experiment, so
+    a sweep neither resumes from nor overwrites the results of another
+    shepherd model, engine or checkpoint.
+
+    Keyword Arguments
+    -----------------
+    time_series_stride: int, optional
+        the stride of the time series, which they also depend on
+
+    Returns
+    -------
+    configuration: dict
+        the shepherd model, max_ticks, stop policy, model file, engine and
+        checkpoint key, and the time series stride if given
+    """
+    modelfile, engine = (*scheduler.initargs, Engine.NETLOGO)[:2]
+    configuration = {
+        "shepherd_model": shepherd_model.value,
+        "max_ticks": max_ticks,
+        "stop_policy": repr(stop_policy),
+        "model": Path(modelfile).name,
+        "engine": engine.name,
+        "checkpoint": None if checkpoint is None else checkpoint.key,
+    }
+    if time_series_stride is not None:
+        configuration["time_series_stride"] = time_series_stride
+    return configuration
+
+
+def run_experiments(
+    scheduler: Scheduler,
+    experiments: pd.DataFrame,
+    shepherd_model: ShepherdModel,
+    max_ticks=6000,
+    batch_size=None,
+    chunk_size=None,
+    time_series_stride=None,
+    time_series_store: Optional[TimeSeriesStore] = None,
+    results_store: Optional[ResultsStore] = None,
+    stop_policy: Optional[StopPolicy] = None,
+    cost_model: Optional[CostModel] = None,
+    instrumentation: Optional[Instrumentation] = None,
+    checkpoint: Optional[Checkpoint] = None,
+):
+    """run experiments on the workers of a scheduler
+
+    Arguments
+    ---------
+        scheduler: Scheduler
+            the scheduler whose workers run the experiments
+        experiments: pd.DataFrame
+            the experiments, one per row
+        shepherd_model: ShepherdModel
+            which shepherd model to use
+
+    Keyword Arguments
+    -----------------
+        cost_model: CostModel, optional
+            cost model ranking the experiments, refined as they finish; pass
+            the same one to successive calls to keep what it learned
+
+    The other keyword arguments are those of `parameter_sweep_time_trial`.
+
+    On a process pool, the workers write the results of single experiments
+    into a shared ResultBuffer and only return their status, and the results
+    are views of the buffer.
+
+    Returns
+    -------
+        results: pd.DataFrame
+            results of the experiments that succeeded, indexed like experiments
+    """
+    if batch_size is not None and checkpoint is not None:
+        raise ValueError("batched ensembles cannot fork a checkpoint")
+    start_time = time.time()
+    log = logging.getLogger(__name__)
+    results = []
+    configuration = run_configuration(
+        scheduler, shepherd_model, max_ticks, stop_policy, checkpoint
+    )
+    if time_series_store is not None:
+        time_series_store = time_series_store.configured(
+            run_configuration(
+                scheduler,
+                shepherd_model,
+                max_ticks,
+                stop_policy,
+                checkpoint,
+                time_series_stride,
+            )
+        )
+    if results_store is not None:
+        # resume: experiments already in the store are not run again
+        results.append(results_store.lookup(experiments, configuration))
+        if len(results[0]):
+            log.info(f"Skipping {len(results[0])} experiments already in the store")
+    remaining = experiments.drop(results[0].index) if results else experiments
+    results = [r for r in results if len(r)]
+
+    kwargs = dict(
+        shepherd_model=f"{shepherd_model.value}",
+        time_series_stride=time_series_stride,
+        time_series_store=time_series_store,
+        stop_policy=stop_policy,
+        instrumentation=instrumentation,
+    )
+    buffer = None
+    if batch_size is not None:
+        batches = ensemble_batches(remaining, batch_size) if len(remaining) else []
+        log.info(f"Running {len(batches)} ensembles of up to {batch_size}...")
+        fn = run_ensemble_time_trial
+        tasks = {
+            i: (batch.to_dict("records"), (batch, max_ticks, i + 1, len(batches)))
+            for i, batch in enumerate(batches)
+        }
+        ticks = lambda key, result: result["Final tick"]
+    else:
+        log.info(f"Running {len(remaining)} experiments...")
+        fn = run_time_trial
+        kwargs["chunk_size"] = chunk_size
+        kwargs["checkpoint"] = checkpoint
+        tasks = {
+            index: ([experiment], (experiment, max_ticks, i + 1, len(remaining)))
+            for i, (index, experiment) in enumerate(
+                zip(remaining.index, remaining.to_dict("records"))
+            )
+        }
+        ticks = lambda key, result: [result["Final tick"]]
+        if isinstance(scheduler, Scheduler) and len(remaining):
+            buffer = ResultBuffer(len(remaining), instrumentation)
+            kwargs["results_buffer"] = buffer
+            rows = dict(zip(remaining.index, range(len(remaining))))
+            ticks = lambda key, result: [buffer.array["Final tick"][rows[key]]]
+
+    cost_model = CostModel(max_ticks) if cost_model is None else cost_model
+    num_finished = 0
+    finished = []
+    try:
+        for key, result in scheduler.run(fn, tasks, cost_model, ticks, **kwargs):
+            if buffer is not None:
+                finished.append(rows[key])
+                result = buffer.frame([key], [rows[key]])
+            elif batch_size is None:
+                result = result.to_frame(key).T.infer_objects()
+            if results_store is not None:
+                results_store.append(
+                    experiments.loc[result.index], result, configuration
+                )
+            if buffer is None:
+                results.append(result)
+            num_finished += len(result)
+            log.debug(
+                f"Finished {num_finished}/{len(remaining)} experiments in {time.time() - start_time:.2f}s"
+            )
+    finally:
+        if buffer is not None:
+            buffer.close()
+    if buffer is not None and len(finished) == len(remaining):
+        results.append(buffer.frame(remaining.index))
+    elif buffer is not None and finished:
+        finished = np.sort(finished)
+        results.append(buffer.frame(remaining.index[finished], finished))
+    if len(results) == 1:
+        # a lone frame of the buffer is returned as is, sharing its memory
+        return results[0]
+    return pd.concat(results) if results else pd.DataFrame()
+
+
+def make_checkpoint(
+    scheduler: Scheduler,
+    experiment: dict,
+    ticks: int,
+    shepherd_model: ShepherdModel,
+):
+    """run an experiment up to a tick on a worker and save it, see `Checkpoint`
+
+    Arguments
+    ---------
+        scheduler: Scheduler
+            the scheduler whose workers run the experiment, e.g. the pool of
+            the sweep forking the checkpoint
+        experiment: dict
+            the experiment
+        ticks: int
+            tick of the checkpoint
+        shepherd_model: ShepherdModel
+            which shepherd model to use up to the checkpoint
+
+    Returns
+    -------
+        checkpoint: Checkpoint
+            the run at the checkpoint
+
+    Examples
+    --------
+    >>> with worker_pool(modelfile, engine) as pool:
+    ...     checkpoint = make_checkpoint(pool, experiment, 500, ShepherdModel.STROMBOM)
+    ...     parameters = [Parameter("num-shepherds", [2, 4])]
+    ...     results = parameter_sweep_time_trial(
+    ...         modelfile,
+    ...         ShepherdModel.STROMBOM,
+    ...         parameters,
+    ...         scheduler=pool,
+    ...         checkpoint=checkpoint,
+    ...     )
+    """
+    tasks = {0: ([experiment], (experiment, ticks))}
+    with scheduler:
+        for _, checkpoint in scheduler.run(
+            save_checkpoint,
+            tasks,
+            CostModel(ticks),
+            lambda key, checkpoint: [checkpoint.ticks],
+            shepherd_model=f"{shepherd_model.value}",
+        ):
+            return checkpoint
+    raise RuntimeError("the checkpoint run failed")
+
+
+def join_results(experiments: pd.DataFrame, results: pd.DataFrame):
+    """experiments joined with their results, keeping the result columns as is
+
+    Unlike `experiments.join`, the columns of results covering every
+    experiment are not copied, so results read from a ResultBuffer stay
+    views of it.
+    """
+    if not results.index.equals(experiments.index):
+        return experiments.join(results, how="left")
+    columns = {c: experiments[c].to_numpy() for c in experiments.columns}
+    columns.update({c: results[c].to_numpy() for c in results.columns})
+    return pd.DataFrame(columns, index=experiments.index, copy=False)
+
+
+def experiments_won(experiments: pd.DataFrame, results: pd.DataFrame):
+    """whether every experiment won, counting those whose workers failed as lost"""
+    if "Win?" not in results:
+        return pd.Series(False, index=experiments.index)
+    return results["Win?"].reindex(experiments.index, fill_value=False)
 
 
 def parameter_sweep_time_trial(
@@ -200,6 +1218,19 @@ def parameter_sweep_time_trial(
     max_ticks=6000,
     num_processes=4,
     seed=None,
+    engine=Engine.NETLOGO,
+    batch_size=None,
+    chunk_size=None,
+    time_series_stride=None,
+    time_series_dir="time_series",
+    results_store: Optional[ResultsStore] = None,
+    retries=2,
+    scheduler: Optional[Scheduler] = None,
+    stop_policy: Optional[StopPolicy] = None,
+    design_chunk_size=None,
+    instrumentation: Optional[Instrumentation] = None,
+    common_random_numbers=True,
+    checkpoint: Optional[Checkpoint] = None,
 ):
     """run a parameter sweep
 
@@ -221,50 +1252,709 @@ def parameter_sweep_time_trial(
             maximum timesteps before halting each run
         num_processes: int, default=4
             number of processes to use
+        engine: Engine, default=Engine.NETLOGO
+            the engine that runs the simulations
+        batch_size: int, optional
+            with the NumPy engine, step up to batch_size experiments sharing
+            num_sheep and num_shepherds together as one ensemble
+        chunk_size: int, optional
+            with the NetLogo engine, number of ticks run per call
+        time_series_stride: int, optional
+            also record the time series of every experiment, sampled every
+            time_series_stride ticks
+        time_series_dir: str, Path, default="time_series"
+            directory of the TimeSeriesStore the workers write the series to
+        results_store: ResultsStore, optional
+            store every finished experiment is appended to as it arrives;
+            experiments already in it are skipped, which resumes a sweep
+        retries: int, default=2
+            number of times an experiment whose worker failed is run again
+        scheduler: Scheduler, optional
+            warm workers to run on, from `worker_pool`, which are kept for the
+            next sweeps; modelfile, num_processes, engine and retries are then
+            those of the pool
+        stop_policy: StopPolicy, optional
+            stop runs early, with the status "stalled", once they stop making
+            progress; the runs cut and ticks saved by each rule are logged
+        design_chunk_size: int, optional
+            generate and run the design in chunks of design_chunk_size grid
+            points (see `sample_chunks`) instead of all at once; the longest
+            first ordering then applies within each chunk
+        instrumentation: Instrumentation, optional
+            add the measurements of every experiment to the results, and log
+            them aggregated by number of sheep
+        common_random_numbers: bool, default=True
+            give the experiments of a replicate the same streams of their
+            Sampler.STREAM "random-seed", so they start from the same herd
+            whatever the shepherds and comparisons between them are paired;
+            otherwise every experiment gets its own streams
+        checkpoint: Checkpoint, optional
+            fork every experiment from the checkpoint, see `make_checkpoint`,
+            instead of running it from setup; the parameters then only set
+            what the forks change, e.g. num-shepherds or random-seed. Keep
+            the results_store of a checkpoint for its forks
 
     Returns
     -------
-        problem: pd.DataFrame
-            problem definition for the parameter sweep
         final_results: pd.DataFrame
             results of the parameter sweep
-        time_series_results: pd.DataFrame
-            time series results of the parameter sweep
+        time_series_results: TimeSeriesStore
+            store of the time series, only returned with time_series_stride;
+            `time_series_results.load(experiments)` reads them
     """
-    start_time = time.time()
     log = logging.getLogger(__name__)
-    experiments = sample(parameters, constraints, resample=True, seed=seed)
-    print(experiments.head(32))
+    if batch_size is not None and engine is not Engine.NUMPY:
+        raise ValueError("batched ensembles require the NumPy engine")
+    if design_chunk_size is None:
+        designs = [
+            sample(
+                parameters,
+                constraints,
+                resample=True,
+                seed=seed,
+                common_random_numbers=common_random_numbers,
+            )
+        ]
+    else:
+        designs = sample_chunks(
+            parameters,
+            constraints,
+            resample=True,
+            seed=seed,
+            chunk_size=design_chunk_size,
+            common_random_numbers=common_random_numbers,
+        )
 
-    num_experiments = len(experiments.index)
+    store = None
+    if time_series_stride is not None:
+        store = TimeSeriesStore(time_series_dir)
 
-    log.info(f"Running {num_experiments} experiments...")
-    with Pool(
-        num_processes, initializer=initializer, initargs=(modelfile,)
-    ) as executor:
-        results = []
-        i = 0
-        # time_series = {}
-        for result in starstarmap(
-            executor,
-            run_time_trial,
-            zip(
-                experiments.to_dict("records"),
-                repeat(max_ticks),
-                range(1, num_experiments + 1),
-                repeat(num_experiments),
-            ),
-            repeat(dict(shepherd_model=f"{shepherd_model.value}")),
-        ):
-            # experiment = tuple(result[0].values())
-            results.append(result)
-            # time_series[experiment] = result[2]
-        results_df = experiments.join(pd.DataFrame(results), how="left")
-        results_df.set_index(experiments.columns.to_list(), inplace=True)
-        # ts_df = pd.concat(time_series, names=experiments.columns.to_list())
+    # the columns of every design, even when the designs are empty
+    design_columns = [nl2py(p.name) for p in parameters]
+    results_df = []
+    cost_model = CostModel(max_ticks)
+    with scheduler or worker_pool(
+        modelfile, engine, num_processes, retries
+    ) as scheduler:
+        for experiments in designs:
+            if not results_df:
+                print(experiments.head(32))
+            results = run_experiments(
+                scheduler,
+                experiments,
+                shepherd_model,
+                max_ticks=max_ticks,
+                batch_size=batch_size,
+                chunk_size=chunk_size,
+                time_series_stride=time_series_stride,
+                time_series_store=store,
+                results_store=results_store,
+                stop_policy=stop_policy,
+                cost_model=cost_model,
+                instrumentation=instrumentation,
+                checkpoint=checkpoint,
+            )
+            results_df.append(join_results(experiments, results))
+        if store is not None:
+            # the store of the series of this sweep, as the workers keyed them
+            store = store.configured(
+                run_configuration(
+                    scheduler,
+                    shepherd_model,
+                    max_ticks,
+                    stop_policy,
+                    checkpoint,
+                    time_series_stride,
+                )
+            )
+    if not results_df:
+        results_df.append(pd.DataFrame(columns=design_columns))
+    results_df = results_df[0] if len(results_df) == 1 else pd.concat(results_df)
+    results_df.set_index(design_columns, inplace=True)
     log.debug(f"Results:\n{results_df}")
-    log.info(f"Ran {len(experiments)} experiments successfully!")
-    return results_df  # , ts_df
+    log.info(f"Ran {len(results_df)} experiments successfully!")
+    if stop_policy is not None and len(results_df):
+        log.info(f"Stop policy:\n{stop_statistics(results_df, max_ticks)}")
+    if (
+        instrumentation is not None
+        and "num_sheep" in design_columns
+        and len(results_df)
+    ):
+        log.info(f"Instrumentation:\n{instrumentation_report(results_df)}")
+    if store is not None:
+        return results_df, store
+    return results_df
+
+
+def sample_cells(
+    parameters: list,
+    constraints: Optional[list],
+    replicate_parameter: str,
+    max_replicates: int,
+    seed=None,
+):
+    """cells of a sweep and the values of its replicate parameter
+
+    The cells are sampled with a single replicate, so the replicate parameter
+    gets the seed it would get in the full grid and its first values are
+    those of `parameter_sweep_time_trial`.
+
+    Returns
+    -------
+        cells: pd.DataFrame
+            the grid of the parameters other than the replicate parameter
+        name: str
+            python name of the replicate parameter
+        position: int
+            its column in the experiments
+        replicates: np.ndarray
+            its max_replicates values, in the order they are used
+        grid_size: int
+            number of experiments of the full grid
+    """
+    name = nl2py(replicate_parameter)
+    position = [nl2py(p.name) for p in parameters].index(name)
+    parameters = list(parameters)
+    grid_replicates = len(parameters[position].values)
+    parameters[position] = replace(parameters[position], num=1)
+    cells = sample(parameters, constraints, resample=True, seed=seed)
+    cells = cells.drop(columns=name)
+    replicates = replace(parameters[position], num=max_replicates).values
+    return cells, name, position, replicates, len(cells) * grid_replicates
+
+
+def adaptive_parameter_sweep_time_trial(
+    modelfile,
+    shepherd_model: ShepherdModel,
+    parameters: list,
+    constraints: Optional[list] = None,
+    replicate_parameter="random-seed",
+    min_replicates=4,
+    round_size=4,
+    max_replicates=24,
+    confidence=0.95,
+    ci_width=0.5,
+    budget=None,
+    max_ticks=6000,
+    num_processes=4,
+    seed=None,
+    engine=Engine.NETLOGO,
+    batch_size=None,
+    chunk_size=None,
+    results_store: Optional[ResultsStore] = None,
+    retries=2,
+    scheduler: Optional[Scheduler] = None,
+    stop_policy: Optional[StopPolicy] = None,
+):
+    """run a parameter sweep that allocates replicates where they are needed
+
+    The replicate parameter (the random seed) is not swept as a grid.
+    Instead, the cells formed by the other parameters get replicates in
+    rounds, drawn in order from the values of the replicate parameter, and a
+    cell stops getting them once the Wilson interval of its win rate is
+    narrow enough (see `allocate_replicates`). Cells that always or never
+    win are decided after a few replicates, and the rest of the budget goes
+    to the cells on the boundary.
+
+    Arguments
+    ---------
+        modelfile: str, Path
+            path to the netlogo model
+        shepherd_model: ShepherdModel
+            which shepherd model to use
+        parameters: list
+            list of parameters to sweep, including the replicate parameter
+
+    Keyword Arguments
+    -----------------
+        replicate_parameter: str, default="random-seed"
+            name of the SampledParameter drawing the replicates; it is
+            resampled with max_replicates values
+        min_replicates, round_size, max_replicates, confidence, ci_width:
+            the allocation rule, see `allocate_replicates`
+        budget: int, optional
+            maximum total number of experiments
+
+    The other keyword arguments are those of `parameter_sweep_time_trial`.
+
+    Returns
+    -------
+        final_results: pd.DataFrame
+            results of the parameter sweep, indexed like those of
+            `parameter_sweep_time_trial`, with the number of replicates of
+            each cell in the "Replicates" column
+    """
+    log = logging.getLogger(__name__)
+    if batch_size is not None and engine is not Engine.NUMPY:
+        raise ValueError("batched ensembles require the NumPy engine")
+    cells, name, position, replicates, grid_size = sample_cells(
+        parameters, constraints, replicate_parameter, max_replicates, seed
+    )
+
+    wins = np.zeros(len(cells), dtype=int)
+    n = np.zeros(len(cells), dtype=int)
+    results = []
+    cost_model = CostModel(max_ticks)
+    with scheduler or worker_pool(
+        modelfile, engine, num_processes, retries
+    ) as scheduler:
+        while True:
+            remaining = None if budget is None else budget - n.sum()
+            new = allocate_replicates(
+                wins,
+                n,
+                min_replicates,
+                round_size,
+                max_replicates,
+                confidence,
+                ci_width,
+                remaining,
+            )
+            if new.sum() == 0:
+                break
+            cell = np.repeat(np.arange(len(cells)), new)
+            replicate = np.concatenate(
+                [np.arange(n[c], n[c] + k) for c, k in enumerate(new) if k]
+            )
+            experiments = cells.iloc[cell].reset_index(drop=True)
+            experiments.insert(position, name, replicates[replicate])
+            experiments.index += n.sum()
+            log.info(
+                f"Round of {len(experiments)} experiments on {np.count_nonzero(new)} cells"
+            )
+            result = run_experiments(
+                scheduler,
+                experiments,
+                shepherd_model,
+                max_ticks=max_ticks,
+                batch_size=batch_size,
+                chunk_size=chunk_size,
+                results_store=results_store,
+                stop_policy=stop_policy,
+                cost_model=cost_model,
+            )
+            won = experiments_won(experiments, result)
+            np.add.at(wins, cell, won.to_numpy(dtype=int))
+            n += new
+            results.append(experiments.join(result, how="left").assign(cell=cell))
+
+    results_df = pd.concat(results)
+    results_df["Replicates"] = n[results_df.pop("cell")]
+    results_df.set_index(list(experiments.columns), inplace=True)
+    log.info(f"Ran {n.sum()} experiments instead of the {grid_size} of the full grid")
+    if stop_policy is not None:
+        log.info(f"Stop policy:\n{stop_statistics(results_df, max_ticks)}")
+    return results_df
+
+
+def active_parameter_sweep_time_trial(
+    modelfile,
+    shepherd_model: ShepherdModel,
+    parameters: list,
+    constraints: Optional[list] = None,
+    replicate_parameter="random-seed",
+    initial_size=64,
+    round_size=32,
+    max_replicates=8,
+    tolerance=0.01,
+    patience=2,
+    budget=None,
+    degree=2,
+    ridge=1e-2,
+    max_ticks=6000,
+    num_processes=4,
+    seed=None,
+    engine=Engine.NETLOGO,
+    batch_size=None,
+    chunk_size=None,
+    results_store: Optional[ResultsStore] = None,
+    retries=2,
+    scheduler: Optional[Scheduler] = None,
+    stop_policy: Optional[StopPolicy] = None,
+):
+    """run a parameter sweep that samples where the outcome is uncertain
+
+    The win probability over the cells formed by the parameters other than
+    the replicate parameter is modeled by a `LogisticClassifier` fitted on
+    the results so far. After a first round on initial_size random cells,
+    every round runs one more replicate of the round_size cells whose
+    predicted probability is closest to 1/2, i.e. those on the predicted
+    boundary between winning and failing. The sweep stops once the predicted
+    outcome of at most a fraction tolerance of the cells changed for
+    patience rounds in a row, or when the budget is spent.
+
+    Arguments
+    ---------
+        modelfile: str, Path
+            path to the netlogo model
+        shepherd_model: ShepherdModel
+            which shepherd model to use
+        parameters: list
+            list of numeric parameters to sweep, including the replicate
+            parameter
+
+    Keyword Arguments
+    -----------------
+        replicate_parameter: str, default="random-seed"
+            name of the SampledParameter drawing the replicates, see
+            `sample_cells`
+        initial_size: int, default=64
+            number of random cells of the first round
+        round_size: int, default=32
+            number of cells of the next rounds
+        max_replicates: int, default=8
+            maximum number of replicates of a cell
+        tolerance: float, default=0.01
+            fraction of the cells whose predicted outcome may change in a
+            round of a stable boundary
+        patience: int, default=2
+            number of stable rounds in a row that stop the sweep
+        budget: int, optional
+            maximum total number of experiments
+        degree, ridge:
+            the classifier, see `LogisticClassifier`
+
+    The other keyword arguments are those of `parameter_sweep_time_trial`.
+
+    Returns
+    -------
+        final_results: pd.DataFrame
+            results of the experiments that were run, indexed like those of
+            `parameter_sweep_time_trial`
+        predictions: pd.DataFrame
+            every cell, with the predicted win probability in the "Win?"
+            column, so `plot_parameter_sweep(predictions)` draws the whole
+            map, and its number of replicates in the "Replicates" column
+    """
+    log = logging.getLogger(__name__)
+    if batch_size is not None and engine is not Engine.NUMPY:
+        raise ValueError("batched ensembles require the NumPy engine")
+    cells, name, position, replicates, grid_size = sample_cells(
+        parameters, constraints, replicate_parameter, max_replicates, seed
+    )
+    x = cells.to_numpy(dtype=float)
+    classifier = LogisticClassifier(x.min(axis=0), x.max(axis=0), degree, ridge)
+
+    rng = np.random.RandomState(seed)
+    chosen = rng.choice(len(cells), min(initial_size, len(cells)), replace=False)
+    if budget is not None:
+        chosen = chosen[:budget]
+    n = np.zeros(len(cells), dtype=int)
+    observed, outcomes, results = [], [], []
+    previous, stable = None, 0
+    cost_model = CostModel(max_ticks)
+    with scheduler or worker_pool(
+        modelfile, engine, num_processes, retries
+    ) as scheduler:
+        while len(chosen):
+            experiments = cells.iloc[chosen].reset_index(drop=True)
+            experiments.insert(position, name, replicates[n[chosen]])
+            experiments.index += n.sum()
+            result = run_experiments(
+                scheduler,
+                experiments,
+                shepherd_model,
+                max_ticks=max_ticks,
+                batch_size=batch_size,
+                chunk_size=chunk_size,
+                results_store=results_store,
+                stop_policy=stop_policy,
+                cost_model=cost_model,
+            )
+            won = experiments_won(experiments, result)
+            observed.append(chosen)
+            outcomes.append(won.to_numpy(dtype=int))
+            n[chosen] += 1
+            results.append(experiments.join(result, how="left"))
+
+            classifier.fit(x[np.concatenate(observed)], np.concatenate(outcomes))
+            probability = classifier.predict_proba(x)
+            predicted = probability >= 0.5
+            if previous is not None:
+                changed = np.mean(predicted != previous)
+                stable = stable + 1 if changed <= tolerance else 0
+                log.info(
+                    f"Round of {len(experiments)} experiments changed the "
+                    f"predicted outcome of {changed:.1%} of the cells"
+                )
+            previous = predicted
+            if stable >= patience:
+                break
+            size = round_size if budget is None else min(round_size, budget - n.sum())
+            chosen = most_uncertain(probability, n < max_replicates, max(size, 0))
+
+    results_df = pd.concat(results)
+    results_df.set_index(list(experiments.columns), inplace=True)
+    predictions = cells.assign(**{"Win?": probability, "Replicates": n})
+    log.info(f"Ran {n.sum()} experiments instead of the {grid_size} of the full grid")
+    if stop_policy is not None:
+        log.info(f"Stop policy:\n{stop_statistics(results_df, max_ticks)}")
+    return results_df, predictions
+
+
+def minimum_shepherds_search(
+    modelfile,
+    shepherd_models,
+    parameters: list,
+    constraints: Optional[list] = None,
+    search_parameter="num-shepherds",
+    replicate_parameter="random-seed",
+    replicates=8,
+    target_rate=0.75,
+    max_ticks=6000,
+    num_processes=4,
+    seed=None,
+    engine=Engine.NETLOGO,
+    batch_size=None,
+    chunk_size=None,
+    results_dir=None,
+    retries=2,
+    scheduler: Optional[Scheduler] = None,
+    stop_policy: Optional[StopPolicy] = None,
+):
+    """smallest number of shepherds that herds every cell of a sweep
+
+    Instead of sweeping every value of the search parameter, each cell formed
+    by the other parameters searches for the smallest value whose win rate
+    over its replicates reaches target_rate, assuming the win rate grows with
+    the number of shepherds (see `MonotoneSearch`). The searches of all the
+    cells advance together, one probe per cell and round, so every round runs
+    on the whole pool.
+
+    Arguments
+    ---------
+        modelfile: str, Path
+            path to the netlogo model
+        shepherd_models: ShepherdModel or list of ShepherdModel
+            the shepherd models to search, one after the other
+        parameters: list
+            list of parameters of the sweep, including the search and
+            replicate parameters
+
+    Keyword Arguments
+    -----------------
+        constraints: list, optional
+            list of constraints of the cells; they may not involve the search
+            parameter
+        search_parameter: str, default="num-shepherds"
+            name of the parameter to search, over its values
+        replicate_parameter: str, default="random-seed"
+            name of the SampledParameter drawing the replicates, see
+            `sample_cells`
+        replicates: int, default=8
+            number of replicates of every probe
+        target_rate: float, default=0.75
+            win rate a probe must reach to succeed
+        results_dir: str, Path, optional
+            directory of a ResultsStore per shepherd model, which resumes the
+            searches
+
+    The other keyword arguments are those of `parameter_sweep_time_trial`.
+
+    Returns
+    -------
+        optimal: pd.DataFrame
+            for every shepherd model and cell, the "Optimal shepherds", or
+            <NA> if no value reached target_rate, its "Win rate" and the
+            number of "Probes" of the search
+        final_results: pd.DataFrame
+            results of the experiments that were run, indexed by the shepherd
+            model and the parameters
+    """
+    log = logging.getLogger(__name__)
+    if batch_size is not None and engine is not Engine.NUMPY:
+        raise ValueError("batched ensembles require the NumPy engine")
+    if isinstance(shepherd_models, ShepherdModel):
+        shepherd_models = [shepherd_models]
+    names = [nl2py(p.name) for p in parameters]
+    search_name = nl2py(search_parameter)
+    position = names.index(search_name)
+    values = np.sort(parameters[position].values)
+    cells, name, _, seeds, grid_size = sample_cells(
+        parameters[:position] + parameters[position + 1 :],
+        constraints,
+        replicate_parameter,
+        replicates,
+        seed,
+    )
+    grid_size *= len(values)
+
+    optimal, runs = [], []
+    cost_model = CostModel(max_ticks)
+    with scheduler or worker_pool(
+        modelfile, engine, num_processes, retries
+    ) as scheduler:
+        for shepherd_model in shepherd_models:
+            model_name = shepherd_model.name.lower()
+            results_store = None
+            if results_dir is not None:
+                results_store = ResultsStore(Path(results_dir) / model_name)
+            candidates = values
+            if search_name == "num_shepherds":
+                candidates = values[values >= shepherd_model.min_shepherds]
+            searches = [MonotoneSearch(candidates) for _ in range(len(cells))]
+            # win rate of every probe, by cell and position
+            rates = [{} for _ in range(len(cells))]
+            num_runs = 0
+            while True:
+                probes = [(c, s.next()) for c, s in enumerate(searches) if not s.done]
+                if not probes:
+                    break
+                cell, probe = np.array(probes).T
+                experiments = cells.iloc[np.repeat(cell, replicates)]
+                experiments = experiments.reset_index(drop=True)
+                experiments[search_name] = candidates[np.repeat(probe, replicates)]
+                experiments[name] = np.tile(seeds, len(probes))
+                experiments = experiments[names]
+                experiments.index += num_runs
+                num_runs += len(experiments)
+                log.info(
+                    f"Probing {len(probes)} cells of the {model_name} model "
+                    f"with {len(experiments)} experiments"
+                )
+                result = run_experiments(
+                    scheduler,
+                    experiments,
+                    shepherd_model,
+                    max_ticks=max_ticks,
+                    batch_size=batch_size,
+                    chunk_size=chunk_size,
+                    results_store=results_store,
+                    stop_policy=stop_policy,
+                    cost_model=cost_model,
+                )
+                won = experiments_won(experiments, result)
+                rate = won.to_numpy(dtype=float).reshape(-1, replicates).mean(axis=1)
+                for c, k, r in zip(cell, probe, rate):
+                    rates[c][k] = r
+                    searches[c].update(k, r >= target_rate)
+                runs.append(
+                    experiments.join(result, how="left").assign(
+                        shepherd_model=model_name
+                    )
+                )
+            optimal.append(
+                cells.assign(
+                    shepherd_model=model_name,
+                    **{
+                        "Optimal shepherds": pd.array(
+                            [s.result for s in searches], dtype="Int64"
+                        ),
+                        "Win rate": [
+                            r.get(s.hi, np.nan) for s, r in zip(searches, rates)
+                        ],
+                        "Probes": [s.probes for s in searches],
+                    },
+                )
+            )
+            log.info(
+                f"Ran {num_runs} experiments of the {model_name} model instead of "
+                f"the {grid_size} of the full grid"
+            )
+
+    optimal = pd.concat(optimal).set_index(["shepherd_model", *cells.columns])
+    results_df = pd.concat(runs).set_index(["shepherd_model", *names])
+    if stop_policy is not None:
+        log.info(f"Stop policy:\n{stop_statistics(results_df, max_ticks)}")
+    return optimal, results_df
+
+
+def sensitivity_analysis_time_trial(
+    modelfile,
+    shepherd_model: ShepherdModel,
+    parameters: list,
+    num_samples=256,
+    fixed: Optional[dict] = None,
+    output="Final tick",
+    calc_second_order=True,
+    num_resamples=1000,
+    conf_level=0.95,
+    max_ticks=6000,
+    num_processes=4,
+    seed=None,
+    engine=Engine.NETLOGO,
+    chunk_size=None,
+    results_store: Optional[ResultsStore] = None,
+    retries=2,
+    scheduler: Optional[Scheduler] = None,
+    stop_policy: Optional[StopPolicy] = None,
+):
+    """Sobol sensitivity analysis of an output over the bounds of parameters
+
+    The Saltelli design over the bounds of the parameters runs on the workers
+    like a sweep, and the Sobol indices of the output are computed with
+    bootstrap confidence intervals.
+
+    Arguments
+    ---------
+        modelfile: str, Path
+            path to the netlogo model
+        shepherd_model: ShepherdModel
+            which shepherd model to use
+        parameters: list of SampledParameter
+            the parameters to analyze, sampled within their bounds; integer
+            samplers give integer samples
+
+    Keyword Arguments
+    -----------------
+        num_samples: int, default=256
+            number of base samples N of the Saltelli design, preferably a power
+            of 2; the design has N (2 D + 2) experiments for D parameters
+        fixed: dict, optional
+            parameters set to the same value in every experiment; without a
+            random-seed, every experiment uses the same seed drawn from seed,
+            so the indices are not blurred by the noise between seeds
+        output: str, default="Final tick"
+            the result column to analyze
+        calc_second_order, num_resamples, conf_level:
+            see `sobol_indices`
+
+    The other keyword arguments are those of `parameter_sweep_time_trial`.
+
+    Returns
+    -------
+        problem: dict
+            the SALib problem of the parameters
+        sobol_indices: dict
+            the indices, ready for `plot_sobol_indices(problem, sobol_indices)`
+        final_results: pd.DataFrame
+            results of the experiments of the design
+    """
+    log = logging.getLogger(__name__)
+    problem = sobol_problem(parameters)
+    experiments = saltelli_design(problem, num_samples, calc_second_order)
+    for key, value in ({} if fixed is None else fixed).items():
+        experiments[nl2py(key)] = value
+    if "random_seed" not in experiments.columns:
+        experiments["random_seed"] = stream_key(sweep_seeds(seed, 1)[0], 0)
+    log.info(f"Saltelli design of {len(experiments)} experiments")
+
+    with scheduler or worker_pool(
+        modelfile, engine, num_processes, retries
+    ) as scheduler:
+        results = run_experiments(
+            scheduler,
+            experiments,
+            shepherd_model,
+            max_ticks=max_ticks,
+            chunk_size=chunk_size,
+            results_store=results_store,
+            stop_policy=stop_policy,
+        )
+    results_df = join_results(experiments, results)
+    if results_df[output].isna().any():
+        raise RuntimeError(
+            f"{results_df[output].isna().sum()} experiments of the design failed"
+        )
+    indices = sobol_indices(
+        problem,
+        results_df[output].to_numpy(dtype=float),
+        calc_second_order=calc_second_order,
+        num_resamples=num_resamples,
+        conf_level=conf_level,
+        seed=seed,
+    )
+    return problem, indices, results_df
 
 
 if __name__ == "__main__":
@@ -293,12 +1983,12 @@ if __name__ == "__main__":
         SampledParameter("num-sheep", Sampler.LINEARINT, bounds=(1, 101), num=11),
         SampledParameter("num-neighbors", Sampler.LINEARINT, bounds=(1, 100), num=11),
         SampledParameter("num-shepherds", Sampler.LINEARINT, bounds=(2, 16), num=15),
-        SampledParameter("random-seed", Sampler.RANDINT, bounds=(1, 100000), num=12),
+        SampledParameter("random-seed", Sampler.STREAM, bounds=None, num=12),
     ]
 
     constraints = [Compare("num-sheep", ">=", "num-neighbors")]
 
-    # final_results, ts_results = parameter_sweep_time_trial(
+    results_store = ResultsStore(Path("results") / "sweep")
     final_results = parameter_sweep_time_trial(
         modelfile,
         ShepherdModel.PIERSON,
@@ -306,15 +1996,11 @@ if __name__ == "__main__":
         constraints=constraints,
         num_processes=18,
         seed=42,
+        results_store=results_store,
     )
 
-    from pickle import dumps
-
-    results_file = Path("results.pkl")
-    results_file.write_bytes(dumps(((parameters, constraints), final_results)))
-
     log.info(f"Plotting results...")
-    fig, _ = plot_parameter_sweep(results_file)
+    fig, _ = plot_parameter_sweep(results_store.directory)
     fig.savefig("results.png", dpi=300)
     log.info(f"Plotting completed successfully!")
 
@@ -4,6 +4,7 @@ from dataclasses import dataclass, field
 import pandas as pd
 
 from utils import *
+from seeding import MAX_SWEEP_SEED, stream_key, sweep_seeds
 
 
 class Sampler(Enum):
@@ -13,6 +14,7 @@ class Sampler(Enum):
     RANDFLOAT = auto()
     LINEARINT = auto()
     LINEARFLOAT = auto()
+    STREAM = auto()
 
 
 @dataclass
@@ -45,10 +47,15 @@ class SampledParameter:
     sample_type : SampleType
         the type of sampling
     bounds : tuple
-        the bounds of the sampling
+        the bounds of the sampling, unused by Sampler.STREAM
     num : int
         the number of samples
 
+    A Sampler.STREAM parameter, such as "random-seed", samples the keys of
+    the random streams of num replicates (see `stream_key`), keyed by its
+    seed: they never collide, and every cell of a grid runs the same
+    replicates, i.e. with common random numbers.
+
     """
 
     name: str = field(compare=True)
@@ -77,7 +84,11 @@ class SampledParameter:
         """
         rs = np.random.RandomState(self.seed)
 
-        if self.sample_type == Sampler.RANDINT:
+        if self.sample_type == Sampler.STREAM:
+            if self.seed is None:
+                self.seed = int(rs.randint(0, MAX_SWEEP_SEED + 1))
+            values = stream_key(self.seed, np.arange(self.num))
+        elif self.sample_type == Sampler.RANDINT:
             values = rs.randint(self.bounds[0], self.bounds[1], self.num)
         elif self.sample_type == Sampler.RANDFLOAT:
             values = rs.uniform(self.bounds[0], self.bounds[1], self.num)
@@ -97,43 +108,114 @@ class SampledParameter:
         return iter(self.values)
 
 
-def sample(parameters, constraints, resample=False, seed=None):
-    """sample from a custom problem
+def resample_parameters(parameters, seed=None):
+    """draw new values for every SampledParameter, seeded from seed"""
+    for p, p_seed in zip(parameters, sweep_seeds(seed, len(parameters))):
+        if isinstance(p, SampledParameter):
+            p.seed = int(p_seed)
+            p.sample(inplace=True)
+
+
+def sample_chunks(
+    parameters,
+    constraints=None,
+    resample=False,
+    seed=None,
+    chunk_size=2**16,
+    common_random_numbers=True,
+):
+    """sample from a custom problem, chunk by chunk
+
+    The grid is never materialized: each chunk of chunk_size consecutive grid
+    points (in the order of `itertools.product`) is built from index arrays,
+    filtered by the constraints as boolean masks and yielded as a DataFrame.
 
     Parameters
     ----------
     parameters : list of Parameter or SampledParameter
         the parameters to sample from
-    problem : dict
-        a dict with the following keys
-        - num_vars : int
-        - names : list of str
-        - bounds : list of tuples
-        - sample_types : list of SampleType
-        - num_samples : list of int
-        - restrictions : list of None or functions
-
-    Returns
-    -------
-    np.ndarray
-        the samples
+    constraints : list of Compare, optional
+        constraints every sample satisfies
+    resample : bool, optional
+        whether to resample the SampledParameters first, by default False
+    seed : int, optional
+        seed of the resampling
+    chunk_size : int, optional
+        number of grid points per chunk, by default 2**16
+    common_random_numbers : bool, optional
+        whether the experiments of a replicate share the streams of their
+        Sampler.STREAM parameters, by default True; otherwise every
+        experiment gets its own streams, keyed by its number
+
+    Yields
+    ------
+    pd.DataFrame
+        the samples of a chunk, numbered consecutively across the chunks; a
+        single empty one if the grid is empty
 
     """
-    # generate samples for each variable, if requested
     if resample:
-        rs = np.random.RandomState(seed)
-        for p in parameters:
-            if isinstance(p, SampledParameter):
-                p.seed = rs.randint(0, np.iinfo(np.uint16).max, dtype=np.uint16)
-                p.sample(inplace=True)
+        resample_parameters(parameters, seed)
+    constraints = [] if constraints is None else constraints
+    names = [nl2py(p.name) for p in parameters]
+    values = [np.asarray(p.values) for p in parameters]
+    shape = [len(v) for v in values]
+    size = int(np.prod(shape))
+    if size == 0:
+        # an empty grid still has the columns of its parameters
+        yield pd.DataFrame({name: v[:0] for name, v in zip(names, values)})
+    num_samples = 0
+    for start in range(0, size, chunk_size):
+        index = np.unravel_index(np.arange(start, min(start + chunk_size, size)), shape)
+        columns = {name: v[i] for name, v, i in zip(names, values, index)}
+        mask = np.ones(len(index[0]), dtype=bool)
+        for c in constraints:
+            mask &= c(columns)
+        chunk = pd.DataFrame({name: column[mask] for name, column in columns.items()})
+        chunk.index += num_samples
+        num_samples += len(chunk)
+        if not common_random_numbers:
+            for name, p in zip(names, parameters):
+                if getattr(p, "sample_type", None) == Sampler.STREAM:
+                    chunk[name] = stream_key(p.seed, chunk.index)
+        yield chunk
+
+
+def sample(
+    parameters, constraints=None, resample=False, seed=None, common_random_numbers=True
+):
+    """sample from a custom problem
 
-    # form the product of all the samples
-    samples = dict_product_set(**{nl2py(p.name): p for p in parameters})
+    Parameters
+    ----------
+    parameters : list of Parameter or SampledParameter
+        the parameters to sample from
+    constraints : list of Compare, optional
+        constraints every sample satisfies
+    resample : bool, optional
+        whether to resample the SampledParameters first, by default False
+    seed : int, optional
+        seed of the resampling
+    common_random_numbers : bool, optional
+        whether the experiments of a replicate share their streams, by
+        default True, see `sample_chunks`
 
-    # filter the samples
-    samples = filter(lambda x: all(c(x) for c in constraints), samples)
+    Returns
+    -------
+    pd.DataFrame
+        the samples, one per row, in the order of `itertools.product`, with
+        the parameter columns even if there are none
 
-    return pd.DataFrame.from_records(samples)
+    """
+    return pd.concat(
+        sample_chunks(
+            parameters,
+            constraints,
+            resample,
+            seed,
+            common_random_numbers=common_random_numbers,
+        )
+    )
 
 
 class Compare:
@@ -0,0 +1,332 @@
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from collections import deque
+import logging
+import multiprocessing
+import os
+import signal
+import time
+import numpy as np
+
+from simulation import ModelParameters
+from utils import nl2py
+
+
+class CostModel:
+    """Expected wall time of experiments, refined from the finished ones.
+
+    The seconds per tick of an experiment are modeled as w . f(x), with the
+    features f = (1, N, N m, N^2) of its number of sheep N and shepherds m:
+    the sheep scan the shepherds and, through the local center of mass, each
+    other. A task of several experiments (an ensemble) takes
+    sum_i ticks_i w . f(x_i) seconds, which stays linear in w, so w is the
+    ridge regression of the observed task times on the tick-weighted features,
+    pulled towards a prior that only ranks the experiments. The expected
+    number of ticks is the mean of the finished runs of the same (N, m), or
+    max_ticks before any finished, since failing runs are the long ones.
+
+    Parameters
+    ----------
+    max_ticks : int
+        maximum timesteps of a run
+    ridge : float, default=1e-3
+        weight of the prior relative to one observation
+
+    """
+
+    prior = np.array([0.0, 0.0, 1e-7, 1e-7])
+
+    def __init__(self, max_ticks, ridge=1e-3):
+        self.max_ticks = max_ticks
+        self.ridge = ridge
+        self.gram = np.zeros((4, 4))
+        self.moment = np.zeros(4)
+        self.weights = self.prior.copy()
+        self.ticks = {}
+
+    @staticmethod
+    def shape(experiment: dict):
+        """(num_sheep, num_shepherds) of an experiment"""
+        experiment = {nl2py(key): value for key, value in experiment.items()}
+        num_sheep = experiment.get("num_sheep", ModelParameters.num_sheep)
+        num_shepherds = experiment.get("num_shepherds", ModelParameters.num_shepherds)
+        return int(num_sheep), int(num_shepherds)
+
+    @staticmethod
+    def features(shape):
+        num_sheep, num_shepherds = shape
+        return np.array([1.0, num_sheep, num_sheep * num_shepherds, num_sheep**2])
+
+    def expected_ticks(self, shape):
+        ticks = self.ticks.get(shape)
+        return self.max_ticks if ticks is None else np.mean(ticks)
+
+    def cost(self, shapes):
+        """expected seconds of a task running experiments of the given shapes"""
+        per_tick = [max(self.weights @ self.features(s), 1e-9) for s in shapes]
+        return sum(self.expected_ticks(s) * c for s, c in zip(shapes, per_tick))
+
+    def observe(self, shapes, ticks, seconds):
+        """refine the model with a finished task
+
+        Parameters
+        ----------
+        shapes : list of tuple
+            the shapes of the experiments of the task
+        ticks : list of int
+            their final ticks
+        seconds : float
+            wall time of the task
+
+        """
+        x = np.zeros(4)
+        for shape, t in zip(shapes, ticks):
+            self.ticks.setdefault(shape, []).append(t)
+            x += t * self.features(shape)
+        self.gram += np.outer(x, x)
+        self.moment += x * seconds
+        # ridge regression towards the prior, scaled to the observed features
+        scale = self.ridge * np.diag(self.gram).clip(min=1.0)
+        self.weights = np.linalg.solve(
+            self.gram + np.diag(scale), self.moment + scale * self.prior
+        )
+
+
+# state of a worker process, set by `initialize_worker`
+_worker = {}
+
+
+def initialize_worker(started, barrier, initializer, *initargs):
+    """report the pid of a worker to its pool, then run the pool initializer"""
+    started.put(os.getpid())
+    _worker["barrier"] = barrier
+    if initializer is not None:
+        initializer(*initargs)
+
+
+def probe(health_check, timeout):
+    """run the health check on a worker, see `Scheduler.check_health`
+
+    Returns
+    -------
+    int
+        the pid of the worker
+    """
+    health_check()
+    # a worker cannot take a second probe before every worker took one
+    _worker["barrier"].wait(timeout)
+    return os.getpid()
+
+
+class Scheduler:
+    """Run tasks on a process pool, longest expected first, as they complete.
+
+    Only as many tasks as there are processes are in flight, so every
+    submission picks the most expensive remaining task under the cost model
+    refined by the tasks finished so far, and no long task is left for the
+    end. Results are yielded in completion order. A task that raises is
+    retried; if a worker dies (e.g. a JVM crash), the pool is rebuilt with
+    fresh workers and the tasks it was running are resubmitted.
+
+    Parameters
+    ----------
+    num_processes : int
+        number of worker processes
+    initializer : callable
+        worker initializer
+    initargs : tuple
+        arguments of the initializer
+    retries : int, default=2
+        number of times a failing task is resubmitted before it is given up
+    health_check : callable, optional
+        function the workers run to show they respond, see `check_health`
+    timeout : float, optional
+        seconds after which a running task is deemed wedged: its workers are
+        killed, the pool is rebuilt and its tasks are retried
+
+    The pool outlives the sweeps run on it: entering the scheduler again
+    reuses its warm workers after a health check, and only the outermost
+    exit shuts them down. Every worker reports its pid as it starts, so
+    that the scheduler can probe and kill each of them.
+
+    """
+
+    def __init__(
+        self,
+        num_processes,
+        initializer=None,
+        initargs=(),
+        retries=2,
+        health_check=None,
+        timeout=None,
+    ):
+        self.num_processes = num_processes
+        self.initializer = initializer
+        self.initargs = initargs
+        self.retries = retries
+        self.health_check = health_check
+        self.timeout = timeout
+        self.executor = None
+        self.pids = set()
+        self.depth = 0
+
+    def start(self):
+        if self.executor is not None:
+            self.terminate()
+        self.started = multiprocessing.SimpleQueue()
+        self.barrier = multiprocessing.Barrier(self.num_processes)
+        self.pids = set()
+        self.executor = ProcessPoolExecutor(
+            self.num_processes,
+            initializer=initialize_worker,
+            initargs=(self.started, self.barrier, self.initializer, *self.initargs),
+        )
+
+    def worker_pids(self):
+        """the pids of the workers started so far"""
+        while not self.started.empty():
+            self.pids.add(self.started.get())
+        return self.pids
+
+    def terminate(self):
+        """kill the workers, including those stuck in a task"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        for pid in self.worker_pids():
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        self.executor = None
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def check_health(self, timeout=60.0):
+        """restart the pool unless the workers run the health check in time
+
+        Every worker runs the health check once: the probes wait for each
+        other, so no worker takes two, and the pids they return must be those
+        of the workers the pool started.
+
+        Returns
+        -------
+        bool
+            whether the pool was healthy
+        """
+        log = logging.getLogger(__name__)
+        if self.health_check is None:
+            return True
+        futures = [
+            self.executor.submit(probe, self.health_check, timeout)
+            for _ in range(self.num_processes)
+        ]
+        done, _ = wait(futures, timeout=timeout)
+        healthy = len(done) == len(futures) and all(f.exception() is None for f in done)
+        if healthy:
+            healthy = {f.result() for f in done} == self.worker_pids()
+        if not healthy:
+            log.warning("The workers failed their health check, restarting them")
+            self.start()
+        return healthy
+
+    def __enter__(self):
+        if self.executor is None:
+            self.start()
+        else:
+            self.check_health()
+        self.depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self.depth -= 1
+        if self.depth == 0:
+            self.shutdown()
+
+    def run(self, fn, tasks: dict, cost_model: CostModel, ticks, **kwargs):
+        """run fn(*args, **kwargs) for every task
+
+        Parameters
+        ----------
+        fn : callable
+            the task function
+        tasks : dict
+            maps every task key to (experiments, args): the list of
+            experiments the task runs, for the cost model, and the arguments
+            of fn
+        cost_model : CostModel
+            the cost model ranking the tasks, refined as they finish
+        ticks : callable
+            final ticks of the experiments of a task, from its key and result
+        kwargs : dict
+            keyword arguments of every call
+
+        Yields
+        ------
+        key, result
+            the key and result of every task that succeeded, as it finishes
+
+        """
+        log = logging.getLogger(__name__)
+        # tasks of the same shapes cost the same, so only the groups are ranked
+        shapes = {
+            key: tuple(cost_model.shape(e) for e in experiments)
+            for key, (experiments, _) in tasks.items()
+        }
+        pending = {}
+        for key in tasks:
+            pending.setdefault(shapes[key], deque()).append(key)
+        attempts = {key: 0 for key in tasks}
+        running = {}
+        while pending or running:
+            while pending and len(running) < self.num_processes:
+                group = max(pending, key=cost_model.cost)
+                key = pending[group].popleft()
+                if not pending[group]:
+                    del pending[group]
+                future = self.executor.submit(fn, *tasks[key][1], **kwargs)
+                running[future] = key, time.time()
+            done, _ = wait(running, timeout=self.timeout, return_when=FIRST_COMPLETED)
+            broken = False
+            if self.timeout is not None:
+                now = time.time()
+                wedged = [
+                    key
+                    for future, (key, start) in running.items()
+                    if future not in done and now - start > self.timeout
+                ]
+                for key in wedged:
+                    log.warning(f"Task {key} ran for over {self.timeout}s")
+                broken = bool(wedged)
+            for future in done:
+                key, start = running.pop(future)
+                try:
+                    result = future.result()
+                except BrokenProcessPool:
+                    broken = True
+                    self.retry(key, shapes, pending, attempts, "worker died")
+                    continue
+                except Exception as e:
+                    self.retry(key, shapes, pending, attempts, repr(e))
+                    continue
+                cost_model.observe(shapes[key], ticks(key, result), time.time() - start)
+                yield key, result
+            if broken:
+                # every task of the broken pool fails; run them again on a new one
+                for future, (key, _) in running.items():
+                    self.retry(key, shapes, pending, attempts, "worker died")
+                running = {}
+                log.warning("A worker died or hung, restarting the process pool")
+                self.start()
+
+    def retry(self, key, shapes, pending, attempts, reason):
+        log = logging.getLogger(__name__)
+        attempts[key] += 1
+        if attempts[key] > self.retries:
+            log.error(f"Giving up task {key} after {attempts[key]} attempts: {reason}")
+        else:
+            log.warning(
+                f"Retrying task {key} ({attempts[key]}/{self.retries}): {reason}"
+            )
+            pending.setdefault(shapes[key], deque()).append(key)
@@ -0,0 +1,54 @@
+class MonotoneSearch:
+    """Search of the smallest of sorted values that succeeds.
+
+    Success is assumed monotone in the value: once a value succeeds, every
+    larger value does. The search gallops up from the smallest value, probing
+    the 1st, 2nd, 4th, 8th, ... values past the last failure, then bisects
+    between the last failure and the first success, so a value at position k
+    is found in about 2 log2 k probes, and small values, the common answer,
+    in few.
+
+    Parameters
+    ----------
+    values : list
+        the candidate values, in increasing order
+
+    """
+
+    def __init__(self, values):
+        self.values = list(values)
+        # every value before lo failed, the value at hi succeeded
+        self.lo = 0
+        self.hi = len(self.values)
+        self.step = 1
+        self.galloping = True
+        self.probes = 0
+
+    @property
+    def done(self):
+        return self.lo >= self.hi
+
+    @property
+    def result(self):
+        """the smallest value that succeeds, None if none does"""
+        if not self.done:
+            raise ValueError("the search is not finished")
+        return self.values[self.hi] if self.hi < len(self.values) else None
+
+    def next(self):
+        """position of the value to probe next, None once the search is done"""
+        if self.done:
+            return None
+        if self.galloping:
+            return min(self.lo + self.step - 1, self.hi - 1)
+        return (self.lo + self.hi) // 2
+
+    def update(self, position, success):
+        """record the outcome of the probe of the value at position"""
+        self.probes += 1
+        if success:
+            self.hi = position
+            self.galloping = False
+        else:
+            self.lo = position + 1
+            self.step *= 2
@@ -0,0 +1,78 @@
+from enum import Enum
+import numpy as np
+
+# bits of the replicate, or experiment, number in a stream key
+REPLICATE_BITS = 32
+# largest sweep seed, so stream keys fit in an int64 column
+MAX_SWEEP_SEED = 2**31 - 1
+
+
+class Stream(Enum):
+    """Independent random streams of an experiment
+
+    The sheep are placed from their own stream, so experiments sharing a
+    key start from the same herd whatever their shepherds.
+    """
+
+    SHEEP = 0
+    SHEPHERDS = 1
+    TICKS = 2
+
+
+def stream_key(sweep_seed, replicate):
+    """key of the random streams of a replicate, or experiment, of a sweep
+
+    Keys are the sweep seed and the replicate side by side, so the streams
+    of a sweep never collide.
+
+    Parameters
+    ----------
+    sweep_seed : int
+        the seed of the sweep, at most MAX_SWEEP_SEED
+    replicate : int or np.ndarray
+        the replicate numbers, below 2**REPLICATE_BITS
+
+    Returns
+    -------
+    np.ndarray
+        the keys, as int64
+    """
+    replicate = np.asarray(replicate, dtype=np.int64)
+    if not 0 <= sweep_seed <= MAX_SWEEP_SEED:
+        raise ValueError(f"sweep seeds range from 0 to {MAX_SWEEP_SEED}")
+    if np.any((replicate < 0) | (replicate >= 2**REPLICATE_BITS)):
+        raise ValueError(f"replicates range from 0 to 2**{REPLICATE_BITS} - 1")
+    return (np.int64(sweep_seed) << REPLICATE_BITS) | replicate
+
+
+def sweep_seeds(seed, num):
+    """num sweep seeds drawn from seed, e.g. one per sampled parameter"""
+    return np.random.SeedSequence(seed).generate_state(num) >> 1
+
+
+def generator(key, stream: Stream):
+    """counter-based generator of a stream of an experiment
+
+    Parameters
+    ----------
+    key : int or None
+        the key of the experiment, e.g. from `stream_key`; any integer, such
+        as a plain random seed, is a key. None draws a random key.
+    stream : Stream
+        the stream
+
+    Returns
+    -------
+    np.random.Generator
+        a Philox generator keyed by the key and the stream
+    """
+    if key is None:
+        return np.random.Generator(np.random.Philox())
+    key = int(key) % 2**64 | stream.value << 64
+    return np.random.Generator(np.random.Philox(key=key))
+
+
+def netlogo_seed(key, stream: Stream):
+    """NetLogo `random-seed` of a stream of an experiment, in [1, 2**31)"""
+    state = np.random.SeedSequence([int(key) % 2**64, stream.value]).generate_state(1)
+    return int(state[0] % (2**31 - 1)) + 1
@@ -0,0 +1,158 @@
+import warnings
+import numpy as np
+import pandas as pd
+from scipy.stats import norm
+from SALib.sample import saltelli
+
+from sample import Sampler
+from utils import nl2py
+
+
+def sobol_problem(parameters):
+    """SALib problem of the bounds of SampledParameters
+
+    Parameters
+    ----------
+    parameters : list of SampledParameter
+        the parameters to analyze
+
+    Returns
+    -------
+    dict
+        the problem, with the keys num_vars, names, bounds and, to round the
+        samples of integer parameters, integer
+
+    """
+    return {
+        "num_vars": len(parameters),
+        "names": [p.name for p in parameters],
+        "bounds": [list(p.bounds) for p in parameters],
+        "integer": [
+            p.sample_type in (Sampler.RANDINT, Sampler.LINEARINT) for p in parameters
+        ],
+    }
+
+
+def saltelli_design(problem, num_samples, calc_second_order=True):
+    """Saltelli samples of a problem as experiments
+
+    Parameters
+    ----------
+    problem : dict
+        the problem, see `sobol_problem`
+    num_samples : int
+        number of base samples N, preferably a power of 2; the design has
+        N (2 D + 2) rows, or N (D + 2) without second order indices
+    calc_second_order : bool, default=True
+        whether the design supports second order indices
+
+    Returns
+    -------
+    pd.DataFrame
+        the experiments, with python names, in the order `sobol_indices`
+        expects the outputs
+
+    """
+    x = saltelli.sample(problem, num_samples, calc_second_order=calc_second_order)
+    experiments = pd.DataFrame(x, columns=[nl2py(n) for n in problem["names"]])
+    for name, integer in zip(experiments.columns, problem.get("integer", [])):
+        if integer:
+            experiments[name] = experiments[name].round().astype(int)
+    return experiments
+
+
+def first_order(a, ab, b, var):
+    """first order estimator of Saltelli et al. (2010), over the last axes"""
+    return np.mean(b[..., None] * (ab - a[..., None]), axis=-2) / var[..., None]
+
+
+def total_order(a, ab, b, var):
+    """total order estimator of Jansen (1999), over the last axes"""
+    return 0.5 * np.mean((a[..., None] - ab) ** 2, axis=-2) / var[..., None]
+
+
+def second_order(a, ab, ba, b, var):
+    """second order estimator of Saltelli (2002), for every pair of parameters"""
+    n = a.shape[-1]
+    v = np.einsum("...nj,...nk->...jk", ba, ab) / n
+    v = (v - np.mean(a * b, axis=-1)[..., None, None]) / var[..., None, None]
+    s1 = first_order(a, ab, b, var)
+    return v - s1[..., :, None] - s1[..., None, :]
+
+
+def sobol_indices(
+    problem,
+    y,
+    calc_second_order=True,
+    num_resamples=1000,
+    conf_level=0.95,
+    seed=None,
+):
+    """Sobol indices of the outputs of a Saltelli design
+
+    The estimators are those of `SALib.analyze.sobol`, but every bootstrap
+    resample is evaluated at once on arrays with a leading resample axis,
+    which takes num_resamples * N * D floats of memory.
+
+    Parameters
+    ----------
+    problem : dict
+        the problem of the design
+    y : np.ndarray
+        outputs of the experiments of `saltelli_design`, in order
+    calc_second_order : bool, default=True
+        whether to compute the second order indices
+    num_resamples : int, default=1000
+        number of bootstrap resamples of the confidence intervals
+    conf_level : float, default=0.95
+        confidence level of the intervals
+    seed : int, optional
+        seed of the bootstrap
+
+    Returns
+    -------
+    dict
+        S1, S1_conf, ST, ST_conf and, with second order, S2 and S2_conf, as
+        returned by SALib and consumed by `plot_sobol_indices`
+
+    """
+    d = problem["num_vars"]
+    step = 2 * d + 2 if calc_second_order else d + 2
+    y = np.asarray(y, dtype=float).reshape(-1, step)
+    if y.std() == 0:
+        # like SALib, a constant output depends on none of the parameters
+        warnings.warn("the output is constant, all its Sobol indices are 0")
+        y = np.zeros_like(y)
+    else:
+        y = (y - y.mean()) / y.std()
+    a, ab, b = y[:, 0], y[:, 1 : d + 1], y[:, -1]
+    ba = y[:, d + 1 : 2 * d + 1]
+    n = len(y)
+
+    rng = np.random.default_rng(seed)
+    r = rng.integers(n, size=(num_resamples, n))
+    z = norm.ppf(0.5 + conf_level / 2)
+
+    def estimate(rows):
+        var = np.var(np.concatenate([a[rows], b[rows]], axis=-1), axis=-1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            indices = {
+                "S1": first_order(a[rows], ab[rows], b[rows], var),
+                "ST": total_order(a[rows], ab[rows], b[rows], var),
+            }
+            if calc_second_order:
+                indices["S2"] = second_order(a[rows], ab[rows], ba[rows], b[rows], var)
+        return indices
+
+    point = estimate(slice(None))
+    resampled = estimate(r)
+    si = {}
+    for key in point:
+        # resamples drawing a constant output have no variance to decompose
+        si[key] = np.nan_to_num(point[key])
+        si[f"{key}_conf"] = z * np.nan_to_num(resampled[key]).std(axis=0, ddof=1)
+    if calc_second_order:
+        lower = np.tril_indices(d)
+        for key in ("S2", "S2_conf"):
+            si[key][lower] = np.nan
+    return si
@@ -0,0 +1,1183 @@
+from dataclasses import dataclass, fields, replace
+import copy
+import numpy as np
+
+from utils import nl2py
+from spatial import NeighborCache, SpatialIndex
+from pierson import formation_solver
+from seeding import Stream, generator
+from vaughan import sheep_force_exact, sheep_force_grid, shepherd_force, wall_force
+
+# world of models/Shepherds.nlogo: a non-wrapping box of 601x601 patches of size 1
+MIN_PCOR = -300
+MAX_PCOR = 300
+PATCH_SIZE = 1.0
+GOAL_TOLERANCE = 10
+# herd size from which Simulation answers neighbor queries with a SpatialIndex
+SPATIAL_INDEX_MIN_SHEEP = 100
+# number of neighbors from which Simulation reuses the neighbor sets across ticks
+NEIGHBOR_CACHE_MIN_NEIGHBORS = 100
+# herd size from which Simulation approximates the far field of Vaughan sheep
+FAR_FIELD_MIN_SHEEP = 2000
+FAR_FIELD_THETA = 0.5
+# the weights set by `default-weights-strombom`, which differ by sheep model
+STROMBOM_WEIGHTS = dict(
+    sheep_speed=1.0,
+    radius_sheep=2.0,
+    weight_com=1.05,
+    weight_r_sheep=2.0,
+    weight_r_shepherd=1.0,
+    weight_inertia=0.5,
+    radius_shepherd=75.0,
+    num_neighbors=53,
+    weight_epsilon=0.05,
+)
+# the weights set by `default-weights-vaughan`
+VAUGHAN_WEIGHTS = dict(
+    sheep_speed=0.12,
+    radius_sheep=0.5,
+    weight_com=1.05,
+    weight_r_sheep=1.0,
+    weight_r_shepherd=1.0,
+    weight_inertia=0.5,
+    radius_shepherd=-1.0,
+    num_neighbors=-1,
+    weight_epsilon=-1.0,
+)
+
+
+@dataclass
+class ModelParameters:
+    """Parameters of the Shepherds model.
+
+    The attributes mirror the globals and interface widgets of
+    models/Shepherds.nlogo, with the NetLogo names converted by `nl2py`. The
+    defaults are the interface values after `default-weights-strombom`, but
+    for the weights left unset (None), which default to the weights of the
+    sheep model, as `setup` resets them to `default-weights-vaughan` for
+    Vaughan sheep.
+
+    Attributes
+    ----------
+    sheep_model : str
+        the sheep model, "strombom" or "vaughan"
+    shepherd_model : str
+        the shepherd model, "strombom"
+    num_sheep : int
+        the number of sheep
+    num_shepherds : int
+        the number of shepherds
+    num_neighbors : int
+        the number of neighbors used for the local center of mass
+
+    """
+
+    sheep_model: str = "strombom"
+    shepherd_model: str = "strombom"
+    num_sheep: int = 100
+    num_shepherds: int = 12
+    num_neighbors: int = None
+    sheep_speed: float = None
+    shepherd_speed: float = 1.5
+    probability_move_while_grazing: float = 0.05
+    radius_sheep: float = None
+    radius_shepherd: float = None
+    weight_inertia: float = None
+    weight_com: float = None
+    weight_r_shepherd: float = None
+    weight_r_sheep: float = None
+    weight_epsilon: float = None
+    weight_wall: float = -1.0
+    shepherd_r: float = 40.0
+    shepherd_k: float = 0.25
+    shepherd_ell: float = 10.0
+    dest_x: float = -90.0
+    dest_y: float = -90.0
+
+    def __post_init__(self):
+        weights = VAUGHAN_WEIGHTS if self.sheep_model == "vaughan" else STROMBOM_WEIGHTS
+        for name, value in weights.items():
+            if getattr(self, name) is None:
+                setattr(self, name, value)
+
+    @classmethod
+    def from_experiment(cls, experiment: dict, **model_parameters):
+        """build the parameters of an experiment
+
+        Parameters
+        ----------
+        experiment : dict
+            dictionary of experiment parameters, as passed to `setup_simulation`
+        model_parameters : dict
+            additional keyword parameters to the model; NetLogo string
+            literals such as '"strombom"' are unquoted
+
+        Returns
+        -------
+        parameters : ModelParameters
+            the model parameters
+        seed : int or None
+            the value of the "random_seed" parameter, if any
+
+        """
+        names = {f.name for f in fields(cls)}
+        values = {}
+        seed = None
+        for key, value in {**experiment, **model_parameters}.items():
+            key = nl2py(key)
+            if key == "random_seed":
+                seed = int(value)
+            elif key in names:
+                if isinstance(value, str):
+                    value = value.strip('"')
+                values[key] = value
+            else:
+                raise ValueError(f"unknown model parameter {key}")
+        return cls(**values), seed
+
+
+def normalize(u):
+    """normalize vectors along the last axis, leaving zero vectors unchanged"""
+    norm = np.linalg.norm(u, axis=-1, keepdims=True)
+    return np.divide(u, norm, out=np.zeros_like(u), where=norm > 0)
+
+
+def heading_to_vec2(heading):
+    """convert NetLogo headings (degrees clockwise from north) to unit vectors"""
+    theta = np.deg2rad(90 - np.asarray(heading, dtype=float))
+    return np.stack([np.cos(theta), np.sin(theta)], axis=-1)
+
+
+def random_vec2(rng, shape):
+    """draw unit vectors the way `random-vec2` does"""
+    signs = 2.0 * rng.integers(0, 2, size=(*shape, 2)) - 1.0
+    return normalize(signs * rng.random((*shape, 2)))
+
+
+def clamp_to_world(xy):
+    """clamp positions to the world the way `clamp-to-world` does"""
+    xy = xy.copy()
+    xy[xy > MAX_PCOR + PATCH_SIZE / 2] = MAX_PCOR
+    xy[xy < MIN_PCOR - PATCH_SIZE / 2] = MIN_PCOR
+    return xy
+
+
+def in_world(xy):
+    """whether positions lie inside the (non-wrapping) world"""
+    return np.all(
+        (xy >= MIN_PCOR - PATCH_SIZE / 2) & (xy < MAX_PCOR + PATCH_SIZE / 2), axis=-1
+    )
+
+
+def face(pos, heading, target):
+    """turn towards target the way `facexy` does"""
+    direction = target - pos
+    return np.where(
+        np.any(direction != 0, axis=-1, keepdims=True), normalize(direction), heading
+    )
+
+
+def forward(pos, heading, distance):
+    """move along heading the way `fd` does in a non-wrapping world
+
+    `fd` moves in steps of at most one patch and stops at the first step that
+    would leave the world.
+    """
+    distance = np.broadcast_to(distance, pos.shape[:-1]).astype(float)
+    remaining = distance.copy()
+    moving = remaining > 0
+    while np.any(moving):
+        step = np.minimum(remaining, 1.0)
+        candidate = pos + step[..., None] * heading
+        moving &= in_world(candidate)
+        pos = np.where(moving[..., None], candidate, pos)
+        remaining = np.where(moving, remaining - step, 0)
+        moving &= remaining > 0
+    return pos
+
+
+def pairwise_difference(a, b):
+    """differences a_i - b_j and their norms, shaped (..., len(a), len(b))"""
+    diff = a[..., :, None, :] - b[..., None, :, :]
+    return diff, np.linalg.norm(diff, axis=-1)
+
+
+def local_center_of_mass(pos, distance, k):
+    """mean position of the k nearest sheep of every sheep (`lcm`)
+
+    Like `lcm` in models/Shepherds.nlogo, both coordinates are the mean x
+    coordinate of the neighbors.
+
+    Parameters
+    ----------
+    pos : np.ndarray
+        sheep positions, shaped (..., N, 2)
+    distance : np.ndarray
+        sheep-sheep distances, shaped (..., N, N)
+    k : int or np.ndarray
+        number of neighbors, including the sheep itself as `min-n-of` does;
+        an array gives a different number for every batch member
+
+    Returns
+    -------
+    np.ndarray
+        local centers of mass, shaped (..., N, 2)
+
+    """
+    # select by the k-th smallest distance so that a member gets the same
+    # neighbors and the same floating point sums whatever batch it is part of
+    k = np.asarray(k)
+    if k.ndim == 0:
+        kth = np.partition(distance, k - 1, axis=-1)[..., k - 1 : k]
+    else:
+        k_max = k.max()
+        nearest = np.sort(np.partition(distance, k_max - 1, axis=-1)[..., :k_max])
+        kth = np.take_along_axis(
+            nearest,
+            np.broadcast_to((k - 1)[..., None, None], (*k.shape, 1, 1)),
+            axis=-1,
+        )
+    neighbors = (distance <= kth).astype(float)
+    # sum the neighbors one after the other in index order, as
+    # `local_center_of_mass_indexed` does, rather than with a matrix product
+    total = np.sum(neighbors[..., None] * pos[..., None, :, :], axis=-2)
+    lcm = total / neighbors.sum(axis=-1, keepdims=True)
+    return lcm[..., [0, 0]]
+
+
+def local_center_of_mass_indexed(
+    index: SpatialIndex, k, neighbors: NeighborCache = None
+):
+    """`local_center_of_mass` of the indexed sheep from k-nearest queries
+
+    With a NeighborCache of k neighbors, the neighbor sets of the previous
+    ticks are reused where they are still exact.
+    """
+    if neighbors is None:
+        _, nearest = index.k_nearest(k)
+    else:
+        nearest = neighbors.k_nearest(index)
+    # sum the neighbors in index order, however they were found
+    lcm = index.points[np.sort(nearest, axis=-1)].mean(axis=-2)
+    return lcm[..., [0, 0]]
+
+
+def inverse_power_sum(diff, distance, power, mask):
+    """sum of diff / distance ** power over the masked pairs"""
+    safe = np.where(mask & (distance > 0), distance, np.inf)
+    return np.sum(diff / safe[..., None] ** power, axis=-2)
+
+
+def repulsion_indexed(index: SpatialIndex, radius, power):
+    """sum over the other points within radius of (p_i - p_j) / |p_i - p_j| ** power
+
+    The pairs are tested and summed like in `inverse_power_sum`, one after
+    the other in index order, so the sums are those of the all-pairs path.
+    """
+    # the tree compares squared distances: widen it, then test the norms
+    pairs = index.pairs_within(radius * (1 + 1e-9))
+    diff = index.points[pairs[:, 0]] - index.points[pairs[:, 1]]
+    distance = np.linalg.norm(diff, axis=-1)
+    pairs, diff, distance = (a[distance <= radius] for a in (pairs, diff, distance))
+    diff = np.divide(
+        diff,
+        distance[:, None] ** power,
+        out=np.zeros_like(diff),
+        where=distance[:, None] > 0,
+    )
+    # every pair adds to both of its points, with opposite signs
+    target = np.concatenate([pairs[:, 0], pairs[:, 1]])
+    other = np.concatenate([pairs[:, 1], pairs[:, 0]])
+    diff = np.concatenate([diff, -diff])
+    order = np.lexsort((other, target))
+    total = np.zeros_like(index.points)
+    for axis in range(2):
+        total[:, axis] = np.bincount(
+            target[order], weights=diff[order, axis], minlength=len(index)
+        )
+    return total
+
+
+def sheep_heading_strombom(
+    pos,
+    heading,
+    shepherd_pos,
+    num_neighbors,
+    noise,
+    graze,
+    parameters,
+    index=None,
+    neighbors=None,
+):
+    """desired headings of Strombom sheep (`go-sheep-strombom`)
+
+    Parameters
+    ----------
+    pos, heading : np.ndarray
+        sheep positions and unit headings, shaped (..., N, 2)
+    shepherd_pos : np.ndarray
+        shepherd positions, shaped (..., M, 2)
+    num_neighbors : int or np.ndarray
+        number of neighbors for the local center of mass
+    noise : np.ndarray
+        `random-vec2` draws, shaped (..., N, 2)
+    graze : np.ndarray
+        uniform draws for the grazing probability, shaped (..., N)
+    parameters : ModelParameters
+        model parameters
+    index : SpatialIndex, optional
+        index of the (unbatched) sheep positions for the neighbor queries
+    neighbors : NeighborCache, optional
+        cache of the neighbor sets of the local center of mass, with index
+
+    Returns
+    -------
+    move : np.ndarray
+        which sheep move this tick, shaped (..., N)
+    vhat : np.ndarray
+        unit direction of the move, shaped (..., N, 2)
+
+    """
+    p = parameters
+    away_from_shepherds, shepherd_distance = pairwise_difference(pos, shepherd_pos)
+    nearby_shepherds = shepherd_distance < p.radius_shepherd
+    any_nearby_shepherds = np.any(nearby_shepherds, axis=-1)
+    move = any_nearby_shepherds | (graze < p.probability_move_while_grazing)
+
+    if index is None:
+        away_from_sheep, sheep_distance = pairwise_difference(pos, pos)
+        lcm = local_center_of_mass(pos, sheep_distance, num_neighbors)
+    else:
+        lcm = local_center_of_mass_indexed(index, num_neighbors, neighbors)
+
+    direction = p.weight_inertia * heading
+    com = normalize(lcm - pos)
+    r_shepherd = normalize(
+        inverse_power_sum(away_from_shepherds, shepherd_distance, 2, nearby_shepherds)
+    )
+    direction += any_nearby_shepherds[..., None] * (
+        p.weight_com * com + p.weight_r_shepherd * r_shepherd
+    )
+
+    if index is None:
+        # `other sheep in-radius` excludes the sheep itself
+        nearby_sheep = sheep_distance <= p.radius_sheep
+        np.einsum("...ii->...i", nearby_sheep)[...] = False
+        r_sheep = normalize(
+            inverse_power_sum(away_from_sheep, sheep_distance, 1, nearby_sheep)
+        )
+    else:
+        r_sheep = normalize(repulsion_indexed(index, p.radius_sheep, 1))
+    direction += p.weight_r_sheep * r_sheep
+    direction += p.weight_epsilon * noise
+    return move, normalize(direction)
+
+
+def sheep_velocity_vaughan(pos, shepherd_pos, parameters, theta=0.0):
+    """velocities of Vaughan sheep (`sheep-velocity-vaughan`)
+
+    Parameters
+    ----------
+    pos : np.ndarray
+        sheep positions, shaped (..., N, 2)
+    shepherd_pos : np.ndarray
+        shepherd positions, shaped (..., M, 2)
+    parameters : ModelParameters
+        model parameters
+    theta : float, default=0.0
+        accuracy of the far field approximation of the sheep-sheep forces,
+        see `sheep_force_grid`; 0 sums every pair exactly
+
+    Returns
+    -------
+    np.ndarray
+        the velocities, of norm at most `sheep_speed`, shaped (..., N, 2)
+
+    """
+    p = parameters
+    weights = p.weight_com, p.weight_r_sheep, p.radius_sheep
+    if theta > 0:
+        v = sheep_force_grid(pos, *weights, theta)
+    else:
+        v = sheep_force_exact(pos, *weights)
+    v += shepherd_force(pos, shepherd_pos, p.weight_r_shepherd)
+    v += wall_force(pos, p.weight_wall, MIN_PCOR, MAX_PCOR)
+    speed = np.minimum(p.sheep_speed, np.linalg.norm(v, axis=-1, keepdims=True))
+    return speed * normalize(v)
+
+
+def shepherd_heading_strombom(
+    pos, sheep_pos, gcm, spread, noise, parameters, index=None
+):
+    """desired headings of Strombom shepherds (`shepherd-strombom`)
+
+    Parameters
+    ----------
+    pos : np.ndarray
+        shepherd positions, shaped (..., M, 2)
+    sheep_pos : np.ndarray
+        sheep positions, shaped (..., N, 2)
+    gcm : np.ndarray
+        global center of mass of the sheep, shaped (..., 2)
+    spread : np.ndarray
+        distance of every sheep from gcm, shaped (..., N)
+    noise : np.ndarray
+        `random-vec2` draws, shaped (..., M, 2)
+    parameters : ModelParameters
+        model parameters
+    index : SpatialIndex, optional
+        index of the (unbatched) sheep positions for the proximity query
+
+    Returns
+    -------
+    np.ndarray
+        unit direction of the move, shaped (..., M, 2)
+
+    """
+    p = parameters
+    num_sheep = sheep_pos.shape[-2]
+    f_n = p.radius_sheep * num_sheep ** (2 / 3)
+
+    if index is None:
+        _, distance = pairwise_difference(pos, sheep_pos)
+        too_close = np.any(distance < 3 * p.radius_sheep, axis=-1)
+    else:
+        too_close = index.any_within(pos, 3 * p.radius_sheep)
+
+    from_gcm = sheep_pos - gcm[..., None, :]
+    collecting = np.any(spread > f_n, axis=-1)
+    furthest = np.argmax(spread, axis=-1)[..., None, None]
+    furthest_pos = np.take_along_axis(sheep_pos, furthest, axis=-2)[..., 0, :]
+    furthest_from_gcm = np.take_along_axis(from_gcm, furthest, axis=-2)[..., 0, :]
+    collect_target = furthest_pos + p.radius_sheep * normalize(furthest_from_gcm)
+
+    dest = np.array([p.dest_x, p.dest_y])
+    drive_target = gcm - p.radius_sheep * np.sqrt(num_sheep) * normalize(dest - gcm)
+
+    target = np.where(collecting[..., None], collect_target, drive_target)
+    v = normalize(target[..., None, :] - pos)
+    v = np.where(too_close[..., None], 0.0, v)
+
+    noise = p.weight_epsilon * noise
+    return np.where(
+        np.any(v != 0, axis=-1, keepdims=True), normalize(noise + v), normalize(noise)
+    )
+
+
+def move_agents(pos, heading, vhat, speed):
+    """face the clamped destination pos + speed * vhat and move forward"""
+    heading = face(pos, heading, clamp_to_world(pos + speed * vhat))
+    return forward(pos, heading, speed), heading
+
+
+def shepherd_heading_pierson(
+    pos, tracker_heading, sheep_pos, gcm, spread, radius, noise, parameters
+):
+    """formation update of `go` and desired headings of `shepherd-pierson`
+
+    Parameters
+    ----------
+    pos : np.ndarray
+        shepherd positions, shaped (..., M, 2)
+    tracker_heading : np.ndarray
+        unit heading of the tracker, shaped (..., 2)
+    sheep_pos : np.ndarray
+        sheep positions, shaped (..., N, 2)
+    gcm : np.ndarray
+        global center of mass of the sheep, shaped (..., 2)
+    spread : np.ndarray
+        distance of every sheep from gcm, shaped (..., N)
+    radius : np.ndarray
+        formation radius (`radius-pierson`), shaped (...)
+    noise : np.ndarray
+        `random-vec2` draws, shaped (..., M, 2)
+    parameters : ModelParameters
+        model parameters
+
+    Returns
+    -------
+    radius : np.ndarray
+        the updated formation radius
+    tracker_pos, tracker_heading : np.ndarray
+        the updated tracker (`point-offset` and the heading `psi`)
+    direction : np.ndarray
+        direction the shepherds face, shaped (..., M, 2)
+
+    """
+    p = parameters
+    m = p.num_shepherds
+
+    # delta-shepherd-radius
+    spread_sum = spread.max(axis=-1) + spread.mean(axis=-1)
+    shrinking = (radius > spread_sum / 2) & (radius > p.radius_shepherd / 2)
+    radius = radius + p.shepherd_k * np.where(
+        shrinking,
+        2 * (0.75 * p.radius_shepherd - radius) + 0.5 * spread_sum,
+        (p.shepherd_r - radius) + spread_sum,
+    )
+
+    # the tracker sits on the gcm, faces the goal and moves shepherd-ell forward
+    dest = np.array([p.dest_x, p.dest_y])
+    tracker_heading = face(gcm, tracker_heading, dest)
+    tracker_pos = forward(gcm, tracker_heading, p.shepherd_ell)
+    psi = np.rad2deg(np.arctan2(tracker_heading[..., 1], tracker_heading[..., 0]))
+
+    # v-pierson and compute-delta-pierson
+    v = -p.shepherd_k * np.sum(tracker_heading * (tracker_pos - dest), axis=-1)
+    v = np.clip(v, 0, p.shepherd_speed)
+    delta = formation_solver(m, p.shepherd_speed)(np.abs(v))
+
+    ids = np.arange(1, m + 1)
+    delta_j = np.asarray(delta)[..., None] * (2 * ids - m - 1) / (2 * m - 2)
+    alpha_j = np.deg2rad(psi[..., None] + 180 + delta_j)
+    target = gcm[..., None, :] + np.asarray(radius)[..., None, None] * np.stack(
+        [np.cos(alpha_j), np.sin(alpha_j)], axis=-1
+    )
+    direction = normalize(target - pos) + p.weight_epsilon * noise
+    return radius, tracker_pos, tracker_heading, direction
+
+
+def setup_parameters(parameters):
+    """the parameters after `setup`, raising if the engine cannot run them"""
+    p = parameters
+    if p.sheep_model not in ("strombom", "vaughan"):
+        raise NotImplementedError(f"sheep model {p.sheep_model!r} is not implemented")
+    if p.shepherd_model == "pierson":
+        if p.num_shepherds < 2:
+            raise ValueError("the Pierson shepherd model needs at least 2 shepherds")
+        if p.shepherd_speed >= p.num_shepherds:
+            raise ValueError(
+                "the Pierson formation has no solution for shepherd_speed >= num_shepherds"
+            )
+        # setup resets shepherd-r in the Pierson model
+        return replace(p, shepherd_r=40.0)
+    if p.shepherd_model != "strombom":
+        raise NotImplementedError(
+            f"shepherd model {p.shepherd_model!r} is not implemented"
+        )
+    return p
+
+
+@dataclass
+class State:
+    """State of the agents of a flock, or of a batch of flocks.
+
+    All arrays may carry the same leading batch axes.
+
+    Attributes
+    ----------
+    sheep_pos, sheep_heading : np.ndarray
+        sheep positions and unit headings, shaped (..., N, 2)
+    shepherd_pos, shepherd_heading : np.ndarray
+        shepherd positions and unit headings, shaped (..., M, 2)
+    gcm : np.ndarray
+        global center of mass of the sheep (`gcm-x`, `gcm-y`), shaped (..., 2)
+    spread : np.ndarray
+        distance of every sheep from gcm, shaped (..., N); observed once per
+        tick for the shepherds and the win condition (`observe-sheep`, where
+        the NetLogo shepherds still scan the herd each)
+    radius_pierson : np.ndarray
+        formation radius of the Pierson shepherds, shaped (...)
+    tracker_pos, tracker_heading : np.ndarray
+        position and unit heading of the Pierson tracker, shaped (..., 2)
+
+    """
+
+    sheep_pos: np.ndarray
+    sheep_heading: np.ndarray
+    shepherd_pos: np.ndarray
+    shepherd_heading: np.ndarray
+    gcm: np.ndarray
+    spread: np.ndarray
+    radius_pierson: np.ndarray
+    tracker_pos: np.ndarray
+    tracker_heading: np.ndarray
+
+    def __getitem__(self, members):
+        return State(**{f.name: getattr(self, f.name)[members] for f in fields(self)})
+
+    def __setitem__(self, members, state):
+        for f in fields(self):
+            getattr(self, f.name)[members] = getattr(state, f.name)
+
+    @classmethod
+    def stack(cls, states):
+        """stack states along a new leading batch axis"""
+        return cls(
+            **{
+                f.name: np.stack([getattr(s, f.name) for s in states])
+                for f in fields(cls)
+            }
+        )
+
+
+def place_agents(rng, parameters, sheep_rng=None):
+    """random initial state of a flock (`setup`)
+
+    Parameters
+    ----------
+    rng : np.random.Generator
+        the random number generator
+    parameters : ModelParameters
+        model parameters, as returned by `setup_parameters`
+    sheep_rng : np.random.Generator, optional
+        the generator placing the sheep, by default rng; with their own
+        generator, the herd does not depend on the shepherds
+
+    Returns
+    -------
+    State
+        the initial state
+
+    """
+    p = parameters
+    shepherd_heading = heading_to_vec2(rng.integers(0, 360, p.num_shepherds))
+    shepherd_pos = rng.uniform(MIN_PCOR, MAX_PCOR, (p.num_shepherds, 2))
+    sheep_rng = rng if sheep_rng is None else sheep_rng
+    sheep_heading = heading_to_vec2(sheep_rng.integers(0, 360, p.num_sheep))
+    sheep_pos = sheep_rng.uniform(MIN_PCOR / 2, MAX_PCOR / 2, (p.num_sheep, 2))
+    if p.shepherd_model == "pierson":
+        tracker_heading = heading_to_vec2(rng.integers(0, 360))
+    else:
+        tracker_heading = heading_to_vec2(0)
+    gcm = sheep_pos.mean(axis=0)
+    return State(
+        sheep_pos=sheep_pos,
+        sheep_heading=sheep_heading,
+        shepherd_pos=shepherd_pos,
+        shepherd_heading=shepherd_heading,
+        gcm=gcm,
+        spread=np.linalg.norm(sheep_pos - gcm, axis=-1),
+        radius_pierson=np.array(p.shepherd_r),
+        tracker_pos=np.zeros(2),
+        tracker_heading=tracker_heading,
+    )
+
+
+def effective_num_neighbors(parameters):
+    """`num-neighbors` after the adjustment made by `setup`"""
+    p = parameters
+    num_neighbors = p.num_neighbors
+    if num_neighbors > p.num_sheep:
+        num_neighbors = p.num_sheep - 1
+    return num_neighbors
+
+
+def draw_tick(rng, num_sheep, num_shepherds):
+    """random numbers consumed by one tick
+
+    Returns
+    -------
+    sheep_noise : np.ndarray
+        `random-vec2` draws of the sheep, shaped (N, 2)
+    graze : np.ndarray
+        uniform draws for the grazing probability, shaped (N,)
+    shepherd_noise : np.ndarray
+        `random-vec2` draws of the shepherds, shaped (M, 2)
+
+    """
+    return (
+        random_vec2(rng, (num_sheep,)),
+        rng.random(num_sheep),
+        random_vec2(rng, (num_shepherds,)),
+    )
+
+
+def step(
+    state: State,
+    num_neighbors,
+    draws,
+    parameters,
+    index=None,
+    theta=0.0,
+    neighbors=None,
+):
+    """advance flocks by one tick (`go`)
+
+    Parameters
+    ----------
+    state : State
+        the state of the flocks
+    num_neighbors : int or np.ndarray
+        number of neighbors for the local center of mass, at least 1
+    draws : tuple of np.ndarray
+        the random numbers of the tick, as returned by `draw_tick`
+    parameters : ModelParameters
+        model parameters, as returned by `setup_parameters`
+    index : SpatialIndex, optional
+        index of the (unbatched) sheep positions; the sheep positions after
+        the move are indexed for the shepherds and the next tick
+    theta : float, default=0.0
+        accuracy of the far field of Vaughan sheep, see `sheep_velocity_vaughan`
+    neighbors : NeighborCache, optional
+        cache of the neighbor sets of the local center of mass, with index
+
+    Returns
+    -------
+    state : State
+        the updated state
+    index : SpatialIndex or None
+        index of the updated sheep positions, if an index was given
+
+    """
+    p = parameters
+    sheep_noise, graze, shepherd_noise = draws
+    state = replace(state)
+
+    if p.sheep_model == "vaughan":
+        v = sheep_velocity_vaughan(state.sheep_pos, state.shepherd_pos, p, theta)
+        state.sheep_heading = face(
+            state.sheep_pos, state.sheep_heading, state.sheep_pos + v
+        )
+        state.sheep_pos = forward(
+            state.sheep_pos, state.sheep_heading, np.linalg.norm(v, axis=-1)
+        )
+    else:
+        move, vhat = sheep_heading_strombom(
+            state.sheep_pos,
+            state.sheep_heading,
+            state.shepherd_pos,
+            num_neighbors,
+            sheep_noise,
+            graze,
+            p,
+            index,
+            neighbors,
+        )
+        pos, heading = move_agents(
+            state.sheep_pos, state.sheep_heading, vhat, p.sheep_speed
+        )
+        state.sheep_pos = np.where(move[..., None], pos, state.sheep_pos)
+        state.sheep_heading = np.where(move[..., None], heading, state.sheep_heading)
+    state.gcm = state.sheep_pos.mean(axis=-2)
+    state.spread = spread(state)
+    if index is not None:
+        index = SpatialIndex(state.sheep_pos)
+
+    if p.shepherd_model == "pierson":
+        (
+            state.radius_pierson,
+            state.tracker_pos,
+            state.tracker_heading,
+            direction,
+        ) = shepherd_heading_pierson(
+            state.shepherd_pos,
+            state.tracker_heading,
+            state.sheep_pos,
+            state.gcm,
+            state.spread,
+            state.radius_pierson,
+            shepherd_noise,
+            p,
+        )
+        state.shepherd_heading = face(
+            state.shepherd_pos, state.shepherd_heading, state.shepherd_pos + direction
+        )
+        state.shepherd_pos = forward(
+            state.shepherd_pos, state.shepherd_heading, p.shepherd_speed
+        )
+    else:
+        vhat = shepherd_heading_strombom(
+            state.shepherd_pos,
+            state.sheep_pos,
+            state.gcm,
+            state.spread,
+            shepherd_noise,
+            p,
+            index,
+        )
+        state.shepherd_pos, state.shepherd_heading = move_agents(
+            state.shepherd_pos, state.shepherd_heading, vhat, p.shepherd_speed
+        )
+    return state, index
+
+
+def spread(state: State):
+    """distance of every sheep from the global center of mass of its flock"""
+    return np.linalg.norm(state.sheep_pos - state.gcm[..., None, :], axis=-1)
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """Full state of a Simulation at a tick, see `Simulation.snapshot`.
+
+    Snapshots are small (the agents and three generator states) and pickle
+    as they are, e.g. to send them to workers or write them to disk.
+
+    Attributes
+    ----------
+    parameters : ModelParameters
+        the parameters of the simulation, after `setup_parameters`
+    state : State
+        the agents
+    ticks : int
+        the tick
+    rng_states : tuple of dict
+        states of the tick, shepherd and sheep streams
+
+    """
+
+    parameters: ModelParameters
+    state: State
+    ticks: int
+    rng_states: tuple
+
+
+class Simulation:
+    """Vectorized NumPy implementation of models/Shepherds.nlogo.
+
+    The sheep and shepherd states are stored as arrays and every breed is
+    updated at once. Unlike NetLogo's `ask`, which updates the agents one
+    after the other, all sheep observe the flock as it was at the start of
+    the tick. Random numbers are drawn from the counter-based streams of the
+    seed (see `seeding.generator`), so runs are reproducible for a given
+    seed but do not match NetLogo's stream. The sheep are placed from their
+    own stream, so a seed gives the same herd whatever the shepherds.
+
+    Parameters
+    ----------
+    parameters : ModelParameters
+        model parameters
+    seed : int, optional
+        the random seed, or stream key (see `seeding.stream_key`)
+    spatial_index : bool, optional
+        answer the neighbor queries with a SpatialIndex rebuilt once per tick
+        instead of all-pairs distances; by default for herds of at least
+        SPATIAL_INDEX_MIN_SHEEP sheep. Both sum the same terms in the same
+        order, so a run, like that of an Ensemble member, is the same either
+        way
+    theta : float, optional
+        accuracy of the far field approximation of the forces between Vaughan
+        sheep, see `sheep_force_grid`; by default FAR_FIELD_THETA for herds
+        of at least FAR_FIELD_MIN_SHEEP sheep, and 0, the exact sum, below
+    neighbor_cache : bool, optional
+        with the spatial index, reuse the neighbor sets of the local center
+        of mass from tick to tick with a NeighborCache; by default for at
+        least NEIGHBOR_CACHE_MIN_NEIGHBORS neighbors, below which querying
+        the index anew is as fast
+
+    """
+
+    def __init__(
+        self,
+        parameters: ModelParameters,
+        seed=None,
+        spatial_index=None,
+        theta=None,
+        neighbor_cache=None,
+    ):
+        self.parameters = setup_parameters(parameters)
+        self.rng = generator(seed, Stream.TICKS)
+        self.layout_rngs = (
+            generator(seed, Stream.SHEPHERDS),
+            generator(seed, Stream.SHEEP),
+        )
+        if spatial_index is None:
+            spatial_index = parameters.num_sheep >= SPATIAL_INDEX_MIN_SHEEP
+        self.spatial_index = spatial_index
+        if theta is None:
+            theta = (
+                FAR_FIELD_THETA if parameters.num_sheep >= FAR_FIELD_MIN_SHEEP else 0.0
+            )
+        self.theta = theta
+        self.neighbor_cache = neighbor_cache
+        self.setup()
+
+    @classmethod
+    def from_experiment(cls, experiment: dict, **model_parameters):
+        """set up a simulation from the same arguments as `setup_simulation`"""
+        parameters, seed = ModelParameters.from_experiment(
+            experiment, **model_parameters
+        )
+        return cls(parameters, seed)
+
+    @classmethod
+    def from_snapshot(cls, snapshot: Snapshot, seed=None, **changes):
+        """continue a snapshot, or fork it with other parameters
+
+        Parameters
+        ----------
+        snapshot : Snapshot
+            the snapshot
+        seed : int, optional
+            continue on the streams of this seed rather than those of the
+            snapshot, e.g. to fork several continuations
+        changes : dict
+            parameters to change, see `restore`
+
+        Returns
+        -------
+        Simulation
+            the simulation, at the tick of the snapshot
+        """
+        simulation = cls(replace(snapshot.parameters, **changes), seed)
+        return simulation.restore(snapshot, reseed=seed is not None)
+
+    def snapshot(self):
+        """the full state of the simulation, see `Snapshot`"""
+        rngs = (self.rng, *self.layout_rngs)
+        return Snapshot(
+            parameters=self.parameters,
+            state=copy.deepcopy(self.state),
+            ticks=self.ticks,
+            rng_states=tuple(copy.deepcopy(r.bit_generator.state) for r in rngs),
+        )
+
+    def restore(self, snapshot: Snapshot, reseed=False):
+        """continue from a snapshot with the parameters of this simulation
+
+        The agents, tick and random streams of the snapshot replace those of
+        the simulation. Its parameters may differ from those of the snapshot
+        but for the number of sheep, to fork it: shepherds are added at
+        random from the shepherd stream (`fork-setup`), or the last ones
+        removed, and a Pierson formation starts at shepherd_r.
+
+        Parameters
+        ----------
+        snapshot : Snapshot
+            the snapshot
+        reseed : bool, default=False
+            keep the random streams of this simulation
+
+        Returns
+        -------
+        Simulation
+            the simulation
+        """
+        p = self.parameters
+        if p.num_sheep != snapshot.parameters.num_sheep:
+            raise ValueError("a fork cannot change the number of sheep")
+        if not reseed:
+            rngs = (self.rng, *self.layout_rngs)
+            for rng, state in zip(rngs, snapshot.rng_states):
+                rng.bit_generator.state = copy.deepcopy(state)
+        state = copy.deepcopy(snapshot.state)
+        missing = p.num_shepherds - len(state.shepherd_pos)
+        if missing > 0:
+            shepherd_rng = self.layout_rngs[0]
+            heading = heading_to_vec2(shepherd_rng.integers(0, 360, missing))
+            pos = shepherd_rng.uniform(MIN_PCOR, MAX_PCOR, (missing, 2))
+            state.shepherd_heading = np.concatenate([state.shepherd_heading, heading])
+            state.shepherd_pos = np.concatenate([state.shepherd_pos, pos])
+        state.shepherd_pos = state.shepherd_pos[: p.num_shepherds]
+        state.shepherd_heading = state.shepherd_heading[: p.num_shepherds]
+        switched = snapshot.parameters.shepherd_model != p.shepherd_model
+        if switched and p.shepherd_model == "pierson":
+            state.radius_pierson = np.array(p.shepherd_r)
+        self.state = state
+        self.ticks = snapshot.ticks
+        self.derive()
+        return self
+
+    def setup(self):
+        """place the agents and reset the tick counter (`setup`)"""
+        shepherd_rng, sheep_rng = self.layout_rngs
+        self.state = place_agents(shepherd_rng, self.parameters, sheep_rng)
+        self.ticks = 0
+        self.derive()
+
+    def derive(self):
+        """derive the globals and indexes of the parameters and agents"""
+        p = self.parameters
+        self.num_neighbors = effective_num_neighbors(p)
+        self.f_n = p.radius_sheep * p.num_sheep ** (2 / 3)
+        self.dest = np.array([p.dest_x, p.dest_y], dtype=float)
+        self.index = SpatialIndex(self.state.sheep_pos) if self.spatial_index else None
+        self.neighbors = None
+        neighbor_cache = self.neighbor_cache
+        if neighbor_cache is None:
+            neighbor_cache = self.num_neighbors >= NEIGHBOR_CACHE_MIN_NEIGHBORS
+        if self.index is not None and neighbor_cache:
+            self.neighbors = NeighborCache(max(self.num_neighbors, 1))
+        self.check_win()
+
+    def go(self):
+        """advance the simulation by one tick (`go`)"""
+        p = self.parameters
+        self.state, self.index = step(
+            self.state,
+            max(self.num_neighbors, 1),
+            draw_tick(self.rng, p.num_sheep, p.num_shepherds),
+            p,
+            self.index,
+            self.theta,
+            self.neighbors,
+        )
+        self.ticks += 1
+        self.check_win()
+
+    def go_for(self, iters, max_ticks=None):
+        """run `go` iters times or until the herd reaches the goal (`go-for`)"""
+        for _ in range(iters):
+            self.go()
+            if self.win or (max_ticks is not None and self.ticks >= max_ticks):
+                break
+
+    @property
+    def neighbor_rebuild_rate(self):
+        """fraction of the neighbor sets queried anew, NaN without a cache"""
+        return float("nan") if self.neighbors is None else self.neighbors.rebuild_rate
+
+    def check_win(self):
+        """update the win condition (`check-win`)"""
+        self.cohesive = not np.any(self.spread() > self.f_n)
+        self.at_goal = self.gcm_distance_from_goal() < GOAL_TOLERANCE
+        self.win = self.cohesive and self.at_goal
+
+    def spread(self):
+        """distance of every sheep from the global center of mass"""
+        return self.state.spread
+
+    def max_spread_global(self):
+        """`max-spread-global`"""
+        return self.spread().max()
+
+    def average_spread_global(self):
+        """`average-spread-global`"""
+        return self.spread().mean()
+
+    def gcm_distance_from_goal(self):
+        """`gcm-distance-from-goal`"""
+        return np.linalg.norm(self.state.gcm - self.dest)
+
+    def average_distance_from_goal(self):
+        """`average-distance-from-goal`"""
+        return np.linalg.norm(self.state.sheep_pos - self.dest, axis=-1).mean()
+
+    def average_spread_local(self):
+        """`average-spread-local`"""
+        k = max(self.num_neighbors, 1)
+        pos = self.state.sheep_pos
+        if self.index is None:
+            _, distance = pairwise_difference(pos, pos)
+            lcm = local_center_of_mass(pos, distance, k)
+        else:
+            lcm = local_center_of_mass_indexed(self.index, k)
+        return np.linalg.norm(lcm - pos, axis=-1).mean()
+
+
+class Ensemble:
+    """Batch of independent simulations advanced together.
+
+    The members share every model parameter except `num_neighbors` and the
+    random seed, so their states stack into arrays with a leading batch axis
+    and a tick costs a handful of array operations for the whole batch.
+    Members stop being updated once they win or reach `max_ticks`. Every
+    member draws from its own generator, so its run does not depend on the
+    other members of the batch.
+
+    Parameters
+    ----------
+    parameters : list of ModelParameters
+        model parameters of every member
+    seeds : list of int
+        the random seed of every member
+
+    """
+
+    def __init__(self, parameters: list, seeds: list):
+        if len(parameters) == 0 or len(parameters) != len(seeds):
+            raise ValueError("an ensemble needs one seed for each of its members")
+        shared = replace(parameters[0], num_neighbors=0)
+        if any(replace(p, num_neighbors=0) != shared for p in parameters):
+            raise ValueError("ensemble members may only differ in num_neighbors")
+        self.parameters = setup_parameters(shared)
+        self.member_parameters = list(parameters)
+        self.rngs = [generator(seed, Stream.TICKS) for seed in seeds]
+        self.layout_rngs = [
+            (generator(seed, Stream.SHEPHERDS), generator(seed, Stream.SHEEP))
+            for seed in seeds
+        ]
+        self.setup()
+
+    @classmethod
+    def from_experiments(cls, experiments: list, **model_parameters):
+        """set up an ensemble from a list of experiment dictionaries"""
+        parameters, seeds = zip(
+            *(
+                ModelParameters.from_experiment(experiment, **model_parameters)
+                for experiment in experiments
+            )
+        )
+        return cls(list(parameters), list(seeds))
+
+    def __len__(self):
+        return len(self.rngs)
+
+    def setup(self):
+        """place the agents of every member and reset the tick counters"""
+        p = self.parameters
+        self.num_neighbors = np.array(
+            [max(effective_num_neighbors(q), 1) for q in self.member_parameters]
+        )
+        self.f_n = p.radius_sheep * p.num_sheep ** (2 / 3)
+        self.dest = np.array([p.dest_x, p.dest_y], dtype=float)
+
+        self.state = State.stack(
+            [place_agents(rng, p, sheep_rng) for rng, sheep_rng in self.layout_rngs]
+        )
+
+        self.ticks = np.zeros(len(self), dtype=int)
+        self.active = np.ones(len(self), dtype=bool)
+        self.check_win()
+
+    def go(self, max_ticks=None):
+        """advance the active members by one tick
+
+        Parameters
+        ----------
+        max_ticks : int, optional
+            members reaching this many ticks stop being updated
+
+        """
+        p = self.parameters
+        members = np.flatnonzero(self.active)
+        draws = tuple(
+            np.stack(draw)
+            for draw in zip(
+                *(
+                    draw_tick(self.rngs[b], p.num_sheep, p.num_shepherds)
+                    for b in members
+                )
+            )
+        )
+        self.state[members], _ = step(
+            self.state[members], self.num_neighbors[members], draws, p
+        )
+        self.ticks[members] += 1
+        self.check_win()
+        self.active &= ~self.win
+        if max_ticks is not None:
+            self.active &= self.ticks < max_ticks
+
+    def run(self, max_ticks=6000):
+        """run until every member has won or reached max_ticks ticks"""
+        self.active &= self.ticks < max_ticks
+        while np.any(self.active):
+            self.go(max_ticks)
+
+    def check_win(self):
+        """update the win condition of every member (`check-win`)"""
+        self.cohesive = ~np.any(self.spread() > self.f_n, axis=-1)
+        self.at_goal = self.gcm_distance_from_goal() < GOAL_TOLERANCE
+        self.win = self.cohesive & self.at_goal
+
+    def spread(self):
+        """distance of every sheep from the global center of mass of its member"""
+        return self.state.spread
+
+    def max_spread_global(self):
+        """`max-spread-global` of every member"""
+        return self.spread().max(axis=-1)
+
+    def average_spread_global(self):
+        """`average-spread-global` of every member"""
+        return self.spread().mean(axis=-1)
+
+    def gcm_distance_from_goal(self):
+        """`gcm-distance-from-goal` of every member"""
+        return np.linalg.norm(self.state.gcm - self.dest, axis=-1)
+
+    def average_distance_from_goal(self):
+        """`average-distance-from-goal` of every member"""
+        return np.linalg.norm(self.state.sheep_pos - self.dest, axis=-1).mean(axis=-1)
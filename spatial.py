@@ -0,0 +1,196 @@
+import numpy as np
+from scipy.spatial import cKDTree
+
+
+class SpatialIndex:
+    """KD-tree over a set of points answering batched neighbor queries.
+
+    The index is built once for a snapshot of the positions (e.g. once per
+    tick) and answers the radius and k-nearest queries of the whole flock in
+    a single call each, in O(N log N) rather than the O(N^2) of scanning
+    every agent for every agent.
+
+    Parameters
+    ----------
+    points : np.ndarray
+        the indexed positions, shaped (N, 2)
+
+    """
+
+    def __init__(self, points):
+        self.points = np.asarray(points, dtype=float)
+        self.tree = cKDTree(self.points)
+
+    def __len__(self):
+        return len(self.points)
+
+    def k_nearest(self, k, queries=None):
+        """the k nearest indexed points of every query
+
+        Parameters
+        ----------
+        k : int
+            number of neighbors
+        queries : np.ndarray, optional
+            query positions, shaped (Q, 2); by default the indexed points,
+            which then count as their own nearest neighbor like in `min-n-of`
+
+        Returns
+        -------
+        distance : np.ndarray
+            distances to the neighbors in increasing order, shaped (Q, k)
+        index : np.ndarray
+            indices of the neighbors, shaped (Q, k)
+
+        """
+        queries = self.points if queries is None else queries
+        distance, index = self.tree.query(queries, k=[*range(1, k + 1)])
+        return distance, index
+
+    def pairs_within(self, radius):
+        """index pairs (i, j) with i < j of the points at most radius apart
+
+        Returns
+        -------
+        np.ndarray
+            the pairs, shaped (P, 2)
+
+        """
+        return self.tree.query_pairs(radius, output_type="ndarray")
+
+    def any_within(self, queries, radius):
+        """whether any indexed point lies strictly closer than radius to each query
+
+        Parameters
+        ----------
+        queries : np.ndarray
+            query positions, shaped (Q, 2)
+        radius : float
+            the radius
+
+        Returns
+        -------
+        np.ndarray
+            boolean mask, shaped (Q,)
+
+        """
+        distance, _ = self.tree.query(queries, k=1, distance_upper_bound=radius)
+        return distance < radius
+
+    def count_within(self, queries, radius):
+        """number of indexed points at most radius from each query"""
+        return self.tree.query_ball_point(queries, radius, return_length=True)
+
+
+class NeighborCache:
+    """k nearest neighbors of moving points, reused from tick to tick.
+
+    Every point caches its k + extra nearest points as candidates, and the
+    distance R to the furthest of them: at that time no other point was
+    closer than R. The cumulative maximum displacement D of any point since
+    then bounds how much a distance changed, so a point outside the
+    candidates is still at least R - 2 D away. While the k-th nearest
+    candidate is closer than that, the k nearest candidates are the exact k
+    nearest points; otherwise the candidates of the point are queried again.
+    As a point moves at most `sheep-speed` per tick, most points keep their
+    candidates for several ticks and only select among them, and the points
+    whose candidates all stood still keep their neighbors as they are.
+
+    Parameters
+    ----------
+    k : int
+        number of neighbors, counting the point itself as `min-n-of` does
+    extra : int, optional
+        number of candidates beyond the k nearest, the skin; by default
+        k // 4 + 8
+
+    Attributes
+    ----------
+    queries : int
+        number of neighbor sets answered
+    rebuilds : int
+        number of those that queried the index
+
+    """
+
+    def __init__(self, k, extra=None):
+        self.k = k
+        self.extra = k // 4 + 8 if extra is None else extra
+        self.points = None
+        self.queries = 0
+        self.rebuilds = 0
+
+    @property
+    def rebuild_rate(self):
+        """fraction of the neighbor sets queried from the index, NaN if none"""
+        return self.rebuilds / self.queries if self.queries else float("nan")
+
+    def k_nearest(self, index: SpatialIndex):
+        """indices of the k nearest indexed points of every indexed point
+
+        Parameters
+        ----------
+        index : SpatialIndex
+            index of the current positions, with the same points in the same
+            order at every call
+
+        Returns
+        -------
+        np.ndarray
+            the neighbors, in no particular order, shaped (N, k)
+
+        """
+        points = index.points
+        n = len(points)
+        size = min(self.k + self.extra, n)
+        if self.points is None or len(self.points) != n:
+            self.candidates = np.zeros((n, size), dtype=np.intp)
+            self.radius = np.full(n, -np.inf)
+            self.since = np.zeros(n)
+            self.displacement = 0.0
+            # positions of the k nearest among the candidates and their distance
+            self.nearest = np.zeros((n, self.k), dtype=np.intp)
+            self.kth = np.full(n, np.inf)
+            dirty = np.zeros(n, dtype=bool)
+        else:
+            step = np.linalg.norm(points - self.points, axis=-1)
+            self.displacement += step.max(initial=0.0)
+            # the neighbors of a point are unchanged if neither the point nor
+            # its candidates moved, unless a further point came closer
+            moved = step > 0
+            dirty = moved | np.any(moved[self.candidates], axis=-1)
+        self.points = points.copy()
+
+        rows = np.flatnonzero(dirty)
+        offset = points[self.candidates[rows]] - points[rows, None]
+        distance = np.sqrt(np.einsum("...i,...i->...", offset, offset))
+        nearest = np.argpartition(distance, self.k - 1, axis=-1)[:, : self.k]
+        self.nearest[rows] = nearest
+        self.kth[rows] = np.take_along_axis(distance, nearest, axis=-1).max(
+            axis=-1, initial=0.0
+        )
+        stale = np.flatnonzero(
+            self.kth >= self.radius - 2 * (self.displacement - self.since)
+        )
+        if len(stale):
+            if size == n:
+                # every point is a candidate of every point
+                candidates = np.broadcast_to(np.arange(n), (len(stale), n))
+                radius = np.inf
+                offset = points[None, :] - points[stale, None]
+                distance = np.sqrt(np.einsum("...i,...i->...", offset, offset))
+                nearest = np.argpartition(distance, self.k - 1, axis=-1)[:, : self.k]
+                kth = np.take_along_axis(distance, nearest, axis=-1).max(axis=-1)
+            else:
+                distance, candidates = index.k_nearest(size, points[stale])
+                radius = distance[:, -1]
+                nearest = np.arange(self.k)
+                kth = distance[:, self.k - 1]
+            self.candidates[stale] = candidates
+            self.radius[stale] = radius
+            self.since[stale] = self.displacement
+            self.nearest[stale] = nearest
+            self.kth[stale] = kth
+        self.queries += n
+        self.rebuilds += len(stale)
+        return np.take_along_axis(self.candidates, self.nearest, axis=-1)
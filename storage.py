@@ -0,0 +1,419 @@
+import hashlib
+import json
+import os
+import pickle
+import re
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+from utils import nl2py
+
+TIME_SERIES_COLUMNS = [
+    "Tick",
+    "Average Spread",
+    "Max Spread",
+    "GCM Distance from Goal",
+    "Average Distance from Goal",
+]
+
+
+def canonical_value(value):
+    """plain python value of an experiment parameter, for hashing
+
+    NumPy scalars become python scalars, integral floats become ints and the
+    quotes of NetLogo strings are dropped, so the same experiment hashes the
+    same whether it comes from a DataFrame row, a dict or a NetLogo command.
+    """
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    if isinstance(value, str):
+        value = value.strip('"')
+    return value
+
+
+def experiment_key(experiment: dict):
+    """stable hash of the experiment parameters
+
+    Parameters
+    ----------
+    experiment : dict
+        the experiment parameters, with python or NetLogo names
+
+    Returns
+    -------
+    str
+        hexadecimal key, identical across processes and sessions
+
+    """
+    items = {nl2py(key): canonical_value(value) for key, value in experiment.items()}
+    blob = json.dumps(items, sort_keys=True, default=str)
+    return hashlib.sha1(blob.encode()).hexdigest()[:16]
+
+
+class TimeSeriesStore:
+    """Directory of per-experiment time series, one .npz partition each.
+
+    Every partition holds one array per column of TIME_SERIES_COLUMNS and is
+    named after the `experiment_key` of its experiment and of the
+    configuration of the store, like the keys of a ResultsStore, so sweeps of
+    other shepherd models, max_ticks or strides share a directory without
+    overwriting each other's series. Workers write their series as soon as
+    an experiment finishes; the parent process only keeps the directory and
+    loads partitions on demand.
+
+    Parameters
+    ----------
+    directory : str, Path
+        the store directory, created if needed
+    configuration : dict, optional
+        the fixed parameters of the run, hashed with every experiment
+
+    """
+
+    def __init__(self, directory, configuration: dict = None):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.configuration = {} if configuration is None else dict(configuration)
+
+    def configured(self, configuration: dict):
+        """the store of the same directory keyed by another configuration"""
+        return TimeSeriesStore(self.directory, configuration)
+
+    def key(self, experiment: dict):
+        """the key of the partition of an experiment"""
+        return experiment_key({**self.configuration, **experiment})
+
+    def path(self, key):
+        """path of the partition of key"""
+        return self.directory / f"{key}.npz"
+
+    def write(self, experiment: dict, data: np.ndarray):
+        """store the series of an experiment
+
+        Parameters
+        ----------
+        experiment : dict
+            the experiment parameters
+        data : np.ndarray
+            samples, shaped (T, len(TIME_SERIES_COLUMNS))
+
+        """
+        path = self.path(self.key(experiment))
+        # write to a temporary file first so readers never see a partial file
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            np.savez(f, **dict(zip(TIME_SERIES_COLUMNS, np.asarray(data).T)))
+        os.replace(tmp, path)
+
+    def read(self, experiment: dict):
+        """the series of an experiment as a DataFrame"""
+        with np.load(self.path(self.key(experiment))) as partition:
+            return pd.DataFrame({c: partition[c] for c in TIME_SERIES_COLUMNS})
+
+    def __contains__(self, experiment: dict):
+        return self.path(self.key(experiment)).exists()
+
+    def __len__(self):
+        """number of partitions in the directory, of every configuration"""
+        return sum(1 for _ in self.directory.glob("*.npz"))
+
+    def load(self, experiments: pd.DataFrame):
+        """the series of experiments, concatenated
+
+        Parameters
+        ----------
+        experiments : pd.DataFrame
+            the experiments to load, one per row; missing ones are skipped
+
+        Returns
+        -------
+        pd.DataFrame
+            the series, indexed by the experiment parameters and the sample
+
+        """
+        series = {
+            tuple(row.values()): self.read(row)
+            for row in experiments.to_dict("records")
+            if row in self
+        }
+        return pd.concat(series, names=[*experiments.columns, "Sample"])
+
+
+def column_file(name):
+    """file name of a column of a ResultsStore"""
+    return re.sub(r"\W+", "_", name).strip("_") + ".raw"
+
+
+class ResultsStore:
+    """Append-only columnar store of experiment results.
+
+    Every column lives in its own raw binary file, described by `schema.json`,
+    and every row is keyed by the `experiment_key` of its experiment in
+    `keys.raw`. Rows are appended as experiments finish, columns first and
+    key last, so a row only exists once its key is written and an interrupted
+    append is discarded when the store is opened again. Readers open the
+    column files memory-mapped and only touch the columns and rows they use.
+    Experiment parameters are stored under their python names and strings
+    as fixed-width STRING_DTYPE.
+
+    The keys also hash the configuration the experiments ran with (shepherd
+    model, max_ticks, engine...), so a sweep only resumes the rows of the
+    same configuration; those of others are run again. The "configuration"
+    column holds the `experiment_key` of the configuration of every row, by
+    which `load` tells the rows of the configurations sharing the store apart.
+
+    Parameters
+    ----------
+    directory : str, Path
+        the store directory, created if needed
+
+    """
+
+    KEY_DTYPE = np.dtype("S16")
+    STRING_DTYPE = np.dtype("<U32")
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.columns = {}
+        self._keys = None
+        if self.schema_path.exists():
+            self.columns = json.loads(self.schema_path.read_text())["columns"]
+            self.truncate()
+
+    @property
+    def schema_path(self):
+        return self.directory / "schema.json"
+
+    @property
+    def keys_path(self):
+        return self.directory / "keys.raw"
+
+    def __len__(self):
+        if not self.keys_path.exists():
+            return 0
+        return self.keys_path.stat().st_size // self.KEY_DTYPE.itemsize
+
+    def truncate(self):
+        """drop the columns of rows whose key was never written"""
+        size = len(self)
+        for name, dtype in self.columns.items():
+            path = self.directory / column_file(name)
+            with open(path, "ab") as f:
+                f.truncate(size * np.dtype(dtype).itemsize)
+
+    def keys(self):
+        """the experiment keys of the rows, in order"""
+        if len(self) == 0:
+            return np.array([], dtype=str)
+        return np.fromfile(self.keys_path, dtype=self.KEY_DTYPE).astype(str)
+
+    def __contains__(self, experiment: dict):
+        if self._keys is None:
+            self._keys = set(self.keys())
+        return experiment_key(experiment) in self._keys
+
+    def append(
+        self,
+        experiments: pd.DataFrame,
+        results: pd.DataFrame,
+        configuration: dict = None,
+    ):
+        """append the results of finished experiments
+
+        Parameters
+        ----------
+        experiments : pd.DataFrame
+            the experiment parameters, one row per experiment
+        results : pd.DataFrame
+            their results, row by row
+        configuration : dict, optional
+            the fixed parameters of the run, hashed with every experiment
+
+        """
+        frame = pd.concat(
+            [
+                experiments.rename(columns=nl2py).reset_index(drop=True),
+                results.reset_index(drop=True),
+            ],
+            axis=1,
+        ).infer_objects()
+        frame["configuration"] = self.configuration_key(configuration)
+        if not self.columns:
+            self.columns = {
+                name: (
+                    self.STRING_DTYPE
+                    if frame[name].dtype == object
+                    else frame[name].dtype
+                ).str
+                for name in frame.columns
+            }
+            self.schema_path.write_text(json.dumps({"columns": self.columns}))
+        elif set(frame.columns) != set(self.columns):
+            raise ValueError(
+                f"columns {list(frame.columns)} do not match the store's "
+                f"{list(self.columns)}"
+            )
+        for name, dtype in self.columns.items():
+            values = frame[name].to_numpy()
+            if values.dtype == object and max(map(len, values), default=0) > 32:
+                raise ValueError(f"strings of column {name} exceed 32 characters")
+            values = np.ascontiguousarray(values, dtype=dtype)
+            with open(self.directory / column_file(name), "ab") as f:
+                f.write(values.tobytes())
+        keys = self.experiment_keys(experiments, configuration)
+        with open(self.keys_path, "ab") as f:
+            f.write(np.array(keys, dtype=self.KEY_DTYPE).tobytes())
+        if self._keys is not None:
+            self._keys.update(keys)
+
+    @staticmethod
+    def configuration_key(configuration: dict = None):
+        """the key of a configuration, as stored in the "configuration" column"""
+        return experiment_key({} if configuration is None else configuration)
+
+    @staticmethod
+    def experiment_keys(experiments: pd.DataFrame, configuration: dict = None):
+        """the keys of experiments run with a configuration"""
+        configuration = {} if configuration is None else configuration
+        return [
+            experiment_key({**configuration, **e})
+            for e in experiments.to_dict("records")
+        ]
+
+    def lookup(self, experiments: pd.DataFrame, configuration: dict = None):
+        """the stored results of experiments
+
+        Parameters
+        ----------
+        experiments : pd.DataFrame
+            the experiments, one row per experiment
+        configuration : dict, optional
+            the fixed parameters of the run, as given to `append`
+
+        Returns
+        -------
+        pd.DataFrame
+            the result columns of the experiments found in the store,
+            indexed like experiments
+
+        """
+        keys = pd.Series(
+            self.experiment_keys(experiments, configuration), index=experiments.index
+        )
+        parameters = {nl2py(c) for c in experiments.columns} | {"configuration"}
+        columns = [c for c in self.columns if c not in parameters]
+        stored = self.load(columns)
+        stored = stored[~stored.index.duplicated(keep="last")]
+        found = keys[keys.isin(stored.index)]
+        return stored.loc[found.values].set_axis(found.index)
+
+    def column(self, name):
+        """a column, memory-mapped read-only"""
+        dtype = np.dtype(self.columns[name])
+        if len(self) == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(
+            self.directory / column_file(name), dtype=dtype, mode="r", shape=len(self)
+        )
+
+    def load(self, columns=None, rows=slice(None), configuration: dict = None):
+        """read columns of the store into a DataFrame
+
+        Parameters
+        ----------
+        columns : list of str, optional
+            the columns to read, by default all of them
+        rows : slice or np.ndarray, optional
+            the rows to read, by default all of them
+        configuration : dict, optional
+            only read the rows run with this configuration, as given to
+            `append`; by default the rows of every configuration
+
+        Returns
+        -------
+        pd.DataFrame
+            the rows, indexed by experiment key
+
+        """
+        columns = list(self.columns) if columns is None else columns
+        keys = self.keys()[rows]
+        if configuration is not None:
+            found = np.asarray(self.column("configuration")[rows])
+            found = found == self.configuration_key(configuration)
+            rows = np.arange(len(self))[rows][found]
+            keys = keys[found]
+        return pd.DataFrame(
+            {name: np.asarray(self.column(name)[rows]) for name in columns},
+            index=pd.Index(keys, name="key"),
+        )
+
+
+class LegacyUnpickler(pickle.Unpickler):
+    """unpickler of results pickled by earlier versions of run.py"""
+
+    renamed = {("sample", "SampleType"): ("sample", "Sampler")}
+
+    def find_class(self, module, name):
+        return super().find_class(*self.renamed.get((module, name), (module, name)))
+
+
+def load_legacy_results(results_file):
+    """read a results.pkl written by an earlier version of run.py
+
+    Two layouts exist: `(problem, experiments, results)`, with the
+    experiments and results as separate frames, and
+    `((parameters, constraints), results)`, with the results indexed by the
+    experiment parameters.
+
+    Parameters
+    ----------
+    results_file : str, Path
+        the pickle
+
+    Returns
+    -------
+    experiments : pd.DataFrame
+        the experiment parameters, with python names
+    results : pd.DataFrame
+        the results of the experiments, row by row
+
+    """
+    with open(results_file, "rb") as f:
+        content = LegacyUnpickler(f).load()
+    if len(content) == 3:
+        _, experiments, results = content
+    elif len(content) == 2:
+        _, results = content
+        experiments = results.index.to_frame(index=False)
+        results = results.reset_index(drop=True)
+    else:
+        raise ValueError(f"unknown results layout in {results_file}")
+    return experiments.rename(columns=nl2py), results
+
+
+def load_results(path, columns=None):
+    """results of a parameter sweep from a ResultsStore or a legacy pickle
+
+    Parameters
+    ----------
+    path : str, Path
+        a ResultsStore directory or a results.pkl
+    columns : list of str, optional
+        the columns to read, by default all of them
+
+    Returns
+    -------
+    pd.DataFrame
+        the experiment parameters and results, one row per experiment
+
+    """
+    path = Path(path)
+    if path.is_dir():
+        return ResultsStore(path).load(columns)
+    experiments, results = load_legacy_results(path)
+    results = pd.concat([experiments, results], axis=1)
+    return results if columns is None else results[columns]
@@ -0,0 +1,265 @@
+import math
+import numpy as np
+
+
+def sheep_kernel(x, distance, weight_com, weight_r_sheep, radius_sheep):
+    """pull of a sheep at offset x from another in `force-sheep-vaughan`
+
+    Parameters
+    ----------
+    x : np.ndarray
+        offsets of the pulling sheep, `pos` of the other minus `pos` of the
+        sheep, shaped (..., 2)
+    distance : np.ndarray
+        norms of the offsets, shaped (...); zero distances pull nothing
+
+    Returns
+    -------
+    np.ndarray
+        the forces, shaped (..., 2)
+
+    """
+    safe = np.where(distance > 0, distance, np.inf)
+    scale = (weight_com / (radius_sheep + safe) ** 2 - weight_r_sheep / safe**2) / safe
+    return scale[..., None] * x
+
+
+def sheep_force_exact(pos, weight_com, weight_r_sheep, radius_sheep, chunk=256):
+    """`force-sheep-vaughan` of every sheep, summed over all the other sheep
+
+    Parameters
+    ----------
+    pos : np.ndarray
+        sheep positions, shaped (..., N, 2)
+    chunk : int, default=256
+        number of sheep whose pairs are held in memory at once
+
+    Returns
+    -------
+    np.ndarray
+        the forces, shaped (..., N, 2)
+
+    """
+    force = np.empty_like(pos, dtype=float)
+    for start in range(0, pos.shape[-2], chunk):
+        x = pos[..., None, :, :] - pos[..., start : start + chunk, None, :]
+        distance = np.linalg.norm(x, axis=-1)
+        force[..., start : start + chunk, :] = sheep_kernel(
+            x, distance, weight_com, weight_r_sheep, radius_sheep
+        ).sum(axis=-2)
+    return force
+
+
+def interaction_offsets(separation):
+    """cell offsets of the far field of a cell, by the parity of the cell
+
+    The far cells of a cell at a level of the grid are the cells more than
+    separation cells away whose parents are at most separation cells away
+    from its parent, i.e. the cells that were near at the coarser level.
+
+    Returns
+    -------
+    dict
+        offsets shaped (K, 2), keyed by the parities (qx, qy) of the cell
+
+    """
+    s = separation
+    offsets = {}
+    for qx in range(2):
+        for qy in range(2):
+            ox = np.arange(-2 * s - qx, 2 * s + 2 - qx)
+            oy = np.arange(-2 * s - qy, 2 * s + 2 - qy)
+            o = np.stack(np.meshgrid(ox, oy, indexing="ij"), axis=-1).reshape(-1, 2)
+            offsets[qx, qy] = o[np.abs(o).max(axis=-1) > s]
+    return offsets
+
+
+def sheep_force_grid(
+    pos, weight_com, weight_r_sheep, radius_sheep, theta=0.5, leaf_size=2, chunk=2048
+):
+    """`force-sheep-vaughan` of every sheep with a multilevel grid far field
+
+    The bounding square of the herd is split into a hierarchy of grids, the
+    finest of which holds about leaf_size sheep per cell. A sheep sums the
+    other sheep of the cells at most 1 / theta cells away exactly; a cell
+    further away at some level, whose parent was still near, pulls as all its
+    sheep at their center of mass. Every pair of sheep is thus counted once,
+    at the coarsest level where their cells are well separated, and a sheep
+    sums O(1 / theta^2) cells per level: the cost is O(N log N) instead of
+    O(N^2). As the center of mass cancels the dipole term, the error of a
+    cell decays like the square of its width over its distance, so of theta.
+
+    Parameters
+    ----------
+    pos : np.ndarray
+        sheep positions, shaped (..., N, 2)
+    theta : float, default=0.5
+        accuracy parameter in (0, 1], the largest ratio of cell width to
+        distance, in cells, approximated by a center of mass; smaller is
+        more accurate and slower, 0 sums every pair exactly
+    leaf_size : int, default=2
+        mean number of sheep per cell of the finest grid
+    chunk : int, default=2048
+        number of sheep whose interactions are held in memory at once
+
+    Returns
+    -------
+    np.ndarray
+        the forces, shaped (..., N, 2)
+
+    """
+    weights = weight_com, weight_r_sheep, radius_sheep
+    if pos.ndim > 2:
+        return np.stack(
+            [sheep_force_grid(p, *weights, theta, leaf_size, chunk) for p in pos]
+        )
+    n = len(pos)
+    separation = math.ceil(1 / theta) if theta > 0 else n
+    levels = max(0, math.ceil(math.log2(math.sqrt(n / leaf_size)))) if n else 0
+    size = 2**levels
+    if size <= 2 * separation + 1:
+        # every cell is near every other one
+        return sheep_force_exact(pos, *weights)
+
+    lower = pos.min(axis=0)
+    width = np.ptp(pos, axis=0).max() / size or 1.0
+    cell = np.minimum(((pos - lower) / width).astype(np.intp), size - 1)
+    flat = cell[:, 0] * size + cell[:, 1]
+    order = np.argsort(flat, kind="stable")
+    bounds = np.searchsorted(flat[order], np.arange(size * size + 1))
+
+    # number of sheep and center of mass of the cells of every level
+    mass = np.zeros((size, size))
+    moment = np.zeros((size, size, 2))
+    np.add.at(mass, (cell[:, 0], cell[:, 1]), 1.0)
+    np.add.at(moment, (cell[:, 0], cell[:, 1]), pos)
+    grids = {}
+    for level in range(levels, 0, -1):
+        com = np.divide(
+            moment,
+            mass[..., None],
+            out=np.zeros_like(moment),
+            where=mass[..., None] > 0,
+        )
+        grids[level] = mass, com
+        half = len(mass) // 2
+        mass = mass.reshape(half, 2, half, 2).sum(axis=(1, 3))
+        moment = moment.reshape(half, 2, half, 2, 2).sum(axis=(1, 3))
+
+    near = np.arange(-separation, separation + 1)
+    near = np.stack(np.meshgrid(near, near, indexing="ij"), axis=-1).reshape(-1, 2)
+    offsets = interaction_offsets(separation)
+    force = np.zeros_like(pos, dtype=float)
+    for begin in range(0, n, chunk):
+        members = np.arange(begin, min(begin + chunk, n))
+
+        # near field: exact sums over the sheep of the near cells of the finest grid
+        neighbor = cell[members, None, :] + near
+        valid = np.all((neighbor >= 0) & (neighbor < size), axis=-1)
+        target, k = np.nonzero(valid)
+        neighbor = neighbor[target, k]
+        source_cell = neighbor[:, 0] * size + neighbor[:, 1]
+        start = bounds[source_cell]
+        count = bounds[source_cell + 1] - start
+        target = members[np.repeat(target, count)]
+        first = np.cumsum(count) - count
+        source = order[np.arange(count.sum()) - np.repeat(first - start, count)]
+        x = pos[source] - pos[target]
+        pull = sheep_kernel(x, np.linalg.norm(x, axis=-1), *weights)
+        for axis in range(2):
+            force[:, axis] += np.bincount(target, weights=pull[:, axis], minlength=n)
+
+        # far field: the cells that became well separated at every level
+        for level, (mass, com) in grids.items():
+            level_cell = cell[members] >> (levels - level)
+            parity = level_cell & 1
+            for q, o in offsets.items():
+                selected = np.all(parity == q, axis=-1)
+                if not np.any(selected):
+                    continue
+                far = level_cell[selected, None, :] + o
+                valid = np.all((far >= 0) & (far < len(mass)), axis=-1)
+                far = np.where(valid[..., None], far, 0)
+                m = np.where(valid, mass[far[..., 0], far[..., 1]], 0.0)
+                x = com[far[..., 0], far[..., 1]] - pos[members[selected], None, :]
+                distance = np.where(m > 0, np.linalg.norm(x, axis=-1), 0.0)
+                force[members[selected]] += np.sum(
+                    m[..., None] * sheep_kernel(x, distance, *weights), axis=-2
+                )
+    return force
+
+
+def shepherd_force(pos, shepherd_pos, weight_r_shepherd):
+    """`force-shepherds-vaughan`: repulsion of every sheep by all the shepherds
+
+    Parameters
+    ----------
+    pos : np.ndarray
+        sheep positions, shaped (..., N, 2)
+    shepherd_pos : np.ndarray
+        shepherd positions, shaped (..., M, 2)
+
+    Returns
+    -------
+    np.ndarray
+        the forces, shaped (..., N, 2)
+
+    """
+    x = pos[..., :, None, :] - shepherd_pos[..., None, :, :]
+    distance = np.linalg.norm(x, axis=-1, keepdims=True)
+    safe = np.where(distance > 0, distance, np.inf)
+    return weight_r_shepherd * np.sum(x / safe**3, axis=-2)
+
+
+def nearest_wall(pos, min_pcor, max_pcor):
+    """wall point (`edge-xcor`, `edge-ycor`) of the nearest edge patch
+
+    Instead of scanning the edge patches, the nearest one is picked among
+    the nearest patch of each of the four edges, which shares the row or
+    column of the patch of the sheep.
+
+    Parameters
+    ----------
+    pos : np.ndarray
+        positions inside the world, shaped (..., 2)
+    min_pcor, max_pcor : int
+        smallest and largest patch coordinates of the (square) world
+
+    Returns
+    -------
+    np.ndarray
+        the wall points, shaped (..., 2)
+
+    """
+    patch = np.clip(np.floor(pos + 0.5), min_pcor, max_pcor)
+    px, py = patch[..., 0], patch[..., 1]
+    low = np.full_like(px, min_pcor)
+    high = np.full_like(px, max_pcor)
+    # the nearest edge patch of the right, left, top and bottom edges
+    candidates = np.stack(
+        [
+            np.stack([high, py], axis=-1),
+            np.stack([low, py], axis=-1),
+            np.stack([px, high], axis=-1),
+            np.stack([px, low], axis=-1),
+        ],
+        axis=-2,
+    )
+    distance = np.linalg.norm(candidates - pos[..., None, :], axis=-1)
+    nearest = np.argmin(distance, axis=-1)[..., None, None]
+    edge = np.take_along_axis(candidates, nearest, axis=-2)[..., 0, :]
+    # the wall lies one patch outside, across a left or right edge first
+    ex, ey = edge[..., 0], edge[..., 1]
+    on_x_edge = (ex == min_pcor) | (ex == max_pcor)
+    shift_x = np.where(ex == max_pcor, 1, np.where(ex == min_pcor, -1, 0))
+    shift_y = np.where(ey == max_pcor, 1, np.where(ey == min_pcor, -1, 0))
+    return edge + np.stack([shift_x, np.where(on_x_edge, 0, shift_y)], axis=-1).astype(
+        float
+    )
+
+
+def wall_force(pos, weight_wall, min_pcor, max_pcor):
+    """`force-wall-vaughan`: repulsion of every sheep by the nearest wall"""
+    x = pos - nearest_wall(pos, min_pcor, max_pcor)
+    distance = np.linalg.norm(x, axis=-1, keepdims=True)
+    return weight_wall * x / distance**3
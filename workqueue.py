@@ -0,0 +1,281 @@
+from pathlib import Path
+from collections import deque
+from multiprocessing import Process
+import argparse
+import logging
+import os
+import pickle
+import threading
+import time
+import uuid
+
+from scheduler import CostModel
+
+
+def write_atomic(path: Path, obj):
+    """pickle obj to path, so readers never see a partial file"""
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        pickle.dump(obj, f)
+    os.replace(tmp, path)
+
+
+class QueueScheduler:
+    """Run tasks on workers of any node sharing a queue directory.
+
+    A drop-in replacement of `Scheduler` whose workers are `work` processes
+    started on any node that mounts the queue directory. The coordinator
+    publishes tasks to `pending/`, most expensive first under the cost model.
+    A worker claims a task by renaming it to `leased/`, which is atomic, so
+    a task goes to a single worker, and keeps touching it while it runs.
+    The result is written to `results/`, where the coordinator collects it.
+    A lease not renewed for `lease` seconds, measured on the clock of the
+    coordinator so the clocks of the nodes do not matter, belongs to a lost
+    worker: its task is published again.
+
+    Parameters
+    ----------
+    directory : str, Path
+        the queue directory, on a filesystem shared by the nodes
+    initializer : callable
+        worker initializer, which the workers import by name
+    initargs : tuple
+        arguments of the initializer
+    retries : int, default=2
+        number of times a failing or lost task is published again before it
+        is given up
+    lease : float, default=60.0
+        seconds without a heartbeat after which a worker is deemed lost
+    window : int, default=256
+        maximum number of published tasks, so the cost model refined by the
+        finished tasks ranks the next ones
+    poll : float, default=0.5
+        seconds between two scans of the queue when nothing happened
+    num_local_workers : int, default=0
+        number of workers to start on this node while the scheduler is open
+
+    """
+
+    def __init__(
+        self,
+        directory,
+        initializer=None,
+        initargs=(),
+        retries=2,
+        lease=60.0,
+        window=256,
+        poll=0.5,
+        num_local_workers=0,
+    ):
+        self.directory = Path(directory)
+        self.initializer = initializer
+        self.initargs = initargs
+        self.retries = retries
+        self.lease = lease
+        self.window = window
+        self.poll = poll
+        self.num_local_workers = num_local_workers
+        self.workers = []
+        self.depth = 0
+        for name in ("pending", "leased", "results"):
+            (self.directory / name).mkdir(parents=True, exist_ok=True)
+
+    def start(self):
+        (self.directory / "stop").unlink(missing_ok=True)
+        write_atomic(
+            self.directory / "config.pkl", (self.initializer, self.initargs, self.lease)
+        )
+        self.workers = [
+            Process(target=work, args=(self.directory,), daemon=True)
+            for _ in range(self.num_local_workers)
+        ]
+        for worker in self.workers:
+            worker.start()
+
+    def shutdown(self):
+        """ask every worker of the queue to exit once idle"""
+        (self.directory / "stop").touch()
+        for worker in self.workers:
+            worker.join()
+        self.workers = []
+
+    def __enter__(self):
+        if self.depth == 0:
+            self.start()
+        self.depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self.depth -= 1
+        if self.depth == 0:
+            self.shutdown()
+
+    def run(self, fn, tasks: dict, cost_model: CostModel, ticks, **kwargs):
+        """run fn(*args, **kwargs) for every task, see `Scheduler.run`"""
+        log = logging.getLogger(__name__)
+        run_id = uuid.uuid4().hex[:8]
+        shapes = {
+            key: tuple(cost_model.shape(e) for e in experiments)
+            for key, (experiments, _) in tasks.items()
+        }
+        pending = {}
+        for key in tasks:
+            pending.setdefault(shapes[key], deque()).append(key)
+        attempts = {key: 0 for key in tasks}
+        # published tasks by file name, and the last heartbeat seen of each
+        published = {}
+        heartbeats = {}
+        num_published = 0
+
+        def publish(key):
+            nonlocal num_published
+            # workers claim the smallest name first, i.e. in publication order
+            name = f"{run_id}-{num_published:08d}"
+            num_published += 1
+            write_atomic(self.directory / "pending" / name, (fn, tasks[key][1], kwargs))
+            published[name] = key
+
+        def retry(name, reason):
+            key = published.pop(name)
+            heartbeats.pop(name, None)
+            attempts[key] += 1
+            if attempts[key] > self.retries:
+                log.error(
+                    f"Giving up task {key} after {attempts[key]} attempts: {reason}"
+                )
+            else:
+                log.warning(
+                    f"Retrying task {key} ({attempts[key]}/{self.retries}): {reason}"
+                )
+                publish(key)
+
+        while pending or published:
+            while pending and len(published) < self.window:
+                group = max(pending, key=cost_model.cost)
+                publish(pending[group].popleft())
+                if not pending[group]:
+                    del pending[group]
+
+            progress = False
+            for path in sorted((self.directory / "results").glob(f"{run_id}-*")):
+                with open(path, "rb") as f:
+                    result, error, seconds = pickle.load(f)
+                path.unlink()
+                progress = True
+                if path.name not in published:
+                    # a task published again finished twice
+                    continue
+                if error is not None:
+                    retry(path.name, error)
+                    continue
+                key = published.pop(path.name)
+                heartbeats.pop(path.name, None)
+                cost_model.observe(shapes[key], ticks(key, result), seconds)
+                yield key, result
+
+            now = time.time()
+            for path in (self.directory / "leased").glob(f"{run_id}-*"):
+                if path.name not in published:
+                    continue
+                try:
+                    mtime = path.stat().st_mtime
+                except FileNotFoundError:
+                    # the result was written since the scan of the results
+                    continue
+                last = heartbeats.get(path.name)
+                if last is None or last[0] != mtime:
+                    heartbeats[path.name] = mtime, now
+                elif now - last[1] > self.lease:
+                    path.unlink(missing_ok=True)
+                    retry(path.name, f"no heartbeat for {self.lease}s")
+                    progress = True
+            if not progress:
+                time.sleep(self.poll)
+
+
+def claim(directory: Path):
+    """lease the first pending task of a queue, None if there is none"""
+    for path in sorted((directory / "pending").iterdir()):
+        if path.name.startswith("."):
+            continue
+        leased = directory / "leased" / path.name
+        try:
+            os.rename(path, leased)
+        except FileNotFoundError:
+            # another worker claimed it first
+            continue
+        return leased
+    return None
+
+
+def heartbeat(path: Path, interval, done: threading.Event):
+    """touch a leased task every interval seconds until done"""
+    while not done.wait(interval):
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            # the lease expired and the task was published again
+            return
+
+
+def work(directory, idle_timeout=None):
+    """run the tasks of a queue until it is stopped
+
+    Parameters
+    ----------
+    directory : str, Path
+        the queue directory of a `QueueScheduler`
+    idle_timeout : float, optional
+        seconds without any task after which the worker exits
+
+    """
+    log = logging.getLogger(__name__)
+    directory = Path(directory)
+    while not (directory / "config.pkl").exists():
+        time.sleep(1.0)
+    with open(directory / "config.pkl", "rb") as f:
+        initializer, initargs, lease = pickle.load(f)
+    if initializer is not None:
+        initializer(*initargs)
+    poll = min(1.0, lease / 10)
+    idle_since = time.time()
+    while not (directory / "stop").exists():
+        path = claim(directory)
+        if path is None:
+            if idle_timeout is not None and time.time() - idle_since > idle_timeout:
+                break
+            time.sleep(poll)
+            continue
+        try:
+            with open(path, "rb") as f:
+                fn, args, kwargs = pickle.load(f)
+        except FileNotFoundError:
+            continue
+        done = threading.Event()
+        thread = threading.Thread(target=heartbeat, args=(path, lease / 4, done))
+        thread.start()
+        start = time.time()
+        result = error = None
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            log.exception(f"Task {path.name} failed")
+            error = repr(e)
+        done.set()
+        thread.join()
+        write_atomic(
+            directory / "results" / path.name, (result, error, time.time() - start)
+        )
+        path.unlink(missing_ok=True)
+        idle_since = time.time()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="run the tasks of a sweep queue")
+    parser.add_argument("directory", help="queue directory shared with the coordinator")
+    parser.add_argument(
+        "--idle-timeout", type=float, help="exit after this many seconds without tasks"
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    work(args.directory, args.idle_timeout)